@@ -1,12 +1,14 @@
+import hashlib
+import json
 import os
 import sys
 import logging 
-import networkx as nx # pip install networkx or /opt/epd/bin/easy_install networkx
 
 from collections import deque
 
 from flightdatautilities.dict_helpers import dict_filter
 
+from analysis_engine import settings
 from analysis_engine.node import (
     ApproachNode,
     DerivedParameterNode,
@@ -15,6 +17,7 @@ from analysis_engine.node import (
     FlightPhaseNode,
     KeyPointValueNode,
     KeyTimeInstanceNode,
+    can_operate_attributes,
 )
 
 logger = logging.getLogger(__name__)
@@ -144,45 +147,86 @@ def dependencies3(di_graph, root, node_mgr):
     :type root: String
     :param node_mgr: Node manager which can assess whether nodes are operational with the available dependencies at each layer of the tree.
     :type node_mgr: analysis_engine.node.NodeManager
+    :returns: Operational nodes in the order they will be processed.
+    :rtype: [str]
     '''
     log_stuff = logger.getEffectiveLevel() >= logging.INFO
-    def traverse_tree(node):
-        "Begin the recursion at this node's position in the dependency tree"
-        if node in path:
-            # add node for it to be removed (pop'd) in a moment
-            path.append(node)
+
+    # OPT: Traverse precomputed integer adjacency lists rather than calling
+    # di_graph.successors() for each visit. Successors retain the order
+    # returned by di_graph.successors() so the ordering is unchanged.
+    names = di_graph.nodes()
+    indices = {name: index for index, name in enumerate(names)}
+    successors = [[indices[s] for s in di_graph.successors(name)]
+                  for name in names]
+    on_path = [False] * len(names)  # nodes within the current branch path
+    active_nodes = [False] * len(names)  # operational nodes visited
+    # Inoperable nodes whose branches did not avoid a circular dependency
+    # will be inoperable wherever they are visited.
+    inoperable_nodes = [False] * len(names)
+    # Cache operational results for each set of available dependencies.
+    operational = {}
+    ordering = []
+    # Each stack entry is a node within the current branch path, an iterator
+    # of its dependencies still to traverse, the layer of its available
+    # dependencies and whether a circular dependency was avoided below it.
+    stack = []
+
+    def visit(index):
+        '''
+        Visits a node returning whether it is available or None if the node
+        is added to the path and its dependencies must first be traversed.
+        '''
+        if on_path[index]:
             # we've met this node before; start of circular dependency?
             if log_stuff:
                 logger.info("Circular dependency avoided at node '%s'. "
-                            "Branch path: %s", node, path)
+                            "Branch path: %s", names[index],
+                            [names[f[0]] for f in stack] + [names[index]])
+            stack[-1][3] = True
             return False  # establishing if available; cannot yet be available
-        # we're recursing down
-        path.append(node)
-        if node in active_nodes:
+        if active_nodes[index]:
             # node already discovered operational
             return True
-        
-        layer = set()  # layer of current node's available dependencies
-        for dependency in di_graph.successors(node):
-            # traverse again, 'like we did last summer'
-            if traverse_tree(dependency):
-                layer.add(dependency)
-            # each time traverse_tree returns, remove node from visited path
-            path.pop()
-            
-        if node_mgr.operational(node, layer):
-            # node will work at this level with the available dependencies
-            active_nodes.add(node)
-            ordering.append(node)
-            return True  # layer below works
-        else:
-            # node will not work with available dependencies
+        if inoperable_nodes[index]:
             return False
-        
-    ordering = []
-    path = deque()  # current branch path
-    active_nodes = set()  # operational nodes visited for fast lookup
-    traverse_tree(root)  # start recursion
+        # we're descending
+        on_path[index] = True
+        stack.append([index, iter(successors[index]), [], False])
+        return None
+
+    visit(indices[root])
+    while stack:
+        frame = stack[-1]
+        index, remaining, layer = frame[:3]
+        for dependency in remaining:
+            available = visit(dependency)
+            if available is None:
+                # traverse the dependency's dependencies first
+                break
+            elif available:
+                layer.append(dependency)
+        else:
+            # all dependencies have been traversed
+            stack.pop()
+            on_path[index] = False
+            key = (index, frozenset(layer))
+            try:
+                available = operational[key]
+            except KeyError:
+                available = operational[key] = node_mgr.operational(
+                    names[index], set(names[i] for i in layer))
+            if available:
+                # node will work at this level with the available dependencies
+                active_nodes[index] = True
+                ordering.append(names[index])
+            elif not frame[3]:
+                inoperable_nodes[index] = True
+            if stack:
+                if available:
+                    stack[-1][2].append(index)
+                if frame[3]:
+                    stack[-1][3] = True
     return ordering
 
 
@@ -201,6 +245,7 @@ def draw_graph(graph, name, horizontal=False):
     :param horizontal: Draw graph from left to right. Default: False (top to bottom)
     :type horizontal: Boolean
     """
+    import networkx as nx
     # hint: change filename extension to change type (.png .pdf .ps)
     file_path = 'graph_%s.ps' % name.lower().replace(' ', '_')
     # TODO: Set the number of pages #page="8.5,11";
@@ -280,6 +325,8 @@ def graph_nodes(node_mgr):
     :param node_mgr:
     :type node_mgr: NodeManager
     """
+    # import locally to speed up imports of dependency_graph.py
+    import networkx as nx # pip install networkx or /opt/epd/bin/easy_install networkx
     # gr_all will contain all nodes
     gr_all = nx.DiGraph()
     # create nodes without attributes now as you can only add attributes once
@@ -396,11 +443,36 @@ def process_order(gr_all, node_mgr, raise_inoperable_requested=False):
         inactive_edges = gr_all.in_edges(node)
         gr_all.add_edges_from(inactive_edges, color='#c0c0c0')  # silver
         
+    check_process_order(process_order, node_mgr, raise_inoperable_requested,
+                        gr_all=gr_all)
+    
+    return gr_all, gr_st, process_order[:-1] # exclude 'root'
+
+
+def check_process_order(process_order, node_mgr,
+                        raise_inoperable_requested=False, gr_all=None):
+    '''
+    Checks that requested and required nodes are within the process order.
+
+    :param process_order: Node names in the order they will be processed.
+    :type process_order: [str]
+    :param node_mgr:
+    :type node_mgr: NodeManager
+    :param raise_inoperable_requested: Raise if requested nodes are inoperable.
+    :type raise_inoperable_requested: bool
+    :param gr_all: Graph of all nodes used to log the inoperable requested
+        nodes' dependency trees when debugging.
+    :type gr_all: nx.DiGraph or None
+    :raises InoperableDependencies: If raise_inoperable_requested and
+        requested nodes are inoperable.
+    :raises RequiredNodesMissing: If required nodes are inoperable.
+    '''
     inoperable_requested = list(set(node_mgr.requested) - set(process_order))
     if inoperable_requested:
         logger.warning("Found %s inoperable requested parameters.",
                         len(inoperable_requested))
-        if logging.NOTSET < logger.getEffectiveLevel() <= logging.DEBUG:
+        if gr_all is not None and \
+           logging.NOTSET < logger.getEffectiveLevel() <= logging.DEBUG:
             # only build this massive tree if in debug!
             items = []
             for n in sorted(inoperable_requested):
@@ -416,8 +488,49 @@ def process_order(gr_all, node_mgr, raise_inoperable_requested=False):
     if required_missing:
         raise RequiredNodesMissing(
             "Required nodes missing: %s" % ', '.join(required_missing))
-    
-    return gr_all, gr_st, process_order[:-1] # exclude 'root'
+
+
+def level_schedule(process_order, graph, available=()):
+    '''
+    Groups the nodes within process_order into levels of nodes which can be
+    derived concurrently. Every node within a level only depends upon nodes
+    within earlier levels, therefore each level can be derived once all
+    earlier levels are complete.
+
+    The schedule reproduces the serial processing order: a node is placed
+    after each of its dependencies (successors within graph) which precede
+    it in process_order and also after each node preceding it in
+    process_order which depends upon it. The latter ensures that a node
+    which was not available to another node when it was derived serially
+    (e.g. to avoid a circular dependency) will not become available to it
+    when derived concurrently.
+
+    :param process_order: Node names in the order they would be processed.
+    :type process_order: [str]
+    :param graph: Spanning tree graph as returned by dependency_order.
+    :type graph: nx.DiGraph
+    :param available: Node names which are already available and do not
+        require deriving, e.g. LFL parameters and attributes. These are
+        excluded from the schedule.
+    :type available: set of str
+    :returns: Levels of node names each ordered as in process_order.
+    :rtype: [[str]]
+    '''
+    levels = {}  # level of each node which precedes the current node
+    schedule = []
+    for name in process_order:
+        if name in available:
+            continue
+        level = 0
+        if name in graph:
+            for other in graph.successors(name) + graph.predecessors(name):
+                if other in levels:
+                    level = max(level, levels[other] + 1)
+        levels[name] = level
+        if level == len(schedule):
+            schedule.append([])
+        schedule[level].append(name)
+    return schedule
 
 
 def remove_floating_nodes(graph):
@@ -431,8 +544,108 @@ def remove_floating_nodes(graph):
     return graph
      
      
+def plan_cache_key(node_mgr):
+    '''
+    Key identifying the dependency plan of a NodeManager. The processing order
+    only depends upon the available parameters, the requested nodes, the
+    derived node classes, which attributes are available and the values of
+    attributes referenced by can_operate methods.
+
+    Node classes are identified by name, dependencies and the modification
+    time of their modules so that plans cached on disk are invalidated by
+    code changes.
+
+    :param node_mgr:
+    :type node_mgr: NodeManager
+    :returns: Hex digest key and the values of the attributes referenced by
+        can_operate methods. The key is None if derived nodes are not
+        classes, e.g. mock objects, and therefore cannot be identified.
+    :rtype: (str or None, dict)
+    '''
+    sha = hashlib.sha256()
+    update = lambda *items: sha.update(
+        json.dumps(items, sort_keys=True, default=repr))
+
+    update('hdf_keys', sorted(node_mgr.hdf_keys))
+    update('requested', sorted(node_mgr.requested))
+    update('attributes', sorted(set(node_mgr.aircraft_info) |
+                                set(node_mgr.achieved_flight_record) |
+                                set(node_mgr.segment_info)))
+    nodes = []
+    modules = set()
+    attribute_names = set()
+    for name, node_class in sorted(node_mgr.derived_nodes.iteritems()):
+        if not isinstance(node_class, type):
+            return None, {}
+        nodes.append((name, node_class.__module__, node_class.__name__,
+                      node_class.get_dependency_names()))
+        modules.add(node_class.__module__)
+        attribute_names.update(a.name for a in
+                               can_operate_attributes(node_class))
+    update('nodes', nodes)
+    for module_name in sorted(modules):
+        try:
+            mtime = os.path.getmtime(sys.modules[module_name].__file__)
+        except (AttributeError, KeyError, OSError):
+            mtime = None
+        update('module', module_name, mtime)
+    values = {}
+    for name in sorted(attribute_names):
+        attribute = node_mgr.get_attribute(name)
+        values[name] = attribute.value if attribute is not None else None
+    update('values', values)
+    return sha.hexdigest(), values
+
+
+def _load_plan(key, cache_dir):
+    '''
+    Loads a dependency plan from memory or from disk within cache_dir.
+
+    :returns: Process order and spanning tree graph or None if not cached.
+    :rtype: (list of strings, nx.DiGraph) or None
+    '''
+    if key in _plan_cache:
+        return _plan_cache[key]
+    if not cache_dir:
+        return None
+    from networkx.readwrite import json_graph
+    path = os.path.join(cache_dir, '%s.json' % key)
+    try:
+        with open(path, 'rb') as plan_file:
+            plan = json.load(plan_file)
+    except (IOError, ValueError):
+        return None
+    _plan_cache[key] = plan = (
+        plan['process_order'], json_graph.node_link_graph(plan['gr_st']))
+    return plan
+
+
+def _save_plan(key, order, gr_st, values, cache_dir):
+    '''
+    Saves a dependency plan in memory and to disk within cache_dir.
+    '''
+    _plan_cache[key] = (list(order), gr_st.copy())
+    if not cache_dir:
+        return
+    from networkx.readwrite import json_graph
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    path = os.path.join(cache_dir, '%s.json' % key)
+    # Write to a temporary file first as other processes may be reading.
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp_path, 'wb') as plan_file:
+        json.dump({'process_order': order,
+                   'gr_st': json_graph.node_link_data(gr_st),
+                   'attributes': values},
+                  plan_file, default=repr)
+    os.rename(temp_path, path)
+
+
+_plan_cache = {}
+
+
 def dependency_order(node_mgr, draw=not_windows,
-                     raise_inoperable_requested=False):
+                     raise_inoperable_requested=False, cache=None):
     """
     Main method for retrieving processing order of nodes.
     
@@ -440,9 +653,24 @@ def dependency_order(node_mgr, draw=not_windows,
     :type node_mgr: NodeManager
     :param draw: Will draw the graph. Green nodes are available LFL params, Blue are operational derived, Black are not requested derived, Red are active top level requested params, Grey are inactive params. Edges are labelled with processing order.
     :type draw: boolean
+    :param cache: Whether to reuse plans cached for identical inputs (see plan_cache_key). Defaults to settings.DEPENDENCY_PLAN_CACHE. Plans are not cached when drawing.
+    :type cache: bool or None
     :returns: List of Nodes determining the order for processing and the spanning tree graph.
     :rtype: (list of strings, dict)
     """
+    if cache is None:
+        cache = settings.DEPENDENCY_PLAN_CACHE
+    if cache and not draw:
+        cache_dir = settings.DEPENDENCY_PLAN_CACHE_DIR
+        key, values = plan_cache_key(node_mgr)
+        plan = _load_plan(key, cache_dir) if key else None
+        if plan:
+            order, gr_st = plan
+            logger.debug("Using cached dependency plan '%s' for attributes: "
+                         "%s", key, values)
+            check_process_order(order, node_mgr, raise_inoperable_requested)
+            return list(order), gr_st.copy()
+
     _graph = graph_nodes(node_mgr)
     gr_all, gr_st, order = process_order(_graph, node_mgr,
                                          raise_inoperable_requested)
@@ -457,6 +685,8 @@ def dependency_order(node_mgr, draw=not_windows,
         # reduce number of nodes by removing floating ones
         gr_all = remove_floating_nodes(gr_all)
         draw_graph(gr_all, 'Dependency Tree')
+    elif cache and key:
+        _save_plan(key, order, gr_st, values, cache_dir)
     return order, gr_st
 
 
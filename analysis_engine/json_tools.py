@@ -6,7 +6,7 @@ import dateutil.parser
 from datetime import datetime
 
 from analysis_engine import settings
-from analysis_engine.utils import get_derived_nodes
+from analysis_engine.utils import get_derived_nodes, get_node_modules
 
 
 # VERSION will be included in json output. Only json matching the current VERSION number will be loaded.
@@ -174,13 +174,21 @@ def json_to_process_flight(txt):
     return res
 
 
-def process_flight_to_nodes(pf_results):
+def process_flight_to_nodes(pf_results, modules=None):
     '''
     Load process flight results into Node objects.
+
+    Only the modules providing the nodes within the results are imported.
     '''
     from analysis_engine import node
     
-    derived_nodes = get_derived_nodes(settings.NODE_MODULES)
+    if modules is None:
+        modules = settings.NODE_MODULES
+    node_names = [n for nodes in pf_results.itervalues() for n in nodes]
+    if not node_names:
+        return {}
+    derived_nodes = get_derived_nodes(
+        get_node_modules(node_names, modules, dependencies=False))
     
     params = {}
     
@@ -5,6 +5,7 @@ import operator
 
 from collections import defaultdict
 from copy import deepcopy
+from itertools import izip
 from math import ceil, copysign
 
 from flightdatautilities import aircrafttables as at, units as ut
@@ -107,6 +108,7 @@ from analysis_engine.library import (ambiguous_runway,
                                      level_off_index,
                                      valid_slices_within_array,
                                      value_at_index,
+                                     values_at_indices,
                                      vstack_params_where_state,
                                      vstack_params)
 
@@ -8337,6 +8339,7 @@ class APUOnDuringFlightDuration(KeyPointValueNode):
                     # if APU On was On during liftoff, we want to use the index
                     # of the last sample
                     kpv.index = last_index
+        self.invalidate_columns()
 
 
 ##############################################################################
@@ -13073,8 +13076,9 @@ class RateOfClimbAtHeightBeforeLevelFlight(KeyPointValueNode):
         for altitude in self.NAME_VALUES['altitude']:
             ktis = heights.get(name='%d Ft Before Level Flight Climbing'
                                % altitude)
-            for kti in ktis:
-                value = value_at_index(vert_spd.array, kti.index)
+            values = values_at_indices(vert_spd.array,
+                                       [kti.index for kti in ktis])
+            for kti, value in izip(ktis, values):
                 self.create_kpv(kti.index, value,
                                 replace_values={'altitude': altitude})
 
@@ -13519,8 +13523,9 @@ class RateOfDescentAtHeightBeforeLevelFlight(KeyPointValueNode):
         for altitude in self.NAME_VALUES['altitude']:
             ktis = heights.get(name='%d Ft Before Level Flight Descending'
                                % altitude)
-            for kti in ktis:
-                value = value_at_index(vert_spd.array, kti.index)
+            values = values_at_indices(vert_spd.array,
+                                       [kti.index for kti in ktis])
+            for kti, value in izip(ktis, values):
                 self.create_kpv(kti.index, value,
                                 replace_values={'altitude': altitude})
 
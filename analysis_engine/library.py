@@ -15,9 +15,6 @@ from hashlib import sha256
 from itertools import izip, izip_longest, tee
 from math import ceil, copysign, cos, floor, log, radians, sin, sqrt
 from operator import attrgetter, itemgetter
-from scipy import interpolate as scipy_interpolate, optimize
-from scipy.ndimage import filters
-from scipy.signal import medfilt
 
 from hdfaccess.parameter import MappedArray
 
@@ -277,6 +274,189 @@ def wrap_array(param_name, array):
     return array
 
 
+# Interpolation plans keyed by (slave rate, master rate, offset delta,
+# interpolate), see _align_plan.
+_align_plans = {}
+ALIGN_PLANS_MAX = 1024
+
+
+def _align_plan(ws, wm, delta, interpolate):
+    '''
+    Computes the interpolation coefficients for each master sample within a
+    period of wm master samples and ws slave samples. The aligned value of
+    the ith master sample of the kth period is a * slave[k * ws + h] +
+    b * slave[k * ws + h + 1]. Plans are cached as they only depend upon the
+    sample rates and the timing disparity.
+
+    :param ws: Slave samples per period.
+    :type ws: int or float
+    :param wm: Master samples per period.
+    :type wm: int or float
+    :param delta: Timing disparity in terms of the slave sample interval.
+    :type delta: float
+    :param interpolate: Whether to interpolate, otherwise the closest slave
+        sample is taken.
+    :type interpolate: bool
+    :raises ValueError: If the timing disparity exceeds a period.
+    :returns: Slave sample indices h and coefficients a and b for each
+        master sample within a period.
+    :rtype: (np.array, np.array, np.array)
+    '''
+    key = (ws, wm, delta, interpolate)
+    plan = _align_plans.get(key)
+    if plan is not None:
+        return plan
+
+    r = wm / float(ws)
+    hs = []
+    coefficients = []
+    for i in range(int(wm)):
+        bracket = (i / r) + delta
+        # Interpolate between the hth and (h+1)th samples of the slave array
+        h = int(floor(bracket))
+        if h < -ws or h >= ws:
+            raise ValueError('Align called with excessive timing mismatch')
+
+        # Compute the linear interpolation coefficients, b & a
+        b = bracket - h
+
+        # Cunningly, if we are interpolating (working with mapped arrays e.g.
+        # discrete or multi-state parameters), by reverting to 1,0 or 0,1
+        # coefficients we gather the closest value in time to the master
+        # parameter.
+        if not interpolate:
+            b = round(b)
+
+        # Either way, a is the residual part.
+        hs.append(h)
+        coefficients.append((1 - b, b))
+
+    a, b = np.array(coefficients, dtype=float).T
+    plan = (np.array(hs, dtype=int), a, b)
+    if len(_align_plans) >= ALIGN_PLANS_MAX:
+        _align_plans.clear()
+    _align_plans[key] = plan
+    return plan
+
+
+def _align_interpolate(slave_array, plan, ws, length, dtype):
+    '''
+    Aligns the slave array in a single pass using an interpolation plan (see
+    _align_plan). Master samples which lie outside the timebase of the slave
+    array are masked zeros.
+
+    :param slave_array: Slave data and mask.
+    :type slave_array: np.ma.masked_array
+    :param plan: Interpolation plan for each master sample within a period.
+    :type plan: (np.array, np.array, np.array)
+    :param ws: Slave samples per period.
+    :type ws: int or float
+    :param length: Length of the aligned array.
+    :type length: int
+    :param dtype: Data type of the aligned array.
+    :returns: Slave array aligned to master.
+    :rtype: np.ma.array
+    '''
+    hs, a, b = plan
+    ws = int(ws)
+    wm = len(hs)
+    periods = -(-length // wm)
+    data = np.ma.getdata(slave_array)
+    mask = np.ma.getmask(slave_array)
+    if mask is not np.ma.nomask and not mask.any():
+        mask = np.ma.nomask
+
+    def pad(array):
+        # Pad the slave array by a period either side and view it as a row
+        # per period.
+        padded = np.zeros((periods + 2) * ws, dtype=array.dtype)
+        padded[ws:ws + len(array)] = array
+        return padded.reshape(-1, ws)
+
+    def gather(padded, offsets):
+        # Each master sample within a period (a column of the aligned
+        # array) takes the same slave column from a shifted row.
+        rows = (offsets + ws) // ws
+        columns = (offsets + ws) % ws
+        gathered = np.empty((periods, wm), dtype=padded.dtype)
+        # Offsets increase with the master sample, therefore the columns
+        # taken from each row are contiguous within the aligned array.
+        for row in np.unique(rows):
+            start, stop = np.searchsorted(rows, [row, row + 1])
+            step = columns[start + 1] - columns[start] \
+                if stop - start > 1 else 1
+            if step > 0 and (np.diff(columns[start:stop]) == step).all():
+                # Take every step-th column as a slice of the row.
+                taken = slice(columns[start], columns[stop - 1] + 1, step)
+            else:
+                taken = columns[start:stop]
+            gathered[:, start:stop] = padded[row:row + periods, taken]
+        return gathered
+
+    # Coefficients are cast as a Python float would be when multiplying
+    # the slave data.
+    coefficient_dtype = np.result_type(data.dtype, 0.0)
+    a = a.astype(coefficient_dtype)
+    b = b.astype(coefficient_dtype)
+    padded = pad(data)
+    first_value = a * gather(padded, hs)
+    aligned = first_value + b * gather(padded, hs + 1)
+    if mask is np.ma.nomask:
+        aligned_mask = np.zeros(aligned.shape, dtype=bool)
+    else:
+        padded = pad(mask)
+        first_mask = gather(padded, hs)
+        aligned_mask = first_mask | gather(padded, hs + 1)
+        # Masked values are those of the first operand, as with masked
+        # array arithmetic.
+        np.copyto(aligned, first_value, where=aligned_mask)
+        np.copyto(aligned, a, where=first_mask)
+
+    # Treat ends as "padding"; Value of 0 and Masked. Only the first period
+    # and the periods at the end of the slave array are affected.
+    padding = hs < 0
+    aligned[0, padding] = 0
+    aligned_mask[0, padding] = True
+    end = max((len(data) - ws) // ws, 0)
+    period = np.arange(end, periods)[:, np.newaxis]
+    padding = period * ws + hs + 1 >= len(data)
+    aligned[end:][padding] = 0
+    aligned_mask[end:][padding] = True
+    return np.ma.array(aligned.ravel()[:length].astype(dtype, copy=False),
+                       mask=aligned_mask.ravel()[:length])
+
+
+def _align_upsample(slave_array, r):
+    '''
+    Upsamples the slave array to a power of 2 multiple of its sample rate
+    with the same timing offset. Slave samples are retained and linearly
+    interpolated between (as repair_mask would) where both are unmasked.
+    Interpolated samples where either slave sample is masked, and those
+    after the last slave sample, are masked.
+
+    :param slave_array: Slave data and mask.
+    :type slave_array: np.ma.masked_array
+    :param r: Sample rate ratio of master to slave.
+    :type r: int
+    :returns: Slave array upsampled to master.
+    :rtype: np.ma.array
+    '''
+    data = np.ma.getdata(slave_array).astype(float)
+    mask = np.ma.getmaskarray(slave_array)
+    aligned = np.zeros((len(data), r))
+    aligned_mask = np.ones((len(data), r), dtype=bool)
+    aligned[:, 0] = data
+    aligned_mask[:, 0] = mask
+    repair = ~(mask[:-1] | mask[1:])
+    if repair.any():
+        # Equivalent to np.linspace(start, stop, r + 1)[1:-1].
+        start = data[:-1][repair, np.newaxis]
+        step = (data[1:][repair, np.newaxis] - start) / r
+        aligned[:-1][repair, 1:] = np.arange(1, r) * step + start
+        aligned_mask[:-1][repair, 1:] = False
+    return np.ma.array(aligned.ravel(), mask=aligned_mask.ravel())
+
+
 def align(slave, master, interpolate=True):
     """
     This function takes two parameters which will have been sampled at
@@ -397,80 +577,24 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
     if len_aligned != (len(slave_array) * r):
         raise ValueError("Array length problem in align. Probable cause is flight cutting not at superframe boundary")
 
-    slave_aligned = np.ma.zeros(len(slave_array) * r, dtype=_dtype)
-
     # Where offsets are equal, the slave_array recorded values remain
     # unchanged and interpolation is performed between these values.
     # - and we do not interpolate mapped arrays!
     if not delta and interpolate and (is_power2(slave_frequency) and
                                       is_power2(master_frequency)):
-        slave_aligned.mask = True
         if master_frequency > slave_frequency:
-            # populate values and interpolate
-            slave_aligned[0::r] = slave_array[0::1]
-            # Interpolate and do not extrapolate masked ends or gaps
-            # bigger than the duration between slave samples (i.e. where
-            # original slave data is masked).
-            # If array is fully masked, return array of masked zeros
-            dur_between_slave_samples = 1.0 / slave_frequency
-            return repair_mask(
-                slave_aligned,
-                frequency=master_frequency,
-                repair_duration=dur_between_slave_samples,
-                raise_entirely_masked=False,
-            )
-
+            # populate values and interpolate, but do not extrapolate masked
+            # ends or gaps bigger than the duration between slave samples
+            # (i.e. where original slave data is masked).
+            return _align_upsample(slave_array, int(r))
         else:
             # step through slave taking the required samples
-            return slave_array[0::1/r]
-
-    # Each sample in the master parameter may need different combination parameters
-    for i in range(int(wm)):
-        bracket = (i / r) + delta
-        # Interpolate between the hth and (h+1)th samples of the slave array
-        h = int(floor(bracket))
-        h1 = h + 1
-
-        # Compute the linear interpolation coefficients, b & a
-        b = bracket - h
-
-        # Cunningly, if we are interpolating (working with mapped arrays e.g.
-        # discrete or multi-state parameters), by reverting to 1,0 or 0,1
-        # coefficients we gather the closest value in time to the master
-        # parameter.
-        if not interpolate:
-            b = round(b)
-
-        # Either way, a is the residual part.
-        a = 1 - b
-
-        if h < 0:
-            if h<-ws:
-                raise ValueError('Align called with excessive timing mismatch')
-            # slave_array values do not exist in aligned array
-            if ws==1:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws::ws]
-            else:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws:1-ws:ws]
-            # We can't interpolate the inital values as we are outside the
-            # range of the slave parameters.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i] = 0
-            slave_aligned[i] = np.ma.masked
-        elif h1 >= ws:
-            slave_aligned[i:-wm:wm] = a*slave_array[h:-ws:ws] + b*slave_array[h1::ws]
-            # At the other end, we run out of slave parameter values so need to
-            # pad to the end of the array.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i-wm] = 0
-            slave_aligned[i-wm] = np.ma.masked
-        else:
-            # Sheer bliss. We can compute slave_aligned across the whole
-            # range of the data without having to take special care at the
-            # ends of the array.
-            slave_aligned[i::wm] = a*slave_array[h::ws] + b*slave_array[h1::ws]
+            return slave_array[0::int(1 / r)]
 
-    return slave_aligned
+    # Each sample in the master parameter may need different combination
+    # parameters, which are computed once for each period of wm samples.
+    plan = _align_plan(ws, wm, delta, interpolate)
+    return _align_interpolate(slave_array, plan, ws, len_aligned, _dtype)
 
 
 def align_slices(slave, master, slices):
@@ -684,6 +808,9 @@ def calculate_surface_angle(mode, param, detents):
     :returns: array and frequency
     :rtype: np.ma.array, int or float
     '''
+    # import locally to speed up imports of library.py
+    from scipy.ndimage import filters
+    from scipy.signal import medfilt
     freq_multiplier = 4 if param.frequency < 2 else 2
     freq = param.frequency * freq_multiplier
     # No need to re-align if high frequency.
@@ -2787,6 +2914,8 @@ def ground_track_precise(lat, lon, speed, hdg, frequency, mode):
     :Invalid mode fails with ValueError
     :Mismatched array lengths fails with ValueError
     """
+    # import locally to speed up imports of library.py
+    from scipy import optimize
     # Build arrays to return the computed track.
     lat_return = np_ma_masked_zeros_like(lat)
     lon_return = np_ma_masked_zeros_like(lat)
@@ -2917,6 +3046,116 @@ def hash_array(array, sections, min_samples):
     return checksum.hexdigest()
 
 
+def _clamp_scan(lower, upper, block=16):
+    """
+    Combines a sequence of clamps in place, so that clamping a value between
+    lower[n] and upper[n] gives the same result as clamping it between each
+    of lower[0]..lower[n] and upper[0]..upper[n] in turn.
+
+    The clamps are combined within blocks by doubling the span at each step,
+    and the block totals are combined recursively before being applied to
+    the following blocks.
+
+    :param lower: Lower limits of the clamps, updated in place.
+    :type lower: np.array of floats
+    :param upper: Upper limits of the clamps, updated in place.
+    :type upper: np.array of floats
+    :param block: Number of clamps combined within each block.
+    :type block: int
+    """
+    length = len(lower)
+    blocks = -(-length // block)
+    # Pad with clamps which leave the value unchanged to fill the blocks.
+    block_lower = np.empty(blocks * block)
+    block_upper = np.empty(blocks * block)
+    block_lower[:length] = lower
+    block_upper[:length] = upper
+    block_lower[length:] = -np.inf
+    block_upper[length:] = np.inf
+    block_lower = block_lower.reshape(blocks, block)
+    block_upper = block_upper.reshape(blocks, block)
+    step = 1
+    while step < block:
+        later_lower = block_lower[:, step:]
+        later_upper = block_upper[:, step:]
+        combined_lower = np.minimum(np.maximum(block_lower[:, :-step],
+                                               later_lower), later_upper)
+        combined_upper = np.minimum(np.maximum(block_upper[:, :-step],
+                                               later_lower), later_upper)
+        block_lower[:, step:] = combined_lower
+        block_upper[:, step:] = combined_upper
+        step *= 2
+    if blocks > 1:
+        total_lower = block_lower[:, -1].copy()
+        total_upper = block_upper[:, -1].copy()
+        _clamp_scan(total_lower, total_upper, block)
+        later_lower = block_lower[1:]
+        later_upper = block_upper[1:]
+        combined_lower = np.minimum(np.maximum(total_lower[:-1, np.newaxis],
+                                               later_lower), later_upper)
+        combined_upper = np.minimum(np.maximum(total_upper[:-1, np.newaxis],
+                                               later_lower), later_upper)
+        block_lower[1:] = combined_lower
+        block_upper[1:] = combined_upper
+    lower[:] = block_lower.ravel()[:length]
+    upper[:] = block_upper.ravel()[:length]
+
+
+def _hysteresis_pass(values, quarter_range):
+    """
+    Applies a quarter range of hysteresis along an array of unmasked values,
+    starting from the first value, exactly as the sample by sample
+    recurrence::
+
+        if new - old > quarter_range:
+            old = new - quarter_range
+        elif new - old < -quarter_range:
+            old = new + quarter_range
+
+    Each step clamps the previous output between new - quarter_range and
+    new + quarter_range, and a sequence of clamps is itself a clamp, so the
+    clamps are combined with a few array operations (see _clamp_scan).
+    Combining clamps only involves minimum and maximum, so no rounding is
+    introduced. The result is then checked against the recurrence above and, should floating point
+    rounding make the comparisons disagree with the clamp, the recurrence is
+    continued sample by sample from the first disagreement.
+
+    :param values: Unmasked data for processing.
+    :type values: np.array of floats
+    :param quarter_range: Quarter of the level of hysteresis to apply.
+    :type quarter_range: Float
+    :returns: Data with hysteresis applied.
+    :rtype: np.array of floats
+    """
+    pushed_up = values - quarter_range
+    pushed_down = values + quarter_range
+    # NaN samples fail both comparisons, so leave the output unchanged.
+    nans = np.isnan(values)
+    lower = np.where(nans, -np.inf, pushed_up)
+    upper = np.where(nans, np.inf, pushed_down)
+    _clamp_scan(lower, upper)
+    result = np.minimum(np.maximum(values[0], lower), upper)
+
+    previous = result[:-1]
+    change = values[1:] - previous
+    expected = np.where(change > quarter_range, pushed_up[1:],
+                        np.where(change < -quarter_range, pushed_down[1:],
+                                 previous))
+    wrong = np.flatnonzero(expected.view(np.int64) !=
+                           result[1:].view(np.int64))
+    if len(wrong):
+        index = wrong[0] + 1
+        old = expected[wrong[0]]
+        result[index] = old
+        for index, new in enumerate(values[index + 1:].tolist(), index + 1):
+            if new - old > quarter_range:
+                old = new - quarter_range
+            elif new - old < -quarter_range:
+                old = new + quarter_range
+            result[index] = old
+    return result
+
+
 def hysteresis(array, hysteresis):
     """
     Applies hysteresis to an array of data. The function applies half the
@@ -2939,36 +3178,19 @@ def hysteresis(array, hysteresis):
         return array
 
     quarter_range = hysteresis / 4.0
-    # Length is going to be used often, so prepare here:
-    length = len(array)
-    half_done = np.zeros(length)
-    result = np.zeros(length)
-    length = length-1 #  To be used for array indexing next
+    result = np.zeros(len(array))
 
-    # get a list of the unmasked data - allow for array.mask = False (not an array)
+    # get the unmasked data - allow for array.mask = False (not an array)
     if array.mask is np.False_:
-        notmasked = np.arange(length+1)
+        notmasked = slice(None)
     else:
         notmasked = np.ma.where(array.mask == False)[0]
+    values = np.asarray(array.data[notmasked], dtype=np.float64)
     # The starting point for the computation is the first notmasked sample.
-    old = array[notmasked[0]]
-    for index in notmasked:
-        new = array[index]
-
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        half_done[index] = old
-
-    # Repeat the process in the "backwards" sense to remove phase effects.
-    for index in notmasked[::-1]:
-        new = half_done[index]
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        result[index] = old
+    half_done = _hysteresis_pass(values, quarter_range)
+    # Repeat the process in the "backwards" sense to remove phase effects,
+    # continuing from the last forwards value which starts the reversed data.
+    result[notmasked] = _hysteresis_pass(half_done[::-1], quarter_range)[::-1]
 
     # At the end of the process we reinstate the mask, although the data
     # values may have affected the result.
@@ -3447,6 +3669,40 @@ def is_index_within_slices(index, slices):
     return False
 
 
+def indices_within_slices(indices, slices):
+    '''
+    Vectorised equivalent of is_index_within_slices.
+
+    :type indices: np.ndarray
+    :type slices: [slice]
+    :returns: whether each index is within any of the slices.
+    :rtype: np.ndarray of bool
+    '''
+    indices = np.asarray(indices, dtype=np.float64)
+    within = None
+    for _slice in slices:
+        negative_step = _slice.step is not None and _slice.step < 0
+        if _slice.start is None and _slice.stop is None:
+            return np.ones(indices.shape, dtype=np.bool_)
+        _within = None
+        if _slice.start is not None:
+            if negative_step:
+                _within = indices <= _slice.start
+            else:
+                _within = indices >= _slice.start
+        if _slice.stop is not None:
+            if negative_step:
+                stop_within = indices > _slice.stop
+            else:
+                stop_within = indices < _slice.stop
+            _within = stop_within if _within is None else \
+                _within & stop_within
+        within = _within if within is None else within | _within
+    if within is None:
+        return np.zeros(indices.shape, dtype=np.bool_)
+    return within
+
+
 def filter_slices_length(slices, length):
     '''
     :param slices: List of slices to filter.
@@ -4630,6 +4886,8 @@ def blend_parameters_cubic(this_valid, frequency, min_ip_freq, offset, params, p
     To be used with care as this both gives a smoother transition at sample
     boundaries, but suffers from overswing which can cause problems.
     '''
+    # import locally to speed up imports of library.py
+    from scipy import interpolate as scipy_interpolate
 
     new_t = np.linspace(result_slice.start / frequency,
                         result_slice.stop / frequency,
@@ -4689,20 +4947,24 @@ def blend_parameters_weighting(array, wt):
     result_weight[0] = param_weight[0] / wt
     result_weight[-1] = param_weight[-1] / wt
 
-    for i in range(1, len(param_weight) - 1):
-        if param_weight[i] == 0.0:
-            result_weight[i * wt] = 0.0
-            continue
-        if param_weight[i - 1] == 0.0 or param_weight[i + 1] == 0.0:
-            result_weight[i * wt] = 0.1 # Low weight to tail of valid data. Non-zero to avoid problems of overlapping invalid sections.
-            continue
-        result_weight[i * wt] = 1.0 / wt
-
-    for i in range(1, len(result_weight) - 1):
-        if result_weight[i-1]==0.0 or result_weight[i + 1] == 0.0:
-            final_weight[i]=result_weight[i]/2.0
-        else:
-            final_weight[i]=result_weight[i]
+    if len(param_weight) > 2:
+        weight = np.where(
+            param_weight[1:-1] == 0.0, 0.0,
+            # Low weight to tail of valid data. Non-zero to avoid problems
+            # of overlapping invalid sections.
+            np.where((param_weight[:-2] == 0.0) | (param_weight[2:] == 0.0),
+                     0.1, 1.0 / wt))
+        # Where several samples share an index, the last sample's weight is
+        # kept.
+        index = (np.arange(1, len(param_weight) - 1) * wt).astype(int)
+        last = np.append(index[1:] != index[:-1], True)
+        result_weight[index[last]] = weight[last]
+
+    # Halve the weights next to zero weights. Masked weights are not zero.
+    zero = (result_weight.data == 0.0) & ~np.ma.getmaskarray(result_weight)
+    halve = zero[:-2] | zero[2:]
+    final_weight[1:-1] = np.ma.where(halve, result_weight[1:-1] / 2.0,
+                                     result_weight[1:-1])
     final_weight[0]=result_weight[0]
     final_weight[-1]=result_weight[-1]
 
@@ -5016,35 +5278,21 @@ def truck_and_trailer(data, ttp, overall, trailer, curve_sense, _slice):
     x = np.arange(ttp) + 1 #  The x-axis is always short and constant
     sx = np.sum(x)
     r = sx/float(x[-1]) #
-    trucks = len(data) - ttp + 1 #  How many trucks fit this array length?
-
-    sy = np.empty(trucks) #  Sigma y
-    sy[0]=np.sum(data[0:ttp]) #  Initialise this array with just y values
-
-    sxy = np.empty(trucks) #  Sigma x.y
-    sxy[0]=np.sum(data[0:ttp]*x[0:ttp]) #  Initialise with xy products
 
-    for back in range(trucks-1):
-        # We compute the values for the least squares formula, using the
-        # numerator only (the denominator is constant and we're not really
-        # interested in the answer).
+    # We compute the values for the least squares formula, using the
+    # numerator only (the denominator is constant and we're not really
+    # interested in the answer), for each of the len(data) - ttp + 1
+    # positions of the truck at once.
+    y = np.ma.getdata(data).astype(np.float64)
+    sy = np.convolve(y, np.ones(ttp), mode='valid') #  Sigma y
+    sxy = np.correlate(y, x.astype(np.float64), mode='valid') #  Sigma x.y
 
-        # As we move the back of the truck forward, the trailer front is a
-        # little way ahead...
-        front = back + ttp
-        sy[back+1] = sy[back] - data [back] + data[front]
-        sxy[back+1] = sxy[back] - sy[back] + ttp*data[front]
-
-    m = np.empty(trucks) # Resulting least squares slope (best fit y=mx+c)
-    m = sxy - r*sy
+    m = sxy - r*sy # Resulting least squares slope (best fit y=mx+c)
 
     #  How many places can the truck and trailer fit into this data set?
     places=len(data) - overall + 1
     #  The angle between the truck and trailer at each place it can fit
-    angle=np.empty(places)
-
-    for place in range(places):
-        angle[place] = m[place+trailer] - m[place]
+    angle = m[trailer:trailer + places] - m[:places]
 
     # Normalise array and prepare for masking operations
     if np.max(np.abs(angle)) == 0.0:
@@ -5517,6 +5765,23 @@ def fill_masked_edges(array, fill_value):
     return array
 
 
+def _runs_to_mask(starts, stops, length):
+    '''
+    :param starts: Start indices of runs.
+    :type starts: np.array
+    :param stops: Stop indices of runs.
+    :type stops: np.array
+    :param length: Length of the mask.
+    :type length: int
+    :returns: Mask which is True within the runs.
+    :rtype: np.array(dtype=bool)
+    '''
+    bounds = np.zeros(length + 1, dtype=int)
+    bounds[starts] = 1
+    bounds[stops] -= 1
+    return np.cumsum(bounds[:-1]).astype(bool)
+
+
 def repair_mask(array, frequency=1, repair_duration=REPAIR_DURATION,
                 copy=False, extrapolate=False, repair_above=None,
                 method='interpolate', raise_duration_exceedance=False,
@@ -5526,6 +5791,9 @@ def repair_mask(array, frequency=1, repair_duration=REPAIR_DURATION,
     It is not intended to be used for key point computations, where invalid data
     should remain masked.
 
+    All masked sections are repaired at once from the boundaries of the runs
+    of masked samples, interpolating with np.interp.
+
     :param copy: If True, returns modified copy of array, otherwise modifies the array in-place.
     :param method: Repair method to apply in masked sections, either interpolate, fill_start (fill with value at start of masked section), fill_stop (fill with stop of masked section).
     :param raise_entirely_masked: If True, an exception is raised if the incoming data is entirely masked.
@@ -5553,51 +5821,77 @@ def repair_mask(array, frequency=1, repair_duration=REPAIR_DURATION,
     else:
         repair_samples = None
 
-    masked_sections = np.ma.clump_masked(array)
-
-    for section in masked_sections:
-        length = section.stop - section.start
-        if repair_samples and length > repair_samples:
-            if raise_duration_exceedance:
-                raise ValueError("Length of masked section '%s' exceeds "
-                                 "repair duration '%s'." % (length * frequency,
-                                                            repair_duration))
-            else:
-                continue # Too long to repair
-        elif section.start == 0:
-            if extrapolate or method == 'fill_stop':
-                # TODO: Does it make sense to subtract 1 from the section stop??
-                #array.data[section] = array.data[section.stop - 1]
-                array[section] = array[section.stop]
-            else:
-                continue # Can't interpolate if we don't know the first sample
-
-        elif section.stop == len(array):
-            if extrapolate or method == 'fill_start':
-                array[section] = array[section.start - 1]
-            else:
-                continue # Can't interpolate if we don't know the last sample
-
-        else:
-            start_value = array[section.start - 1]
-            stop_value = array[section.stop]
-            if method == 'interpolate':
-                if (repair_above is None or
-                    (start_value > repair_above and stop_value > repair_above)):
-                    # XXX: Find neater solution, potentially
-                    # scipy.interpolate.InterpolatedUnivariateSpline, as
-                    # optimisation.
-                    array.data[section] = np.linspace(start_value, stop_value,
-                                                      length+2)[1:-1]
-                    array.mask[section] = False
-            elif method == 'fill_start':
-                array[section] = start_value
-            elif method == 'fill_stop':
-                array[section] = stop_value
-            else:
-                raise NotImplementedError('Repair method %s not implemented.',
-                                          method)
-
+    # Boundaries of the masked sections.
+    mask = np.ma.getmaskarray(array)
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    lengths = stops - starts
+    at_start = starts == 0
+    at_end = stops == len(array)
+    middle = ~(at_start | at_end)
+    data = array.data
+    # Values before and after each section, which only exist for sections
+    # within the middle of the array.
+    start_values = data[np.maximum(starts - 1, 0)]
+    stop_values = data[np.minimum(stops, len(array) - 1)]
+
+    repair = np.ones(len(starts), dtype=bool)
+    # Sections are repaired in order until an exception is raised.
+    error = None
+    if repair_samples:
+        too_long = lengths > repair_samples
+        if raise_duration_exceedance and too_long.any():
+            index = np.argmax(too_long)
+            error = (index, ValueError(
+                "Length of masked section '%s' exceeds repair duration "
+                "'%s'." % (lengths[index] * frequency, repair_duration)))
+        repair &= ~too_long
+    if not (extrapolate or method == 'fill_stop'):
+        # Can't interpolate if we don't know the first sample
+        repair &= ~at_start
+    if not (extrapolate or method == 'fill_start'):
+        # Can't interpolate if we don't know the last sample
+        repair &= ~at_end
+    if method not in ('interpolate', 'fill_start', 'fill_stop') and \
+       (repair & middle).any():
+        index = np.argmax(repair & middle)
+        if error is None or index < error[0]:
+            error = (index, NotImplementedError(
+                'Repair method %s not implemented.', method))
+    if method == 'interpolate' and repair_above is not None:
+        repair &= ~middle | ((start_values > repair_above) &
+                             (stop_values > repair_above))
+    if error is not None:
+        repair[error[0]:] = False
+
+    if method == 'interpolate':
+        interpolate = repair & middle
+        repair &= ~middle
+    else:
+        interpolate = None
+
+    if repair.any():
+        # Sections at the start of the array take the first unmasked value
+        # and those at the end take the last.
+        values = np.where(
+            at_start | (middle & (method == 'fill_stop')),
+            stop_values, start_values)
+        # Set the raw values of MappedArrays.
+        np.ma.MaskedArray.__setitem__(
+            array, _runs_to_mask(starts[repair], stops[repair], len(array)),
+            np.repeat(values[repair], lengths[repair]))
+
+    if interpolate is not None and interpolate.any():
+        indices = np.flatnonzero(
+            _runs_to_mask(starts[interpolate], stops[interpolate],
+                          len(array)))
+        unmasked = np.flatnonzero(~mask)
+        array.data[indices] = np.interp(indices, unmasked, data[unmasked])
+        array.mask[indices] = False
+
+    if error is not None:
+        raise error[1]
     return array
 
 
@@ -6720,9 +7014,20 @@ def touchdown_inertial(land, roc, alt):
 
     # Start at the beginning...
     sm_ht[0] = alt.array[startpoint]
-    #...and calculate each with a weighted correction factor.
-    for i in range(1, len(sm_ht)):  # FIXME: Slow - esp. when landing covers a large period - perhaps second check that altitude is sensible?
-        sm_ht[i] = (1.0-tau)*sm_ht[i-1] + tau*my_alt[i-1] + my_roc[i]/60.0/roc.hz
+    #...and calculate each with a weighted correction factor, applying
+    # sm_ht[i] = (1.0-tau)*sm_ht[i-1] + tau*my_alt[i-1] + my_roc[i]/60.0/roc.hz
+    # as a first order recursive filter.
+    if len(sm_ht) > 1:
+        from scipy.signal import lfilter
+        correction = tau * my_alt[:-1] + my_roc[1:] / 60.0 / roc.hz
+        sm_ht[1:] = lfilter([1.0], [1.0, tau - 1.0], correction.filled(0.0),
+                            zi=[(1.0 - tau) * sm_ht.data[0]])[0]
+        # Masked values are carried forwards by the recurrence.
+        mask = np.ma.getmaskarray(sm_ht)
+        mask[1:] |= np.ma.getmaskarray(correction)
+        mask = np.logical_or.accumulate(mask)
+        sm_ht.data[mask] = 0.0
+        sm_ht.mask = mask
 
 
     '''
@@ -6739,7 +7044,7 @@ def touchdown_inertial(land, roc, alt):
     # using wheel switches.
     index = index_at_value(sm_ht, 0.0)
     if index:
-        roc_tdn = my_roc[index]
+        roc_tdn = my_roc[int(index)]
         return Value(index + startpoint, roc_tdn)
     else:
         return Value(None, None)
@@ -7069,6 +7374,8 @@ def index_at_distance(distance, index_ref, latitude_ref, longitude_ref, latitude
     :rtype: float
     :raises: ValueError
     '''
+    # import locally to speed up imports of library.py
+    from scipy import optimize
 
     def distance_error(index, *args):
         radius = args[0]
@@ -7363,18 +7670,17 @@ def _value(array, _slice, operator, start_edge=None, stop_edge=None):
         raise ValueError("Negative step not supported")
     if np.ma.count(array[search_slice]):
         # get start_edge and stop_edge values if required
-        if start_edge:
-            start_result = value_at_index(array, start_edge)
-            if start_result is not None and start_result is not np.ma.masked:
-                values.append((start_result, start_edge))
+        if start_edge or stop_edge:
+            start_result, stop_result = values_at_indices(
+                array, [start_edge, stop_edge])
+        if start_edge and start_result is not np.ma.masked:
+            values.append((start_result, start_edge))
         # floor the start position as it will have been floored during the slice
         value_index = operator(array[search_slice]) + floor(search_slice.start or 0) * (search_slice.step or 1)
         value = array[value_index]
         values.append((value, value_index))
-        if stop_edge:
-            stop_result = value_at_index(array, stop_edge)
-            if stop_result is not None and stop_result is not np.ma.masked:
-                values.append((stop_result, stop_edge))
+        if stop_edge and stop_result is not np.ma.masked:
+            values.append((stop_result, stop_edge))
         result_idx = operator(np.ma.array(values)[:,0])
         return Value(values[result_idx][1], values[result_idx][0])
 
@@ -7463,16 +7769,17 @@ def value_at_index(array, index, interpolate=True):
         r = index - low
         low_value = array.data[low]
         high_value = array.data[high]
-        # Crude handling of masked values. TODO: Must be a better way !
-        if array.mask.any(): # An element is masked
-            if array.mask[low] == True:
-                if array.mask[high] == True:
+        # Only the neighbouring samples' mask is inspected so that the cost
+        # of each call does not depend upon the length of the array.
+        mask = np.ma.getmask(array)
+        if mask is not np.ma.nomask:
+            if mask[low]:
+                if mask[high]:
                     return None
                 else:
                     return high_value
-            else:
-                if array.mask[high] == True:
-                    return low_value
+            elif mask[high]:
+                return low_value
         # If not interpolating and no mask or masked samples:
         if not interpolate:
             return array[index + 0.5]
@@ -7480,6 +7787,56 @@ def value_at_index(array, index, interpolate=True):
         return r * high_value + (1 - r) * low_value
 
 
+def values_at_indices(array, indices, interpolate=True):
+    '''
+    Finds the values of the data in array at many indices. Equivalent to
+    calling value_at_index for each index, but the samples neighbouring all
+    of the indices are gathered at once.
+
+    :param array: input data
+    :type array: masked array
+    :param indices: indices into the array where we want to find the array
+        values. As with value_at_index, None is treated as an index before
+        the start of the array.
+    :type indices: iterable of float or None
+    :param interpolate: whether to interpolate the value if index is float.
+    :type interpolate: boolean
+    :returns: interpolated values from the array, masked where
+        value_at_index would return None or a masked value.
+    :rtype: np.ma.array
+    '''
+    indices = np.array(indices, dtype=np.float64, ndmin=1)
+    data = np.ma.getdata(array)
+    # Samples outside the array boundaries (or None) take the first or last
+    # value.
+    location = np.clip(np.where(np.isnan(indices), 0, indices), 0,
+                       len(data) - 1)
+    low = location.astype(np.intp)
+    high = np.minimum(low + 1, len(data) - 1)
+    exact = low == location
+    low_value = data[low]
+    high_value = data[high]
+
+    mask = np.ma.getmask(array)
+    if mask is np.ma.nomask:
+        low_masked = high_masked = np.zeros(len(indices), dtype=np.bool_)
+    else:
+        low_masked = mask[low]
+        high_masked = mask[high]
+
+    if interpolate:
+        r = location - low
+        values = np.where(exact, low_value,
+                          r * high_value + (1 - r) * low_value)
+    else:
+        values = data[np.where(exact, low, (location + 0.5).astype(np.intp))]
+    # Crude handling of masked values as within value_at_index.
+    values = np.where(~exact & low_masked, high_value, values)
+    values = np.where(~exact & ~low_masked & high_masked, low_value, values)
+    masked = low_masked & (exact | high_masked)
+    return np.ma.array(values, mask=masked)
+
+
 def vstack_params(*params):
     '''
     Create a multi-dimensional masked array with a dimension per param.
@@ -7568,6 +7925,38 @@ def vstack_params_where_state(*param_states):
     return np.ma.vstack(param_arrays)
 
 
+def _sliding_min_max(array, width):
+    '''
+    Minimum and maximum of each sliding window of width values, using the
+    van Herk/Gil-Werman algorithm: the array is split into blocks of width
+    values, and each window's minimum and maximum combines the remainder of
+    one block with the start of the next, so each value is only compared a
+    few times regardless of the width.
+
+    :param array: Data to find sliding window minimums and maximums of.
+    :type array: np.array
+    :param width: Number of values within each window.
+    :type width: int
+    :returns: Minimums and maximums of the len(array) - width + 1 windows.
+    :rtype: (np.array, np.array)
+    '''
+    count = len(array) - width + 1
+    if count <= 0:
+        return array[:0], array[:0]
+    blocks = -(-len(array) // width)
+    # Values padding the last block are never within a complete window.
+    padded = np.zeros(blocks * width, dtype=array.dtype)
+    padded[:len(array)] = array
+    padded = padded.reshape(blocks, width)
+    results = []
+    for function in (np.minimum, np.maximum):
+        from_start = function.accumulate(padded, axis=1).ravel()
+        to_end = function.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+        results.append(function(to_end[:count],
+                                from_start[width - 1:width - 1 + count]))
+    return tuple(results)
+
+
 def second_window(array, frequency, seconds, extend_window=False):
     '''
     Only include values which are maintained for a number of seconds, shorter
@@ -7613,34 +8002,43 @@ def second_window(array, frequency, seconds, extend_window=False):
     #  [6, 7, 8],
     #  [7, 8, 9]]
 
-    sliding_window = np.lib.stride_tricks.as_strided(
-        array, shape=(len(array) - samples, samples + 1),
-        strides=array.strides * 2)
+    # Calculate min and max over each sliding window of samples + 1 values.
+    # For 3 samples, the array [1, 2, 3, 4, 5, 6, 7, 8, 9] has the windows
+    # [1, 2, 3, 4], [2, 3, 4, 5] ... [6, 7, 8, 9]
+    data = np.ma.getdata(array)
+    min_, max_ = _sliding_min_max(data, samples + 1)
 
-    # Calculate min and max over the last axis (for each sliding window)
-    # Optimization: convert array to list for indexing (161 ms -> 124 ms)
-    min_ = np.min(sliding_window, axis=-1).tolist()
-    max_ = np.max(sliding_window, axis=-1).tolist()
-
-    unmasked_slices = np.ma.clump_unmasked(array)
-
-    # Optimization: local namespace (17 ms -> 6 ms)
-    window_array_data = window_array.data
-
-    for unmasked_slice in filter_slices_length(unmasked_slices, samples):
-        start = unmasked_slice.start
-        last_value = array[start]
-        window_stop = unmasked_slice.stop - samples
-        # We set already the mask to False where we are going to insert
-        # values. That is from start up to stop-sample_idx
-        # Much faster than setting the value in the masked array item by item
-        window_array.mask[start:window_stop] = False
-        for idx in xrange(start, window_stop):
-            # Clip the last value between sliding window min and max
-            last_value = min(max(last_value, min_[idx]), max_[idx])
-            # Set this value in the data object of the masked array.
-            # Much faster than using window_array[start+i] = last_value
-            window_array_data[idx] = last_value
+    # Slices of samples or fewer values have no complete sliding windows.
+    unmasked_slices = filter_slices_length(np.ma.clump_unmasked(array),
+                                           samples + 1)
+    if not unmasked_slices:
+        return window_array
+    starts = np.array([s.start for s in unmasked_slices])
+    stops = np.array([s.stop for s in unmasked_slices]) - samples
+    valid = _runs_to_mask(starts, stops, len(min_))
+
+    # Each value is the last value clipped between the sliding window min
+    # and max. The clips of every sliding window are combined at once (see
+    # _clamp_scan), having replaced the clip at the start of each unmasked
+    # slice with the first value of the slice. Windows containing NaN leave
+    # the last value unchanged.
+    lower = min_.astype(np.float64)
+    upper = max_.astype(np.float64)
+    nans = np.isnan(lower)
+    lower[nans] = -np.inf
+    upper[nans] = np.inf
+    first_values = data[starts].astype(np.float64)
+    first_nans = np.isnan(first_values)
+    # A slice starting with NaN remains NaN; use a placeholder to prevent
+    # NaN being carried into the following slices.
+    lower[starts] = upper[starts] = np.where(first_nans, 0.0, first_values)
+    _clamp_scan(lower, upper)
+    if first_nans.any():
+        lower[_runs_to_mask(starts[first_nans], stops[first_nans],
+                            len(lower))] = np.nan
+
+    window_array.data[:len(lower)][valid] = lower[valid]
+    window_array.mask[:len(lower)][valid] = False
 
     '''
     import matplotlib.pyplot as plt
@@ -7,11 +7,13 @@ import numpy as np
 import cPickle
 import re
 import pprint
+import threading
+import time
 
 from abc import ABCMeta
-from collections import namedtuple, Iterable
+from collections import namedtuple, Iterable, OrderedDict
 from functools import total_ordering
-from itertools import product
+from itertools import izip, product
 from operator import attrgetter
 
 from analysis_engine.library import (
@@ -19,6 +21,7 @@ from analysis_engine.library import (
     align_slices,
     all_deps,
     find_edges,
+    indices_within_slices,
     is_index_within_slice,
     is_index_within_slices,
     is_slice_within_slice,
@@ -32,8 +35,8 @@ from analysis_engine.library import (
     slices_between,
     slices_from_to,
     slices_remove_small_gaps,
-    value_at_index,
     value_at_time,
+    values_at_indices,
 )
 from analysis_engine.recordtype import recordtype
 from analysis_engine.settings import NODE_CACHE_OFFSET_DP
@@ -56,6 +59,9 @@ KeyTimeInstance = recordtype('KeyTimeInstance',
                              'index name datetime latitude longitude',
                              default=None)
 Section = namedtuple('Section', 'name slice start_edge stop_edge')  # Q: rename mask -> slice/section
+# Struct-of-arrays representation of KPV and KTI items where name contains
+# codes of names.
+NodeColumns = namedtuple('NodeColumns', 'index value name names')
 
 
 # Ref: django/db/models/options.py:20
@@ -164,6 +170,39 @@ def get_param_kwarg_names(method):
 # Abstract Node Classes
 # =====================
 
+def can_operate_attributes(node_class):
+    '''
+    Attributes declared as keyword arguments of a Node class' can_operate
+    method, e.g. can_operate(cls, available, ac_type=A('Aircraft Type')).
+
+    :param node_class: Node class.
+    :type node_class: class
+    :returns: Attributes in the order of the keyword arguments.
+    :rtype: (Attribute,)
+    :raises TypeError: If a keyword argument is not an Attribute.
+    '''
+    # OPT: getargspec is slow, inspect each class once.
+    try:
+        return _can_operate_attributes[node_class]
+    except KeyError:
+        pass
+    # NOTE: Raises "Unbound method" here due to can_operate being
+    # overridden without wrapping with @classmethod decorator
+    attributes = []
+    argspec = inspect.getargspec(node_class.can_operate)
+    if argspec.defaults:
+        for default in argspec.defaults:
+            if not isinstance(default, Attribute):
+                raise TypeError('Only Attributes may be keyword '
+                                'arguments in can_operate methods.')
+            attributes.append(default)
+    attributes = _can_operate_attributes[node_class] = tuple(attributes)
+    return attributes
+
+
+_can_operate_attributes = {}
+
+
 def _calculate_offset(frequency, offset):
     '''
     Simple function to calculate offset when aligning nodes to different frequencies.
@@ -172,6 +211,106 @@ def _calculate_offset(frequency, offset):
     return offset % (1.0 / frequency)
 
 
+def array_nbytes(node):
+    '''
+    Bytes used by a node's array including its mask.
+
+    :param node: Node which may have an array attribute.
+    :returns: Number of bytes or 0 if the node does not have an array.
+    :rtype: int
+    '''
+    array = getattr(node, 'array', None)
+    if not isinstance(array, np.ndarray):
+        return 0
+    nbytes = array.nbytes
+    mask = np.ma.getmask(array)
+    if mask is not np.ma.nomask:
+        nbytes += mask.nbytes
+    return nbytes
+
+
+class NodeCache(dict):
+    '''
+    Cache of aligned Nodes (see Node.cache_key) which counts cache hits and
+    misses.
+
+    The bytes used by cached arrays are counted and, if max_bytes is set, the
+    least recently used Nodes are evicted once the budget is exceeded. Nodes
+    may also be evicted by name once they are no longer required.
+    '''
+    def __init__(self, *args, **kwargs):
+        self.max_bytes = kwargs.pop('max_bytes', None)
+        super(NodeCache, self).__init__()
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        # Bytes of each key in order of least recently used.
+        self._sizes = OrderedDict()
+        self._lock = threading.RLock()
+        for key, node in dict(*args, **kwargs).iteritems():
+            self[key] = node
+
+    def get(self, key, default=None):
+        with self._lock:
+            node = super(NodeCache, self).get(key, default)
+            if node is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if key in self._sizes:
+                    self._sizes[key] = self._sizes.pop(key)
+        return node
+
+    def __setitem__(self, key, node):
+        with self._lock:
+            if key in self:
+                del self[key]
+            super(NodeCache, self).__setitem__(key, node)
+            size = self._sizes[key] = array_nbytes(node)
+            self.nbytes += size
+            if self.max_bytes is None:
+                return
+            while self.nbytes > self.max_bytes:
+                oldest = next(iter(self._sizes))
+                if oldest == key:
+                    break
+                del self[oldest]
+
+    def __delitem__(self, key):
+        with self._lock:
+            super(NodeCache, self).__delitem__(key)
+            self.nbytes -= self._sizes.pop(key, 0)
+
+    def pop(self, key, *default):
+        with self._lock:
+            if key not in self:
+                return super(NodeCache, self).pop(key, *default)
+            node = self[key]
+            del self[key]
+            return node
+
+    def clear(self):
+        with self._lock:
+            super(NodeCache, self).clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def evict(self, name):
+        '''
+        Evict all aligned copies of a Node.
+
+        :param name: Name of the Node.
+        :type name: str
+        :returns: Number of Nodes evicted.
+        :rtype: int
+        '''
+        with self._lock:
+            keys = [k for k in self if k[0] == name]
+            for key in keys:
+                del self[key]
+        return len(keys)
+
+
 class Node(object):
     '''
     Note about aligning options
@@ -351,7 +490,7 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
         :returns: Cached Node if it exists, else None.
         :rtype: Node or None
         '''
-        return self._cache.get(key) if self._cache else None
+        return self._cache.get(key) if self._cache is not None else None
 
     def set_cache(self, key, node):
         '''
@@ -373,7 +512,7 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
         """
         raise NotImplementedError("Abstract Method")
 
-    def get_derived(self, args):
+    def get_derived(self, args, profile=None):
         """
         Accessor for derive method which first aligns all parameters to the
         first to ensure parameter data and indices are consistent.
@@ -382,9 +521,18 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
 
         :param args: List of available Parameter objects
         :type args: list
+        :param profile: Optional dictionary to record the time spent aligning
+            dependencies ('align_time') and deriving ('derive_time'), the
+            bytes of aligned arrays created ('bytes') and alignment cache hits
+            and misses ('cache_hits' and 'cache_misses').
+        :type profile: dict or None
         :returns: self after having aligned dependencies and called derive.
         :rtype: self
         """
+        if profile is not None:
+            profile.update(align_time=0.0, bytes=0, cache_hits=0,
+                           cache_misses=0)
+            start = time.time()
         assert len(args) == len(self.get_dependency_names()), \
             '%s: incorrect number of arguments for derive() method' % self.__class__.__name__
         dependencies_to_align = \
@@ -415,12 +563,22 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
             aligned_args = []
             for arg in args:
                 if arg in dependencies_to_align:
+                    if profile is not None:
+                        hits = getattr(self._cache, 'hits', 0)
+                        misses = getattr(self._cache, 'misses', 0)
                     try:
                         aligned_arg = arg.get_aligned(self)
                     except AttributeError:
                         # If parameter came from an HDF its missing get_aligned
                         arg = derived_param_from_hdf(arg, cache=self._cache)
                         aligned_arg = arg.get_aligned(self)
+                    if profile is not None:
+                        if getattr(self._cache, 'hits', 0) > hits:
+                            profile['cache_hits'] += 1
+                        else:
+                            if getattr(self._cache, 'misses', 0) > misses:
+                                profile['cache_misses'] += 1
+                            profile['bytes'] += array_nbytes(aligned_arg)
                     aligned_args.append(aligned_arg)
                 else:
                     aligned_args.append(arg)
@@ -430,6 +588,9 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
             self.frequency = dependencies_to_align[0].frequency
             self.offset = dependencies_to_align[0].offset
 
+        if profile is not None:
+            derive_start = time.time()
+            profile['align_time'] = derive_start - start
         try:
             res = self.derive(*args)
         except Exception:
@@ -437,6 +598,10 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
                            'Nodes used to derive:\n  %s',
                            self.name, '\n  '.join(repr(n) for n in args))
             raise
+        finally:
+            if profile is not None:
+                profile['derive_time'] = time.time() - derive_start
+                profile['bytes'] += array_nbytes(self)
 
         if res is NotImplemented:
             raise NotImplementedError("Class '%s' derive method is not implemented." %
@@ -650,6 +815,23 @@ class DerivedParameterNode(Node):
             secs = float(secs)
         return value_at_time(self.array, self.frequency, self.offset, secs)
 
+    def at_many(self, secs):
+        """
+        Gets the values within the array at many times in seconds. Equivalent
+        to calling at for each time.
+
+        :param secs: times from start of data in seconds, None is permitted.
+        :type secs: iterable of float or None
+        :returns: The interpolated values of the array, masked where at would
+            return None or a masked value.
+        :rtype: np.ma.array
+        """
+        secs = np.array(secs, dtype=np.float64, ndmin=1)
+        # See value_at_time: timedelta truncates to 6 digits, therefore round
+        # offset down.
+        locations = (secs - round(self.offset - 0.0000005, 6)) * self.frequency
+        return values_at_indices(self.array, locations)
+
     def get_aligned(self, param):
         '''
         :param param: Node to align copy to.
@@ -975,12 +1157,329 @@ def derived_param_from_hdf(hdf_parameter, cache=None):
         )
 
 
+class LazyDerivedParameterNode(DerivedParameterNode):
+    '''
+    DerivedParameterNode whose array is loaded on first access.
+
+    The name, frequency, offset and other attributes are available
+    immediately, while the array is returned by calling loader when it is
+    first accessed. Nodes which only inspect the frequency and offset of a
+    parameter, or which are aligned from the node cache, never load the
+    array.
+    '''
+    def __init__(self, loader=None, *args, **kwargs):
+        '''
+        :param loader: Callable returning the array. Nodes created without a
+            loader, e.g. aligned copies (see get_aligned), are not lazy.
+        :type loader: callable or None
+        '''
+        super(LazyDerivedParameterNode, self).__init__(*args, **kwargs)
+        if loader is not None:
+            del self.array
+            self._array_loader = loader
+
+    def __getattr__(self, name):
+        '''
+        Load the array if it has not yet been loaded.
+        '''
+        loader = self.__dict__.get('_array_loader')
+        if name != 'array' or loader is None:
+            raise AttributeError(name)
+        self.array = loader()
+        self.__dict__.pop('_array_loader', None)
+        return self.__dict__['array']
+
+    def __getstate__(self):
+        '''
+        Load the array before pickling as the loader cannot be pickled.
+        '''
+        self.array
+        return super(LazyDerivedParameterNode, self).__getstate__()
+
+    @property
+    def loaded(self):
+        '''
+        :returns: Whether the array has been loaded.
+        :rtype: bool
+        '''
+        return '_array_loader' not in self.__dict__
+
+
+class LazyMultistateDerivedParameterNode(LazyDerivedParameterNode,
+                                         MultistateDerivedParameterNode):
+    '''
+    MultistateDerivedParameterNode whose array is loaded on first access.
+    '''
+    pass
+
+
+def lazy_param_from_hdf(hdf_parameter, loader, cache=None):
+    '''
+    Wraps the attributes of an HDF parameter with either
+    LazyDerivedParameterNode or LazyMultistateDerivedParameterNode classes.
+    The array of hdf_parameter is only used to determine the class.
+
+    :type hdf_parameter: Parameter from an HDF file
+    :param loader: Callable returning the parameter's array.
+    :type loader: callable
+    :rtype: LazyDerivedParameterNode or LazyMultistateDerivedParameterNode
+    '''
+    kwargs = dict(name=hdf_parameter.name,
+                  frequency=hdf_parameter.frequency,
+                  offset=hdf_parameter.offset,
+                  data_type=hdf_parameter.data_type, cache=cache)
+    if isinstance(hdf_parameter.array, MappedArray):
+        return LazyMultistateDerivedParameterNode(
+            loader, values_mapping=hdf_parameter.values_mapping, **kwargs)
+    return LazyDerivedParameterNode(loader, **kwargs)
+
+
+def _invalidates_index(name, attribute='_section_index'):
+    '''
+    Wraps a list method so that calling it discards an index built from the
+    items of a node, such as the SectionIndex of a SectionNode or the
+    NodeColumns of a FormattedNameNode.
+    '''
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        setattr(self, attribute, None)
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+class SectionIndex(object):
+    '''
+    Sorted interval index of the sections within a SectionNode.
+
+    Section slice starts and stops are stored within float arrays. Following
+    Python 2 comparison semantics, None compares lower than any index,
+    therefore a start or stop of None is -inf when ordering or comparing
+    sections. When testing whether a section contains an index, a stop of
+    None is open-ended (+inf).
+
+    Arrays are positioned by the order of sections within the node and
+    sorted orders are stable, matching sorted() over the sections.
+    '''
+    def __init__(self, sections, orders=None):
+        '''
+        :param sections: Sections to index.
+        :type sections: [Section]
+        :param orders: Optional sorted orders carried from the index of
+            another node with the same number of sections, which are reused
+            if they are still valid.
+        :type orders: dict or None
+        '''
+        slices = [s.slice for s in sections]
+        self.size = len(slices)
+        starts = [s.start for s in slices]
+        stops = [s.stop for s in slices]
+        self.start_none = np.array([x is None for x in starts],
+                                   dtype=np.bool_)
+        self.stop_none = np.array([x is None for x in stops], dtype=np.bool_)
+        self.start = np.array([-np.inf if x is None else x for x in starts],
+                              dtype=np.float64)
+        self.stop = np.array([-np.inf if x is None else x for x in stops],
+                             dtype=np.float64)
+        # Stops where None is open-ended.
+        self.end = np.where(self.stop_none, np.inf, self.stop)
+        self.negative_step = any(s.step is not None and s.step < 0
+                                 for s in slices)
+        self.unsupported_step = any(s.step is not None and s.step < 1
+                                    for s in slices)
+        self.slices = slices
+        self.names = {}
+        for position, section in enumerate(sections):
+            self.names.setdefault(section.name, []).append(position)
+        self._orders = {}
+        for by, order in (orders or {}).iteritems():
+            steps = np.diff(self.keys(by)[order])
+            if np.all((steps > 0) | ((steps == 0) & (np.diff(order) > 0))):
+                self._orders[by] = order
+        self._sorted = {}
+
+    def keys(self, by):
+        '''
+        :param by: Either 'start' or 'stop' of slice.
+        :type by: str
+        :returns: Slice starts or stops where None is -inf.
+        :rtype: np.ndarray
+        '''
+        return {'start': self.start, 'stop': self.stop}[by]
+
+    def order(self, by='start'):
+        '''
+        :param by: Either 'start' or 'stop' of slice.
+        :type by: str
+        :returns: Positions of sections stably sorted by start or stop.
+        :rtype: np.ndarray
+        '''
+        try:
+            return self._orders[by]
+        except KeyError:
+            order = self._orders[by] = np.argsort(self.keys(by),
+                                                  kind='mergesort')
+            return order
+
+    def _sorted_by_start(self, name):
+        '''
+        :param name: Either 'start', 'stop' or 'end'.
+        :type name: str
+        :returns: Values in start order and whether they are non-decreasing.
+        :rtype: (np.ndarray, bool)
+        '''
+        try:
+            return self._sorted[name]
+        except KeyError:
+            values = getattr(self, name)[self.order('start')]
+            ascending = bool(np.all(np.diff(values) >= 0))
+            self._sorted[name] = values, ascending
+            return values, ascending
+
+    def containing(self, index, inclusive=False):
+        '''
+        Sections with a start before or at index and a stop after index (or
+        at index if inclusive). Steps of slices are not considered.
+
+        :type index: int or float
+        :type inclusive: bool
+        :returns: Positions of sections containing index in node order.
+        :rtype: np.ndarray
+        '''
+        order = self.order('start')
+        starts = self._sorted_by_start('start')[0]
+        ends, ascending = self._sorted_by_start('end')
+        hi = np.searchsorted(starts, index, side='right')
+        if ascending:
+            # Sections are not nested, therefore the sections containing
+            # index are contiguous in start order.
+            lo = np.searchsorted(ends, index,
+                                 side='left' if inclusive else 'right')
+            positions = order[lo:hi] if lo < hi else order[:0]
+        else:
+            within = ends[:hi] >= index if inclusive else ends[:hi] > index
+            positions = order[:hi][within]
+        return np.sort(positions)
+
+    def within(self, outer, within_use='slice'):
+        '''
+        Vectorised equivalent of is_slice_within_slice for every section.
+
+        :type outer: slice
+        :param within_use: Either 'slice', 'start', 'stop' or 'any'.
+        :type within_use: str
+        :returns: Whether each section is within the outer slice.
+        :rtype: np.ndarray of bool
+        '''
+        start_none, stop_none = self.start_none, self.stop_none
+        if within_use == 'slice':
+            if outer.start is None and outer.stop is None:
+                return np.ones(self.size, dtype=np.bool_)
+            elif outer.start is None:
+                return ~stop_none & np.where(
+                    start_none, self.stop < outer.stop,
+                    (self.start <= outer.stop) & (self.stop <= outer.stop))
+            elif outer.stop is None:
+                return ~start_none & (self.start >= outer.start)
+            return (~start_none & ~stop_none &
+                    (outer.start <= self.start) & (self.start <= outer.stop) &
+                    (outer.start <= self.stop) & (self.stop <= outer.stop))
+        elif within_use in ('start', 'stop'):
+            return indices_within_slices(self.keys(within_use), [outer])
+        elif within_use == 'any':
+            if self.size and (self.unsupported_step or outer.step is not None and
+                              outer.step < 1):
+                raise ValueError("Negative step not supported")
+            within = np.ones(self.size, dtype=np.bool_)
+            if outer.stop is not None:
+                within &= self.start < outer.stop
+            if outer.start is not None:
+                within &= stop_none | (outer.start < self.stop)
+            return within
+        return np.zeros(self.size, dtype=np.bool_)
+
+    def positions(self, name=None, containing_index=None, within_slice=None,
+                  within_use='slice'):
+        '''
+        :returns: Positions of sections matching the conditions in node
+            order. See SectionNode._get_positions.
+        :rtype: np.ndarray
+        '''
+        if containing_index is None:
+            positions = None
+        elif self.negative_step:
+            positions = np.array(
+                [p for p, s in enumerate(self.slices)
+                 if is_index_within_slice(containing_index, s)],
+                dtype=np.intp)
+        else:
+            positions = self.containing(containing_index)
+        if name:
+            named = np.array(self.names.get(name, []), dtype=np.intp)
+            positions = named if positions is None else \
+                np.intersect1d(positions, named, assume_unique=True)
+        if within_slice:
+            within = self.within(within_slice, within_use=within_use)
+            positions = np.flatnonzero(within) if positions is None else \
+                positions[within[positions]]
+        if positions is None:
+            positions = np.arange(self.size)
+        return positions
+
+    def next_position(self, index, use='start'):
+        '''
+        :returns: Position of the first section in start order where the
+            use of its slice is after index or None.
+        :rtype: int or None
+        '''
+        if use == 'start':
+            order = self.order('start')
+            i = np.searchsorted(self._sorted_by_start('start')[0], index,
+                                side='right')
+            return order[i] if i < self.size else None
+        return self._first(self.order('start'), use, index, reverse=False)
+
+    def previous_position(self, index, use='stop'):
+        '''
+        :returns: Position of the last section in start order where the use
+            of its slice is before index or None.
+        :rtype: int or None
+        '''
+        order = self.order('start')
+        values, ascending = self._sorted_by_start(use)
+        if ascending:
+            i = np.searchsorted(values, index, side='left')
+            return order[i - 1] if i else None
+        return self._first(order, use, index, reverse=True)
+
+    def _first(self, ordered, use, index, reverse=False):
+        '''
+        :param ordered: Positions of sections in the order to search.
+        :type ordered: np.ndarray
+        :param reverse: Find the last section with the use of its slice
+            before index rather than the first after index.
+        :type reverse: bool
+        :rtype: int or None
+        '''
+        values = self.keys(use)[ordered]
+        if reverse:
+            matching = np.flatnonzero(values < index)
+            return ordered[matching[-1]] if len(matching) else None
+        matching = np.flatnonzero(values > index)
+        return ordered[matching[0]] if len(matching) else None
+
+
 class SectionNode(Node, list):
     '''
     Derives from list to implement iteration and list methods.
 
     Is a list of Section namedtuples, each with attributes .name, .slice,
     .start_edge and .stop_edge
+
+    Queries use a SectionIndex which is built on first use and discarded
+    when the list is modified.
     '''
     node_type_abbr = 'Phase'
 
@@ -996,6 +1495,40 @@ class SectionNode(Node, list):
             del kwargs['items']
         super(SectionNode, self).__init__(*args, **kwargs)
 
+    append = _invalidates_index('append')
+    extend = _invalidates_index('extend')
+    insert = _invalidates_index('insert')
+    pop = _invalidates_index('pop')
+    remove = _invalidates_index('remove')
+    reverse = _invalidates_index('reverse')
+    sort = _invalidates_index('sort')
+    __setitem__ = _invalidates_index('__setitem__')
+    __delitem__ = _invalidates_index('__delitem__')
+    __setslice__ = _invalidates_index('__setslice__')
+    __delslice__ = _invalidates_index('__delslice__')
+    __iadd__ = _invalidates_index('__iadd__')
+    __imul__ = _invalidates_index('__imul__')
+
+    def __getstate__(self):
+        '''
+        Do not pickle the section index.
+        '''
+        state = super(SectionNode, self).__getstate__()
+        if '_section_index' in state:
+            state = state.copy()
+            del state['_section_index']
+        return state
+
+    def section_index(self):
+        '''
+        :returns: Interval index of the sections within self.
+        :rtype: SectionIndex
+        '''
+        index = getattr(self, '_section_index', None)
+        if index is None:
+            index = self._section_index = SectionIndex(self)
+        return index
+
     def create_section(self, section_slice, name='', begin=None, end=None):
         """
         Create a slice of the data.
@@ -1032,50 +1565,69 @@ class SectionNode(Node, list):
     def get_aligned(self, param):
         '''
         Creates a copy with section slices aligned to the frequency and offset
-        of param.
+        of param. Returns self if the frequency and offset already match.
 
         :param param: Parameter to align the copy of self to.
         :type param: Parameter object
         :returns: An object of the same type as self containing matching elements.
         :rtype: self.__class__
         '''
+        if param.frequency == self.frequency and param.offset == self.offset:
+            return self
+
         aligned_node = self.__class__(frequency=param.frequency,
                                       offset=param.offset)
 
         multiplier = param.frequency / self.frequency
         offset = (self.offset - param.offset) * param.frequency
-        for section in self:
-
-            if section.start_edge is None:
-                converted_start = inner_slice_start = None
-            else:
-                converted_start = (section.start_edge * multiplier) + offset
-                inner_slice_start = int(math.ceil(converted_start))
-                # dont allow minus start edges.
-                if converted_start < 0.0:
-                    converted_start = 0.0
-
-            if section.stop_edge is None:
-                converted_stop = inner_slice_stop = None
-            else:
-                converted_stop = (section.stop_edge * multiplier) + offset
-                inner_slice_stop = int(math.ceil(converted_stop))
-                # TODO: What if we have an end exceeding the length of data?
-
-            inner_slice = slice(inner_slice_start, inner_slice_stop)
-            aligned_node.create_section(inner_slice, section.name,
-                                        begin=converted_start,
-                                        end=converted_stop)
+        starts, start_slices = self._align_edges(
+            [s.start_edge for s in self], multiplier, offset)
+        # dont allow minus start edges.
+        starts = [0.0 if s is not None and s < 0.0 else s for s in starts]
+        # TODO: What if we have an end exceeding the length of data?
+        stops, stop_slices = self._align_edges(
+            [s.stop_edge for s in self], multiplier, offset)
+        default_name = aligned_node.get_name()
+        aligned_node.extend(
+            Section(section.name or default_name,
+                    slice(start_slice, stop_slice),
+                    start or start_slice, stop or stop_slice)
+            for section, start, start_slice, stop, stop_slice
+            in izip(self, starts, start_slices, stops, stop_slices))
+        index = getattr(self, '_section_index', None)
+        if index is not None:
+            # Alignment is monotonic, therefore sorted orders remain valid
+            # unless rounding has tied sections in a different order.
+            aligned_node._section_index = SectionIndex(
+                aligned_node, orders=index._orders)
         return aligned_node
 
-    slice_attrgetters = {'start': attrgetter('slice.start'),
-                         'stop': attrgetter('slice.stop')}
+    @staticmethod
+    def _align_edges(edges, multiplier, offset):
+        '''
+        Rescales section edges, which may be None, with a single numpy
+        expression.
 
-    def _get_condition(self, name=None, containing_index=None,
+        :type edges: [int or float or None]
+        :type multiplier: float
+        :type offset: float
+        :returns: Converted edges and the slice indices rounded up from them.
+        :rtype: ([float or None], [int or None])
+        '''
+        missing = [e is None for e in edges]
+        converted = np.array([np.nan if m else e for e, m in
+                              izip(edges, missing)],
+                             dtype=np.float64) * multiplier + offset
+        rounded = np.ceil(converted).tolist()
+        converted = converted.tolist()
+        return ([None if m else c for c, m in izip(converted, missing)],
+                [None if m else int(r) for r, m in izip(rounded, missing)])
+
+    def _get_positions(self, name=None, containing_index=None,
                        within_slice=None, within_use='slice', param=None):
         '''
-        Returns a condition function which checks if the element is within
-        a slice or has a specified name if they are provided.
+        Returns the positions of sections which are within a slice, have a
+        specified name or contain an index if they are provided.
 
         :param within_slice: Only return elements within this slice.
         :type within_slice: slice
@@ -1087,11 +1639,9 @@ class SectionNode(Node, list):
         :type within_use: str
         :param param: Param which index and within_slice are sourced from. Used when parameters are not aligned.
         :type param: Node
-        :returns: Either a condition function or None.
-        :rtype: func or None
+        :returns: Positions of matching sections in order.
+        :rtype: np.ndarray
         '''
-        # Function for testing if Section is within a slice depending on
-        # within_use.
         if param is not None:
             if within_slice:
                 # FIXME: This does not account for different offsets.
@@ -1099,20 +1649,30 @@ class SectionNode(Node, list):
             if containing_index is not None:
                 containing_index = \
                     containing_index * (self.hz / param.hz) + (self.hz * param.offset)
-        if within_slice:
-            within_func = lambda s, within: is_slice_within_slice(
-                s.slice, within, within_use=within_use)
-        else:
-            within_func = lambda s, within: True
-
-        name_func = lambda e: (e.name == name) if name else True
+        return self.section_index().positions(
+            name=name, containing_index=containing_index,
+            within_slice=within_slice, within_use=within_use)
 
-        index_func = \
-            lambda e: (is_index_within_slice(containing_index, e.slice)
-                       if containing_index is not None else True)
+    @staticmethod
+    def _filtered(name=None, containing_index=None, within_slice=None,
+                  order_by='start', **kwargs):
+        '''
+        :returns: Whether _get_positions arguments filter sections or the
+            order is not by start.
+        :rtype: bool
+        '''
+        return bool(name or within_slice or containing_index is not None or
+                    order_by != 'start')
 
-        return lambda e: (within_func(e, within_slice) and name_func(e) and
-                          index_func(e))
+    def _from_positions(self, positions):
+        '''
+        :returns: Node of the same type as self containing the sections at
+            positions.
+        :rtype: self.__class__
+        '''
+        return self.__class__(name=self.name, frequency=self.frequency,
+                              offset=self.offset,
+                              items=[self[p] for p in positions.tolist()])
 
     def get(self, **kwargs):
         '''
@@ -1120,56 +1680,66 @@ class SectionNode(Node, list):
         FormattedNameNode. TODO: Share implementation with NameFormattedNode,
         slight differences between types make it difficult.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: An object of the same type as self containing matching elements.
         :rtype: Section
         '''
-        condition = self._get_condition(**kwargs)
-        matching = [s for s in self if condition(s)]
-        return self.__class__(name=self.name, frequency=self.frequency,
-                              offset=self.offset, items=matching)
+        return self._from_positions(self._get_positions(**kwargs))
 
     def get_first(self, first_by='start', **kwargs):
         '''
         :param first_by: Get the first by either 'start' or 'stop' of slice.
         :type first_by: str
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: First Section matching conditions.
         :rtype: Section
         '''
-        matching = self.get(**kwargs)
-        if matching:
-            return min(matching, key=self.slice_attrgetters[first_by])
-        else:
+        if not self:
+            return None
+        index = self.section_index()
+        if not self._filtered(**kwargs):
+            return self[index.order(first_by)[0]]
+        positions = self._get_positions(**kwargs)
+        if not len(positions):
             return None
+        return self[positions[index.keys(first_by)[positions].argmin()]]
 
     def get_last(self, last_by='start', **kwargs):
         '''
         :param last_by: Get the last by either 'start' or 'stop' of slice.
         :type last_by: str
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: Last Section matching conditions.
         :rtype: Section
         '''
-        matching = self.get(**kwargs)
-        if matching:
-            return max(matching, key=self.slice_attrgetters[last_by])
-        else:
+        positions = self._get_positions(**kwargs)
+        if not len(positions):
             return None
+        keys = self.section_index().keys(last_by)
+        return self[positions[keys[positions].argmax()]]
+
+    def _get_ordered_positions(self, order_by='start', **kwargs):
+        '''
+        :returns: Positions of matching sections ordered by index.
+        :rtype: np.ndarray
+        '''
+        index = self.section_index()
+        if not self._filtered(**kwargs):
+            return index.order(order_by)
+        positions = self._get_positions(**kwargs)
+        keys = index.keys(order_by)[positions]
+        return positions[np.argsort(keys, kind='mergesort')]
 
     def get_ordered_by_index(self, order_by='start', **kwargs):
         '''
         :param order_by: Index of slice to use when ordering, either 'start' or 'stop'.
         :type order_by: str
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: Section
         '''
-        matching = self.get(**kwargs)
-        ordered_by_start = sorted(matching,
-                                  key=self.slice_attrgetters[order_by])
-        return self.__class__(name=self.name, frequency=self.frequency,
-                              offset=self.offset, items=ordered_by_start)
+        return self._from_positions(
+            self._get_ordered_positions(order_by=order_by, **kwargs))
 
     def get_next(self, index, frequency=None, use='start', **kwargs):
         '''
@@ -1182,17 +1752,19 @@ class SectionNode(Node, list):
         :type frequency: int or float
         :param use: Use either 'start' or 'stop' of slice.
         :type use: str
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: Section with the next index matching criteria.
         :rtype: Section or None
         '''
         if frequency:
             index = index * (self.frequency / frequency)
-        ordered = self.get_ordered_by_index(**kwargs)
-        for elem in ordered:
-            if getattr(elem.slice, use) > index:
-                return elem
-        return None
+        section_index = self.section_index()
+        if not self._filtered(**kwargs):
+            position = section_index.next_position(index, use=use)
+        else:
+            position = section_index._first(
+                self._get_ordered_positions(**kwargs), use, index)
+        return None if position is None else self[position]
 
     def get_previous(self, index, frequency=None, use='stop', **kwargs):
         '''
@@ -1205,23 +1777,26 @@ class SectionNode(Node, list):
         :type frequency: int or float
         :param use: Use either 'start' or 'stop' of slice.
         :type use: str
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: Element with the previous index matching criteria.
         :rtype: item within self or None
         '''
         if frequency:
             index = index * (self.frequency / frequency)
-        ordered = self.get_ordered_by_index(**kwargs)
-        for elem in reversed(ordered):
-            if getattr(elem.slice, use) < index:
-                return elem
-        return None
+        section_index = self.section_index()
+        if not self._filtered(**kwargs):
+            position = section_index.previous_position(index, use=use)
+        else:
+            position = section_index._first(
+                self._get_ordered_positions(**kwargs), use, index,
+                reverse=True)
+        return None if position is None else self[position]
 
     def get_longest(self, **kwargs):
         '''
         Gets the longest section matching the lookup criteria.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: Longest section matching conditions.
         :rtype: item within self or None
         '''
@@ -1234,7 +1809,7 @@ class SectionNode(Node, list):
         '''
         Gets the shortest section matching the lookup criteria.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: Shortest section matching conditions.
         :rtype: item within self or None
         '''
@@ -1253,14 +1828,8 @@ class SectionNode(Node, list):
         :returns: List of surrounding sections
         :rtype: List of sections
         '''
-        surrounded = []
-        for section in self:
-            if section.slice.start <= index <= section.slice.stop or\
-               section.slice.start <= index and section.slice.stop is None or\
-               section.slice.start is None and index <= section.slice.stop:
-                surrounded.append(section)
-        return self.__class__(name=self.name, frequency=self.frequency,
-                              offset=self.offset, items=surrounded)
+        return self._from_positions(
+            self.section_index().containing(index, inclusive=True))
 
     def get_slices(self, edges=True):
         '''
@@ -1310,6 +1879,10 @@ class ListNode(Node, list):
         return '%s' % pprint.pformat(list(self))
 
 
+_formatted_names = {}
+_name_value_sets = {}
+
+
 class FormattedNameNode(ListNode):
     '''
     NAME_FORMAT example:
@@ -1329,33 +1902,132 @@ class FormattedNameNode(ListNode):
         super(FormattedNameNode, self).__init__(*args, **kwargs)
         self.restrict_names = kwargs.get('restrict_names', True)
 
+    append = _invalidates_index('append', '_columns')
+    extend = _invalidates_index('extend', '_columns')
+    insert = _invalidates_index('insert', '_columns')
+    pop = _invalidates_index('pop', '_columns')
+    remove = _invalidates_index('remove', '_columns')
+    reverse = _invalidates_index('reverse', '_columns')
+    sort = _invalidates_index('sort', '_columns')
+    __setitem__ = _invalidates_index('__setitem__', '_columns')
+    __delitem__ = _invalidates_index('__delitem__', '_columns')
+    __setslice__ = _invalidates_index('__setslice__', '_columns')
+    __delslice__ = _invalidates_index('__delslice__', '_columns')
+    __iadd__ = _invalidates_index('__iadd__', '_columns')
+    __imul__ = _invalidates_index('__imul__', '_columns')
+
+    def __getstate__(self):
+        '''
+        Do not pickle or copy the columns.
+        '''
+        state = super(FormattedNameNode, self).__getstate__()
+        if '_columns' in state:
+            state = state.copy()
+            del state['_columns']
+        return state
+
+    @classmethod
+    def _cached(cls, cache, build):
+        '''
+        Gets a value computed from NAME_FORMAT and NAME_VALUES once per class.
+        The value is recomputed if NAME_FORMAT or the contents of NAME_VALUES
+        change, including in-place modification of NAME_VALUES.
+        '''
+        name_values = tuple((k, tuple(v)) for k, v in
+                            (cls.NAME_VALUES or {}).iteritems())
+        try:
+            cached_format, cached_values, value = cache[cls]
+        except KeyError:
+            pass
+        else:
+            if cached_format == cls.NAME_FORMAT and \
+               cached_values == name_values:
+                return value
+        value = build()
+        cache[cls] = (cls.NAME_FORMAT, name_values, value)
+        return value
+
+    @classmethod
+    def _name_cache(cls):
+        '''
+        :returns: Names, name set and mapping of name to index.
+        :rtype: (list, set, dict)
+        '''
+        def build():
+            if not cls.NAME_FORMAT and not cls.NAME_VALUES:
+                names = [cls.get_name()]
+            else:
+                keys = cls.NAME_VALUES.keys()
+                names = [cls.NAME_FORMAT % dict(zip(keys, a))
+                         for a in product(*cls.NAME_VALUES.values())]
+            name_indices = {}
+            for index, name in enumerate(names):
+                name_indices.setdefault(name, index)
+            return names, set(names), name_indices
+        return cls._cached(_formatted_names, build)
+
+    @classmethod
+    def _name_value_sets(cls):
+        '''
+        :returns: Mapping of each NAME_VALUES key to a set of (type, value)
+            tuples or None if names cannot be validated from their values.
+        :rtype: dict or None
+        '''
+        def build():
+            try:
+                value_sets = dict(
+                    (k, set((type(v), v) for v in values))
+                    for k, values in cls.NAME_VALUES.iteritems())
+                # Ensure every combination can be formatted.
+                cls.NAME_FORMAT % dict(
+                    (k, next(iter(values)))
+                    for k, values in cls.NAME_VALUES.iteritems())
+            except (KeyError, StopIteration, TypeError, ValueError):
+                return None
+            return value_sets or None
+        return cls._cached(_name_value_sets, build)
+
     @classmethod
     def names(cls):
         """
         :returns: The product of all NAME_VALUES name combinations
         :rtype: list
         """
-        # XXX: cache option below disabled until required. Should we create this
-        # on init and remove the property instead?
-        ##if hasattr(cls, 'names'):
-        ##    return cls.names
-        if not cls.NAME_FORMAT and not cls.NAME_VALUES:
-            return [cls.get_name()]
-        names = []
-        for a in product(*cls.NAME_VALUES.values()):
-            name = cls.NAME_FORMAT % dict(zip(cls.NAME_VALUES.keys(), a))
-            names.append(name)
-        ##cls.names = names  #cache
-        return names
-
-    def _validate_name(self, name):
+        # OPT: Names are formatted once per class.
+        return list(cls._name_cache()[0])
+
+    @classmethod
+    def name_indices(cls):
+        """
+        :returns: Mapping of each name to its index within names() for
+            compact storage of names.
+        :rtype: dict
+        """
+        return cls._name_cache()[2]
+
+    def _validate_name(self, name, replace_values=None):
         """
         Test that name is a valid combination of NAME_FORMAT and NAME_VALUES.
 
         :type name: str
+        :param replace_values: Optional values used to format name. If each
+            value is one of the NAME_VALUES, name is valid without formatting
+            all names.
+        :type replace_values: dict or None
         :rtype: bool
         """
-        return name in self.names()
+        value_sets = self._name_value_sets() if replace_values else None
+        if value_sets:
+            for key, values in value_sets.iteritems():
+                try:
+                    value = replace_values[key]
+                    if (type(value), value) not in values:
+                        break
+                except (KeyError, TypeError):
+                    break
+            else:
+                return True
+        return name in self._name_cache()[1]
 
     def format_name(self, replace_values={}, **kwargs):
         """
@@ -1377,14 +2049,63 @@ class FormattedNameNode(ListNode):
         rvals.update(kwargs)
         name = self.NAME_FORMAT % rvals  # common error is to use { inplace of (
         # validate name is allowed
-        if not self._validate_name(name):
+        if not self._validate_name(name, rvals):
             raise ValueError("invalid name '%s'" % name)
         return name  # return as a confirmation it was successful
 
-    def _get_condition(self, within_slice=None, within_slices=None, name=None):
-        '''
-        Returns a condition function which checks if the element is within
-        a slice or has a specified name if they are provided.
+    def columns(self, values=False):
+        '''
+        Struct-of-arrays representation of the items within the node. Name
+        codes are the indices of names within names() followed by codes for
+        any other names.
+
+        The columns are built on first use and discarded when the list is
+        modified. Items modified in place are not detected, therefore
+        invalidate_columns must be called afterwards.
+
+        :param values: Whether to include an array of item values.
+        :type values: bool
+        :returns: Columns of index, value (or None), name codes and names.
+            names must not be modified.
+        :rtype: NodeColumns
+        '''
+        columns = getattr(self, '_columns', None)
+        if columns is None:
+            name_indices = self.name_indices()
+            names = self._name_cache()[0]
+            item_names = [e.name for e in self]
+            codes = [name_indices.get(name) for name in item_names]
+            if None in codes:
+                # Only allocate codes for names outside of names().
+                names = list(names)
+                other_codes = {}
+                for position, name in enumerate(item_names):
+                    if codes[position] is None:
+                        code = other_codes.get(name)
+                        if code is None:
+                            code = other_codes[name] = len(names)
+                            names.append(name)
+                        codes[position] = code
+            columns = self._columns = NodeColumns(
+                np.array([e.index for e in self], dtype=np.float64), None,
+                np.array(codes, dtype=np.int32), names)
+        if values and columns.value is None:
+            columns = self._columns = columns._replace(
+                value=np.array([e.value for e in self], dtype=np.float64))
+        return columns
+
+    def invalidate_columns(self):
+        '''
+        Discards the columns of the node so that items modified in place are
+        reflected in the following queries.
+        '''
+        self._columns = None
+
+    def _get_positions(self, within_slice=None, within_slices=None, name=None,
+                       values=False):
+        '''
+        Returns the positions of elements which are within a slice or have a
+        specified name if they are provided.
 
         :param within_slice: Only return elements within this slice.
         :type within_slice: slice
@@ -1392,32 +2113,52 @@ class FormattedNameNode(ListNode):
         :type within_slices: [slice]
         :param name: Only return elements with this name.
         :type name: str
-        :returns: Either a condition function or None.
-        :rtype: func or None
+        :param values: Whether columns include an array of item values.
+        :type values: bool
+        :returns: Columns of self and positions of matching elements in order.
+        :rtype: (NodeColumns, np.ndarray)
         '''
         if within_slice and within_slices:
             within_slices.append(within_slice)
         elif within_slice:
             within_slices = [within_slice]
 
-        within_slices_func = \
-            lambda e: is_index_within_slices(e.index, within_slices)
-        name_func = lambda e: e.name == name
-
-        if within_slices and name:
-            return lambda e: within_slices_func(e) and name_func(e)
-        elif within_slices:
-            return within_slices_func
-        elif name:
-            #Q: If restrict names BUT the named item is in the list of objects
-            # contained, should we not return it anyway rather than raise?
-            if self.restrict_names and name not in self.names():
-                raise ValueError("Attempted to filter by invalid name '%s' "
-                                 "within '%s'." % (name,
-                                                   self.__class__.__name__))
-            return name_func
-        else:
-            return None
+        #Q: If restrict names BUT the named item is in the list of objects
+        # contained, should we not return it anyway rather than raise?
+        if name and not within_slices and self.restrict_names and \
+           name not in self._name_cache()[1]:
+            raise ValueError("Attempted to filter by invalid name '%s' "
+                             "within '%s'." % (name, self.__class__.__name__))
+
+        columns = self.columns(values=values)
+        matching = None
+        if within_slices:
+            matching = indices_within_slices(columns.index, within_slices)
+        if name:
+            code = self.name_indices().get(name)
+            if code is None:
+                # Other names follow names() within the columns.
+                try:
+                    code = columns.names.index(name,
+                                               len(self._name_cache()[0]))
+                except ValueError:
+                    code = -1
+            named = columns.name == code
+            matching = named if matching is None else matching & named
+        if matching is None:
+            return columns, np.arange(len(columns.index))
+        return columns, matching.nonzero()[0]
+
+    def _from_positions(self, positions, cls=None):
+        '''
+        :returns: Node of the same type as self (or cls) containing the
+            elements at positions.
+        :rtype: self.__class__
+        '''
+        cls = cls or self.__class__
+        return cls(name=self.name, frequency=self.frequency,
+                   offset=self.offset,
+                   items=[self[p] for p in positions.tolist()])
 
     def get(self, **kwargs):
         '''
@@ -1427,58 +2168,56 @@ class FormattedNameNode(ListNode):
         .get(name_values={'altitude': 20}) rather than
         .get(name='20 Ft Descending').
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: self.__class__
         '''
-        condition = self._get_condition(**kwargs)
-        matching = filter(condition, self) if condition else self
-        return self.__class__(name=self.name, frequency=self.frequency,
-                              offset=self.offset, items=matching)
+        if not any(kwargs.values()):
+            return self.__class__(name=self.name, frequency=self.frequency,
+                                  offset=self.offset, items=self)
+        columns, positions = self._get_positions(**kwargs)
+        return self._from_positions(positions)
 
     def get_ordered_by_index(self, **kwargs):
         '''
         Gets elements ordered by index (ascending) optionally filter
         within_slice or by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: self.__class__
         '''
-        matching = self.get(**kwargs)
-        ordered_by_index = sorted(matching, key=attrgetter('index'))
-        return self.__class__(name=self.name, frequency=self.frequency,
-                              offset=self.offset, items=ordered_by_index)
+        columns, positions = self._get_positions(**kwargs)
+        order = np.argsort(columns.index[positions], kind='mergesort')
+        return self._from_positions(positions[order])
 
     def get_first(self, **kwargs):
         '''
         Gets the element with the lowest index optionally filter within_slice or
         by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: First element matching conditions.
         :rtype: item within self or None
         '''
-        matching = self.get(**kwargs)
-        if matching:
-            return min(matching, key=attrgetter('index')) if matching else None
-        else:
+        columns, positions = self._get_positions(**kwargs)
+        if not len(positions):
             return None
+        return self[positions[columns.index[positions].argmin()]]
 
     def get_last(self, **kwargs):
         '''
         Gets the element with the lowest index optionally filter within_slice or
         by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: Element with the lowest index matching criteria.
         :rtype: item within self or None
         '''
-        matching = self.get(**kwargs)
-        if matching:
-            return max(matching, key=attrgetter('index')) if matching else None
-        else:
+        columns, positions = self._get_positions(**kwargs)
+        if not len(positions):
             return None
+        return self[positions[columns.index[positions].argmax()]]
 
     def get_next(self, index, frequency=None, **kwargs):
         '''
@@ -1489,17 +2228,17 @@ class FormattedNameNode(ListNode):
         :type index: int or float
         :param frequency: Frequency of index if it is not the same as the FormattedNameNode.
         :type frequency: int or float
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: Element with the next index matching criteria.
         :rtype: item within self or None
         '''
         if frequency:
             index = index * (self.frequency / frequency)
-        ordered = self.get_ordered_by_index(**kwargs)
-        for elem in ordered:
-            if elem.index > index:
-                return elem
-        return None
+        columns, positions = self._get_positions(**kwargs)
+        positions = positions[columns.index[positions] > index]
+        if not len(positions):
+            return None
+        return self[positions[columns.index[positions].argmin()]]
 
     def get_previous(self, index, frequency=None, **kwargs):
         '''
@@ -1510,17 +2249,44 @@ class FormattedNameNode(ListNode):
         :type index: int or float
         :param frequency: Frequency of index if it is not the same as the FormattedNameNode.
         :type frequency: int or float
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :returns: Element with the previous index matching criteria.
         :rtype: item within self or None
         '''
         if frequency:
             index = index * (self.frequency / frequency)
-        ordered = self.get_ordered_by_index(**kwargs)
-        for elem in reversed(ordered):
-            if elem.index < index:
-                return elem
-        return None
+        columns, positions = self._get_positions(**kwargs)
+        # Reversed so that the last of equal indices is returned.
+        positions = positions[columns.index[positions] < index][::-1]
+        if not len(positions):
+            return None
+        return self[positions[columns.index[positions].argmax()]]
+
+    def get_aligned(self, param):
+        '''
+        Indices of all items are rescaled with a single numpy expression.
+        Returns self if the frequency and offset already match.
+
+        :param param: Node to align this node to.
+        :type param: Node subclass
+        :returns: A copy of the node with its contents aligned to the frequency and offset of param.
+        :rtype: self.__class__
+        '''
+        if param.frequency == self.frequency and param.offset == self.offset:
+            return self
+        multiplier = param.frequency / self.frequency
+        offset = (self.offset - param.offset) * param.frequency
+        aligned_node = self.__class__(self.name, param.frequency,
+                                      param.offset)
+        indices = np.array([e.index for e in self], dtype=np.float64)
+        # TODO: check for negative index following downsampling if use
+        # case arrises
+        indices = (indices * multiplier + offset).tolist()
+        aligned_items = [copy.copy(e) for e in self]
+        for aligned_item, index in izip(aligned_items, indices):
+            aligned_item.index = index
+        aligned_node.extend(aligned_items)
+        return aligned_node
 
 
 class KeyTimeInstanceNode(FormattedNameNode):
@@ -1718,27 +2484,6 @@ class KeyTimeInstanceNode(FormattedNameNode):
                 state_changes(state, repaired_array, change, getattr(p, 'slice', p))
         return
 
-    def get_aligned(self, param):
-        '''
-        :param param: Node to align this KeyTimeInstanceNode to.
-        :type param: Node subclass
-        :returns: An copy of the KeyTimeInstanceNode with its contents aligned to the frequency and offset of param.
-        :rtype: KeyTimeInstanceNode
-        '''
-        multiplier = param.frequency / self.frequency
-        offset = (self.offset - param.offset) * param.frequency
-        aligned_node = self.__class__(self.name, param.frequency,
-                                      param.offset)
-        for kti in self:
-            aligned_kti = copy.copy(kti)
-            index_aligned = (kti.index * multiplier) + offset
-            # TODO: check for negative index following downsampling if use
-            # case arrises
-            aligned_kti.index = index_aligned
-            aligned_node.append(aligned_kti)
-
-        return aligned_node
-
 
 class KeyPointValueNode(FormattedNameNode):
     node_type_abbr = 'KPV'
@@ -1819,66 +2564,43 @@ class KeyPointValueNode(FormattedNameNode):
         self.debug('KPV %s' % kpv)
         return kpv
 
-    def get_aligned(self, param):
-        '''
-        :param param: Node to align this KeyPointValueNode to.
-        :type param: Node subclass
-        :returns: An copy of the KeyPointValueNode with its contents aligned to the frequency and offset of param.
-        :rtype: KeyPointValueNode
-        '''
-        multiplier = param.frequency / self.frequency
-        offset = (self.offset - param.offset) * param.frequency
-        aligned_node = self.__class__(self.name, param.frequency, param.offset)
-        for kpv in self:
-            aligned_kpv = copy.copy(kpv)
-            aligned_kpv.index = (aligned_kpv.index * multiplier) + offset
-            # TODO: check for negative index following downsampling if use
-            # case arrises
-            ##if aligned_kpv.slice:
-            ##    aligned_kpv.slice = align_slice(param, self, aligned_kpv.slice)
-            aligned_node.append(aligned_kpv)
-        return aligned_node
-
     def get_max(self, **kwargs):
         '''
         Gets the KeyPointValue with the maximum value optionally filter
         within_slice or by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :rtype: KeyPointValue
         '''
-        matching = self.get(**kwargs)
-        if matching:
-            return max(matching, key=attrgetter('value')) if matching else None
-        else:
+        columns, positions = self._get_positions(values=True, **kwargs)
+        if not len(positions):
             return None
+        return self[positions[columns.value[positions].argmax()]]
 
     def get_min(self, **kwargs):
         '''
         Gets the KeyPointValue with the minimum value optionally filter
         within_slice or by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :rtype: KeyPointValue
         '''
-        matching = self.get(**kwargs)
-        if matching:
-            return min(matching, key=attrgetter('value')) if matching else None
-        else:
+        columns, positions = self._get_positions(values=True, **kwargs)
+        if not len(positions):
             return None
+        return self[positions[columns.value[positions].argmin()]]
 
     def get_ordered_by_value(self, **kwargs):
         '''
         Gets the element with the maximum value optionally filter within_slice
         or by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_positions (see docstring).
         :rtype: KeyPointValueNode
         '''
-        matching = self.get(**kwargs)
-        ordered_by_value = sorted(matching, key=attrgetter('value'))
-        return KeyPointValueNode(name=self.name, frequency=self.frequency,
-                                 offset=self.offset, items=ordered_by_value)
+        columns, positions = self._get_positions(values=True, **kwargs)
+        order = np.argsort(columns.value[positions], kind='mergesort')
+        return self._from_positions(positions[order], cls=KeyPointValueNode)
 
     def create_kpvs_at_ktis(self, array, ktis, interpolate=True, suppress_zeros=False):
         '''
@@ -1897,9 +2619,14 @@ class KeyPointValueNode(FormattedNameNode):
         :returns None:
         :rtype: None
         '''
-        for kti in ktis:
-            value = value_at_index(array, kti.index, interpolate=interpolate)
-
+        values = values_at_indices(array, [kti.index for kti in ktis],
+                                   interpolate=interpolate)
+        last = len(array) - 1
+        for kti, value in izip(ktis, values):
+            if value is np.ma.masked and 0 <= kti.index <= last:
+                # value_at_index returns None for masked samples within the
+                # array, which create_kpv logs as information.
+                value = None
             if not suppress_zeros or value:
                 self.create_kpv(kti.index, value)
 
@@ -2446,18 +3173,24 @@ class NodeManager(object):
             return True
         elif name in self.derived_nodes:
             derived_node = self.derived_nodes[name]
-            # NOTE: Raises "Unbound method" here due to can_operate being
-            # overridden without wrapping with @classmethod decorator
-            attributes = []
-            argspec = inspect.getargspec(derived_node.can_operate)
-            if argspec.defaults:
-                for default in argspec.defaults:
-                    if not isinstance(default, Attribute):
-                        raise TypeError('Only Attributes may be keyword '
-                                        'arguments in can_operate methods.')
-                    attributes.append(self.get_attribute(default.name))
+            attributes = [self.get_attribute(a.name) for a in
+                          can_operate_attributes(derived_node)]
+            # OPT: can_operate results only depend upon the available
+            # dependencies and attribute values, share them between flights.
+            try:
+                key = (derived_node, frozenset(available),
+                       tuple(None if a is None else a.value
+                             for a in attributes))
+                return _operational[key]
+            except KeyError:
+                pass
+            except TypeError:
+                # Attribute values are unhashable, e.g. dicts.
+                key = None
             # can_operate expects attributes.
             res = derived_node.can_operate(available, *attributes)
+            if key is not None:
+                _operational[key] = res
             ##if not res:
             ##    logger.debug("Derived Node %s cannot operate with available nodes: %s",
             ##                 name, available)
@@ -2479,6 +3212,9 @@ class NodeManager(object):
         return node_clazz.__base__
 
 
+_operational = {}
+
+
 @total_ordering
 class Attribute(object):
 
@@ -4,7 +4,7 @@ import itertools
 import logging
 import numpy as np
 import os
-import simplekml
+import sys
 
 from copy import copy
 
@@ -15,22 +15,11 @@ from analysis_engine.library import (
     bearing_and_distance, 
     latitudes_and_longitudes, 
     repair_mask, 
-    value_at_index,
+    values_at_indices,
 )
 from analysis_engine.node import derived_param_from_hdf, Parameter
 from analysis_engine.settings import METRES_TO_FEET
 
-import matplotlib
-
-try:
-    import wx
-except ImportError:
-    matplotlib.use('Agg')
-else:
-    matplotlib.use('WXAgg')
-
-import matplotlib.pyplot as plt
-
 '''
 Note: if you are having problems with blocking plots try
     import matplotlib.pyplot as plt
@@ -42,6 +31,26 @@ in matplotlibrc to turn this on globally
 
 logger = logging.getLogger(name=__name__)
 
+
+def _pyplot():
+    '''
+    Import matplotlib.pyplot on first use rather than when this module is
+    imported, as only plotting functions require matplotlib.
+
+    :returns: matplotlib.pyplot module.
+    :rtype: module
+    '''
+    if 'matplotlib.pyplot' not in sys.modules:
+        import matplotlib
+        try:
+            import wx
+        except ImportError:
+            matplotlib.use('Agg')
+        else:
+            matplotlib.use('WXAgg')
+    import matplotlib.pyplot as plt
+    return plt
+
 # KPV / KTI names not to display as markers
 SKIP_KPVS = []
 SKIP_KTIS = ['Transmit']
@@ -98,14 +107,16 @@ def add_track(kml, track_name, lat, lon, colour, alt_param=None, alt_mode=None,
     ##scope_lat = np.ma.flatnotmasked_edges(lat.array)
     ##begin = max(scope_lon[0], scope_lat[0])+1
     ##end = min(scope_lon[1], scope_lat[1])-1
+    indices = np.arange(len(lon.array))
+    lons = values_at_indices(lon.array, indices).tolist()
+    lats = values_at_indices(lat.array, indices).tolist()
+    if alt_param:
+        alts = values_at_indices(alt_param.array, indices).tolist()
     for i in xrange(0, len(lon.array)):
-        _lon = value_at_index(lon.array, i)
-        _lat = value_at_index(lat.array, i)
         if alt_param:
-            _alt = value_at_index(alt_param.array, i)
-            coords = (_lon, _lat, _alt)
+            coords = (lons[i], lats[i], alts[i])
         else:
-            coords = (_lon, _lat)
+            coords = (lons[i], lats[i])
             
         if not all(coords) or any(np.isnan(coords)):
             continue
@@ -162,6 +173,7 @@ def track_to_kml(hdf_path, kti_list, kpv_list, approach_list,
     :param plot_altitude: Name of Altitude parameter to use in KML
     :type plot_altitude: String
     '''
+    import simplekml
     one_hz = Parameter()
     kml = simplekml.Kml()
     with hdf_file(hdf_path) as hdf:
@@ -238,12 +250,14 @@ def track_to_kml(hdf_path, kti_list, kpv_list, approach_list,
                 best_lon = derived_param_from_hdf(lon).get_aligned(one_hz)
     
     # Add KTIs.
-    for kti in kti_list:
+    if plot_altitude:
+        kti_altitudes = alt.at_many([kti.index for kti in kti_list]).tolist()
+    for index, kti in enumerate(kti_list):
         kti_point_values = {'name': kti.name}
         if kti.name in SKIP_KTIS:
             continue
         
-        altitude = alt.at(kti.index) if plot_altitude else None
+        altitude = kti_altitudes[index] if plot_altitude else None
         kti_point_values['altitudemode'] = altitude_mode
         if altitude:
             kti_point_values['coords'] = ((kti.longitude, kti.latitude, altitude),)
@@ -252,13 +266,19 @@ def track_to_kml(hdf_path, kti_list, kpv_list, approach_list,
         kml.newpoint(**kti_point_values)
     
     # Add KPVs.
-    for kpv in kpv_list:
+    kpv_indices = [kpv.index for kpv in kpv_list]
+    if kpv_indices:
+        kpv_lats = best_lat.at_many(kpv_indices).tolist()
+        kpv_lons = best_lon.at_many(kpv_indices).tolist()
+        if plot_altitude:
+            kpv_altitudes = alt.at_many(kpv_indices).tolist()
+    for index, kpv in enumerate(kpv_list):
 
         # Trap kpvs with invalid latitude or longitude data (normally happens
         # at the start of the data where accelerometer offsets are declared,
         # and this avoids casting kpvs into the Atlantic.
-        kpv_lat = best_lat.at(kpv.index)
-        kpv_lon = best_lon.at(kpv.index)
+        kpv_lat = kpv_lats[index]
+        kpv_lon = kpv_lons[index]
         if kpv_lat == None or kpv_lon == None or \
            (kpv_lat == 0.0 and kpv_lon == 0.0):
             continue
@@ -269,7 +289,7 @@ def track_to_kml(hdf_path, kti_list, kpv_list, approach_list,
         style = simplekml.Style()
         style.iconstyle.color = simplekml.Color.red
         kpv_point_values = {'name': '%s (%.3f)' % (kpv.name, kpv.value)}
-        altitude = alt.at(kpv.index) if plot_altitude else None
+        altitude = kpv_altitudes[index] if plot_altitude else None
         kpv_point_values['altitudemode'] = altitude_mode
         if altitude:
             kpv_point_values['coords'] = ((kpv_lon, kpv_lat, altitude),)
@@ -292,7 +312,7 @@ def track_to_kml(hdf_path, kti_list, kpv_list, approach_list,
     return dest_path
 
 
-fig = plt.figure() 
+fig = None
 def plot_parameter(array, new_subplot=False, show=True, label='', marker=None):
     """
     For quickly plotting a single parameter to see its shape.
@@ -304,9 +324,13 @@ def plot_parameter(array, new_subplot=False, show=True, label='', marker=None):
     :param show: Whether to display the figure (and block)
     :type show: Boolean
     """
+    global fig
     if array is None:
         print "Cannot plot as array is None!"
         return
+    plt = _pyplot()
+    if fig is None:
+        fig = plt.figure()
     n = len(fig.axes)
     if n:
         if new_subplot:
@@ -341,6 +365,7 @@ def plot_essential(hdf_path):
     :param hdf_path: Path to HDF file.
     :type hdf_path: string
     """
+    plt = _pyplot()
     fig = plt.figure() ##figsize=(10,8))
     plt.title(os.path.basename(hdf_path))
     
@@ -359,6 +384,7 @@ def plot_essential(hdf_path):
 def plot_flight(hdf_path, kti_list, kpv_list, phase_list, aircraft_info):
     """
     """
+    plt = _pyplot()
     fig = plt.figure() ##figsize=(10,8))
     plt.title(os.path.basename(hdf_path))
     
@@ -520,8 +546,9 @@ def csv_flight_details(hdf_path, kti_list, kpv_list, phase_list,
             p = hdf[param]
             dp = Parameter(name=p.name, array=p.array, 
                            frequency=p.frequency, offset=p.offset)
-            for row in rows:
-                row[param] = dp.at(row['index'])
+            values = dp.at_many([row['index'] for row in rows]).tolist()
+            for row, value in itertools.izip(rows, values):
+                row[param] = value
 
     # sort rows
     rows = sorted(rows, key=lambda x: x['index'])
@@ -1,20 +1,31 @@
 import argparse
+import hashlib
+import inspect
 import itertools
 import json
 import logging
+import multiprocessing
 import os
+import Queue
 import sys
+import threading
+import time
+import traceback
+
+import numpy as np
 
 from datetime import datetime, timedelta
-from networkx.readwrite import json_graph
+from multiprocessing.pool import ThreadPool
 
 from flightdatautilities.filesystem_tools import copy_file
 
 from hdfaccess.file import hdf_file
 
 from analysis_engine import hooks, settings, __version__
-from analysis_engine.dependency_graph import dependency_order
-from analysis_engine.json_tools import json_to_process_flight, process_flight_to_nodes
+from analysis_engine.dependency_graph import dependency_order, level_schedule
+from analysis_engine.json_tools import (json_to_process_flight,
+                                       process_flight_to_json,
+                                       process_flight_to_nodes)
 from analysis_engine.library import np_ma_masked_zeros, repair_mask
 from analysis_engine.node import (ApproachNode, Attribute,
                                   derived_param_from_hdf,
@@ -22,10 +33,12 @@ from analysis_engine.node import (ApproachNode, Attribute,
                                   FlightAttributeNode,
                                   KeyPointValueNode,
                                   KeyTimeInstanceNode,
-                                  NodeManager, P, Section, SectionNode,
-                                  NODE_SUBCLASSES)
+                                  lazy_param_from_hdf,
+                                  NodeCache, NodeManager, P, Section,
+                                  SectionNode, NODE_SUBCLASSES)
 from analysis_engine.settings import NODE_CACHE
-from analysis_engine.utils import get_aircraft_info, get_derived_nodes
+from analysis_engine.utils import (get_aircraft_info, get_derived_nodes,
+                                   get_node_modules, get_node_registry)
 
 
 logger = logging.getLogger(__name__)
@@ -60,9 +73,14 @@ def geo_locate(hdf, items):
     lat_pos.array = repair_mask(lat_pos.array, repair_duration=None, extrapolate=True)
     lon_pos.array = repair_mask(lon_pos.array, repair_duration=None, extrapolate=True)
     
-    for item in itertools.chain.from_iterable(items.itervalues()):
-        item.latitude = lat_pos.at(item.index) or None
-        item.longitude = lon_pos.at(item.index) or None
+    item_list = list(itertools.chain.from_iterable(items.itervalues()))
+    indices = [item.index for item in item_list]
+    latitudes = lat_pos.at_many(indices)
+    longitudes = lon_pos.at_many(indices)
+    for item, latitude, longitude in itertools.izip(item_list, latitudes,
+                                                    longitudes):
+        item.latitude = latitude or None
+        item.longitude = longitude or None
     return items
 
 
@@ -75,8 +93,16 @@ def _timestamp(start_datetime, items):
     :param item_list: list of objects with a .index attribute
     :type item_list: list
     '''
-    for item in itertools.chain.from_iterable(items.itervalues()):
-        item.datetime = start_datetime + timedelta(seconds=float(item.index))
+    item_list = list(itertools.chain.from_iterable(items.itervalues()))
+    indices = np.array([item.index for item in item_list], dtype=np.float64)
+    # OPT: Items often share an index, e.g. KPVs at KTIs, therefore create
+    # the datetime of each unique index once. timedelta rounds seconds to
+    # microseconds and datetimes keep the tzinfo of start_datetime.
+    unique, positions = np.unique(indices, return_inverse=True)
+    datetimes = [start_datetime + timedelta(seconds=index)
+                 for index in unique.tolist()]
+    for item, position in itertools.izip(item_list, positions.tolist()):
+        item.datetime = datetimes[position]
     return items
 
 
@@ -91,11 +117,748 @@ def get_node_type(node, node_subclasses):
     return node.__class__.__name__
 
 
-def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
+def get_dependencies(node_class, hdf, node_mgr, params, cache=None,
+                     lazy_params=None):
+    '''
+    Builds the ordered list of dependencies to be passed into the Node's
+    derive method. Dependencies which are not available are None.
+
+    :param node_class: Node class to build the dependencies for.
+    :type node_class: class
+    :param hdf: Data file accessor used to get parameter data.
+    :type hdf: hdf_file
+    :param node_mgr: Used to look up attributes and hdf keys.
+    :type node_mgr: NodeManager
+    :param params: Nodes which have already been derived.
+    :type params: dict
+    :param cache: Cache of aligned nodes.
+    :type cache: dict or None
+    :param lazy_params: Source of parameters whose arrays are loaded on
+        first access. Parameters are otherwise loaded from the hdf file.
+    :type lazy_params: LazyParameters or None
+    :returns: Dependencies in the order of the derive method's arguments.
+    :rtype: list
+    '''
+    deps = []
+    for dep_name in node_class.get_dependency_names():
+        if dep_name in params:  # already calculated KPV/KTI/Phase
+            deps.append(params[dep_name])
+        elif node_mgr.get_attribute(dep_name) is not None:
+            deps.append(node_mgr.get_attribute(dep_name))
+        elif dep_name in node_mgr.hdf_keys:
+            # LFL/Derived parameter
+            # all parameters (LFL or other) need get_aligned which is
+            # available on DerivedParameterNode
+            try:
+                if lazy_params is not None:
+                    dp = lazy_params.get_param(dep_name, cache=cache)
+                else:
+                    dp = derived_param_from_hdf(hdf.get_param(
+                        dep_name, valid_only=True), cache=cache)
+            except KeyError:
+                # Parameter is invalid.
+                dp = None
+            deps.append(dp)
+        else:  # dependency not available
+            deps.append(None)
+    if all([d is None for d in deps]):
+        raise RuntimeError(
+            "No dependencies available - Nodes cannot "
+            "operate without ANY dependencies available! "
+            "Node: %s" % node_class.__name__)
+    return deps
+
+
+def derive_node(node_class, deps, cache=None, force=False, accessors=None,
+                profile=None):
+    '''
+    Initialises and derives a single Node from its dependencies.
+
+    This is a module-level function so that it can be executed by a process
+    pool within derive_parameters.
+
+    :param node_class: Node class to derive.
+    :type node_class: class
+    :param deps: Dependencies as returned by get_dependencies.
+    :type deps: list
+    :param cache: Cache of aligned nodes.
+    :type cache: dict or None
+    :param force: Ignore errors raised while deriving the node.
+    :type force: bool
+    :param accessors: Optional (params, hdf, node_mgr) made available to the
+        node while deriving for developing nodes in debug mode.
+    :type accessors: tuple or None
+    :param profile: Optional dictionary to record the node's type, wall and
+        CPU time in addition to the measurements of Node.get_derived.
+    :type profile: dict or None
+    :returns: The derived node.
+    :rtype: Node
+    '''
+    # initialise node
+    node = node_class(cache=cache)
+    # shhh, secret accessors for developing nodes in debug mode
+    node._p, node._h, node._n = accessors or (None, None, None)
+    logger.debug("Processing %s `%s`",
+                 get_node_type(node, NODE_SUBCLASSES), node.name)
+    if profile is not None:
+        profile['type'] = get_node_type(node, NODE_SUBCLASSES)
+        start, start_cpu = time.time(), time.clock()
+    # Derive the resulting value
+    try:
+        node = node.get_derived(deps, profile=profile)
+    except:
+        if not force:
+            raise
+    finally:
+        del node._p
+        del node._h
+        del node._n
+        if profile is not None:
+            profile['wall_time'] = time.time() - start
+            profile['cpu_time'] = time.clock() - start_cpu
+    return node
+
+
+def _derive_node_star(args):
+    '''
+    Unpacks arguments for derive_node when mapped over a pool. The profile is
+    returned alongside the node as it is not shared with worker processes.
+    '''
+    profile = args[5]
+    return derive_node(*args), profile
+
+
+class BufferedHDF(object):
+    '''
+    Wraps an hdf_file to write derived parameters behind processing.
+
+    Parameters saved with set_param are queued and written to the hdf file
+    in the order they were saved, either by a background writer thread or
+    when flush is called. Queued parameters remain readable from memory via
+    get_param until they have been written. Other attributes and methods are
+    those of the wrapped hdf_file.
+    '''
+    def __init__(self, hdf, background=True):
+        '''
+        :param hdf: Data file accessor to write parameters to.
+        :type hdf: hdf_file
+        :param background: Write parameters within a background thread,
+            otherwise parameters are written when flush is called.
+        :type background: bool
+        '''
+        self.hdf = hdf
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._error = None
+        self._queue = Queue.Queue()
+        if background:
+            self._thread = threading.Thread(target=self._writer)
+            self._thread.daemon = True
+            self._thread.start()
+        else:
+            self._thread = None
+
+    def __getattr__(self, name):
+        return getattr(self.hdf, name)
+
+    def __getitem__(self, name):
+        return self.get_param(name)
+
+    def _raise_error(self):
+        if self._error is not None:
+            exc_type, exc_value, exc_tb = self._error
+            raise exc_type, exc_value, exc_tb
+
+    def _write(self, param):
+        with self._lock:
+            self.hdf.set_param(param)
+            if self._pending.get(param.name) is param:
+                del self._pending[param.name]
+
+    def _writer(self):
+        while True:
+            param = self._queue.get()
+            try:
+                if param is None:
+                    return
+                if self._error is None:
+                    self._write(param)
+            except Exception:
+                self._error = sys.exc_info()
+            finally:
+                self._queue.task_done()
+
+    def get_param(self, name, valid_only=False, _slice=None):
+        '''
+        Get a parameter from memory if it has not yet been written, otherwise
+        from the hdf file. Parameters from memory have a copy of the array so
+        that the data written to the hdf file cannot be modified.
+
+        :param _slice: Only get a slice of the parameter's data. The slice
+            indices are in seconds (1Hz).
+        :type _slice: slice or None
+        '''
+        kwargs = {} if _slice is None else {'_slice': _slice}
+        with self._lock:
+            param = self._pending.get(name)
+            if param is None:
+                return self.hdf.get_param(name, valid_only=valid_only,
+                                          **kwargs)
+        if valid_only and getattr(param, 'invalid', False):
+            raise KeyError(name)
+        array = param.array
+        if _slice is not None:
+            start = int((_slice.start or 0) * param.frequency)
+            stop = None if _slice.stop is None else \
+                int(_slice.stop * param.frequency)
+            array = array[start:stop]
+        param = derived_param_from_hdf(param)
+        param.array = array.copy()
+        return param
+
+    def set_param(self, param):
+        '''
+        Queue a parameter to be written to the hdf file.
+
+        :raises: The exception raised by the writer thread when writing a
+            previous parameter.
+        '''
+        self._raise_error()
+        with self._lock:
+            self._pending[param.name] = param
+        self._queue.put(param)
+
+    def flush(self):
+        '''
+        Write all queued parameters to the hdf file.
+        '''
+        if self._thread is not None:
+            self._queue.join()
+        else:
+            while not self._queue.empty():
+                self._write(self._queue.get())
+        self._raise_error()
+
+    def close(self):
+        '''
+        Write all queued parameters and stop the writer thread.
+        '''
+        try:
+            self.flush()
+        finally:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+
+class LazyParameters(object):
+    '''
+    Provides parameters from an hdf file whose arrays are loaded on first
+    access (see LazyDerivedParameterNode).
+
+    The attributes of each parameter are read from the hdf file once. When
+    arrays are retained, the array is read and decompressed once when a node
+    first accesses it, or when it is prefetched, and each node receives a
+    copy, therefore nodes modifying their dependencies' arrays do not affect
+    one another. Retained parameters should be released once no further
+    nodes depend upon them. Otherwise each node reads the array and prefetched
+    arrays are only held until a node first accesses them.
+    '''
+    def __init__(self, hdf, retain=True):
+        '''
+        :param hdf: Data file accessor to read parameters from.
+        :type hdf: hdf_file
+        :param retain: Whether to hold loaded arrays until the parameter is
+            released.
+        :type retain: bool
+        '''
+        self.hdf = hdf
+        self.retain = retain
+        self.loads = 0
+        # Bytes of the arrays which have been loaded and not yet released.
+        self.nbytes = 0
+        self._params = {}
+        self._arrays = {}
+        # Names of arrays being read and those released while being read.
+        self._loading = set()
+        self._released = set()
+        self._condition = threading.Condition()
+
+    def _load(self, name, prefetch=False):
+        '''
+        :returns: The array of the parameter, which is a copy if the array is
+            held, or None if prefetching an array which is already held.
+        :rtype: np.ma.masked_array or None
+        '''
+        hold = self.retain or prefetch
+        with self._condition:
+            while name in self._loading:
+                self._condition.wait()
+            array = self._arrays.get(name)
+            if array is not None:
+                if prefetch:
+                    return None
+                if self.retain:
+                    return array.copy()
+                # Prefetched arrays are handed to the first node.
+                del self._arrays[name]
+                self.nbytes -= array.nbytes
+                return array
+            self._loading.add(name)
+        # Read outside of the lock so that other arrays may be loaded
+        # concurrently.
+        try:
+            array = self.hdf.get_param(name, valid_only=True).array
+        finally:
+            with self._condition:
+                self._loading.discard(name)
+                if name in self._released:
+                    self._released.discard(name)
+                    hold = False
+                if array is not None:
+                    if hold:
+                        self._arrays[name] = array
+                        self.nbytes += array.nbytes
+                    self.loads += 1
+                self._condition.notify_all()
+        if hold and array is not None:
+            return array.copy()
+        return array
+
+    def get_param(self, name, cache=None):
+        '''
+        :param name: Name of the parameter.
+        :type name: str
+        :param cache: Cache of aligned nodes.
+        :type cache: dict or None
+        :returns: Parameter whose array is loaded on first access.
+        :rtype: LazyDerivedParameterNode
+        :raises KeyError: If the parameter is invalid.
+        '''
+        with self._condition:
+            hdf_parameter = self._params.get(name)
+        if hdf_parameter is None:
+            # Only read the first second of data to determine the
+            # parameter's attributes.
+            hdf_parameter = self.hdf.get_param(name, valid_only=True,
+                                               _slice=slice(0, 1))
+            with self._condition:
+                self._params[name] = hdf_parameter
+        return lazy_param_from_hdf(hdf_parameter, lambda: self._load(name),
+                                   cache=cache)
+
+    def prefetch(self, name):
+        '''
+        Read and decompress the array of a parameter, if it has not already
+        been loaded, so that the next node accessing it receives it from
+        memory.
+
+        :param name: Name of the parameter.
+        :type name: str
+        :raises KeyError: If the parameter is invalid.
+        '''
+        self._load(name, prefetch=True)
+
+    def release(self, name, attributes=True):
+        '''
+        Release the attributes and loaded array of a parameter.
+
+        :param name: Name of the parameter.
+        :type name: str
+        :param attributes: Whether to release the attributes of the parameter
+            as well as its array.
+        :type attributes: bool
+        '''
+        with self._condition:
+            if attributes:
+                self._params.pop(name, None)
+            array = self._arrays.pop(name, None)
+            if array is not None:
+                self.nbytes -= array.nbytes
+            if name in self._loading:
+                self._released.add(name)
+
+
+class ParameterPrefetcher(object):
+    '''
+    Reads and decompresses the parameters within the hdf file which nodes
+    depend upon within a background thread, ahead of the nodes being
+    derived, therefore reading the hdf file overlaps with derivation.
+
+    The plan lists the names of the parameters each node depends upon in
+    the order the nodes are derived. Parameters are prefetched for the nodes
+    which are within the given number of nodes of the node being derived
+    (see advance) into the arrays loaded by LazyParameters, while the bytes
+    of the loaded arrays are within the budget.
+    '''
+    def __init__(self, lazy_params, plan, nodes, max_bytes=None):
+        '''
+        :param lazy_params: Parameters which arrays are prefetched into.
+        :type lazy_params: LazyParameters
+        :param plan: Names of the parameters within the hdf file each node
+            depends upon in the order the nodes are derived.
+        :type plan: [[str]]
+        :param nodes: Number of nodes to prefetch parameters ahead of the
+            node being derived.
+        :type nodes: int
+        :param max_bytes: Do not prefetch while the arrays loaded by
+            lazy_params exceed this number of bytes. A value of None does
+            not limit prefetching.
+        :type max_bytes: int or None
+        '''
+        self.lazy_params = lazy_params
+        self.plan = plan
+        self.nodes = nodes
+        self.max_bytes = max_bytes
+        self.prefetched = []
+        self._position = 0
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._prefetcher)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _wait(self, position):
+        '''
+        Wait until the parameters of the node at position may be prefetched.
+
+        :returns: Whether to prefetch, i.e. the prefetcher has not been
+            stopped and the node is not already being derived.
+        :rtype: bool
+        '''
+        with self._condition:
+            while not self._stopped and position > self._position and (
+                    position >= self._position + self.nodes or
+                    (self.max_bytes is not None and
+                     self.lazy_params.nbytes >= self.max_bytes)):
+                self._condition.wait()
+            return not self._stopped and position > self._position
+
+    def _prefetcher(self):
+        for position, names in enumerate(self.plan):
+            for name in names:
+                if not self._wait(position):
+                    if self._stopped:
+                        return
+                    # The node is being derived and loads its own
+                    # parameters.
+                    break
+                try:
+                    self.lazy_params.prefetch(name)
+                except Exception:
+                    # Invalid parameters raise when accessed by the node.
+                    logger.debug("Unable to prefetch '%s'.", name)
+                else:
+                    self.prefetched.append(name)
+
+    def advance(self, position):
+        '''
+        Notify the prefetcher that the node at position within the plan is
+        being derived and parameters released by previous nodes.
+
+        :param position: Position of the node within the plan.
+        :type position: int
+        '''
+        with self._condition:
+            self._position = position
+            self._condition.notify_all()
+
+    def stop(self):
+        '''
+        Stop prefetching and wait for the background thread to finish.
+        '''
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join()
+
+
+def store_node(node, param_name, hdf, node_mgr, params, results, force=False):
+    '''
+    Stores a derived node within params and its 1Hz aligned output within
+    results. DerivedParameterNodes are saved to the hdf file.
+
+    :param node: Derived node.
+    :type node: Node
+    :param param_name: Name of the node within the process_order.
+    :type param_name: str
+    :param hdf: Data file accessor used to save parameter data.
+    :type hdf: hdf_file
+    :param node_mgr: Node manager whose hdf_keys are kept up to date.
+    :type node_mgr: NodeManager
+    :param params: Nodes which have already been derived.
+    :type params: dict
+    :param results: ktis, kpvs, sections, approaches and flight_attrs dicts.
+    :type results: tuple of dict
+    :param force: Create fully masked arrays for parameters without arrays.
+    :type force: bool
+    :rtype: None
+    '''
+    ktis, kpvs, sections, approaches, flight_attrs = results
+    duration = hdf.duration
+
+    if node.node_type is KeyPointValueNode:
+        params[param_name] = node
+
+        aligned_kpvs = []
+        for one_hz in node.get_aligned(P(frequency=1, offset=0)):
+            if not (0 <= one_hz.index <= duration+4):
+                raise IndexError(
+                    "KPV '%s' index %.2f is not between 0 and %d" %
+                    (one_hz.name, one_hz.index, duration))
+            aligned_kpvs.append(one_hz)
+        kpvs[param_name] = aligned_kpvs
+    elif node.node_type is KeyTimeInstanceNode:
+        params[param_name] = node
+
+        aligned_ktis = []
+        for one_hz in node.get_aligned(P(frequency=1, offset=0)):
+            if not (0 <= one_hz.index <= duration+4):
+                raise IndexError(
+                    "KTI '%s' index %.2f is not between 0 and %d" %
+                    (one_hz.name, one_hz.index, duration))
+            aligned_ktis.append(one_hz)
+        ktis[param_name] = aligned_ktis
+    elif node.node_type is FlightAttributeNode:
+        params[param_name] = node
+        try:
+            # only has one Attribute node, store as a list for consistency
+            flight_attrs[param_name] = [Attribute(node.name, node.value)]
+        except:
+            logger.warning("Flight Attribute Node '%s' returned empty "
+                           "handed.", param_name)
+    elif issubclass(node.node_type, SectionNode):
+        aligned_section = node.get_aligned(P(frequency=1, offset=0))
+        for index, one_hz in enumerate(aligned_section):
+            # SectionNodes allow slice starts and stops being None which
+            # signifies the beginning and end of the data. To avoid
+            # TypeErrors in subsequent derive methods which perform
+            # arithmetic on section slice start and stops, replace with 0
+            # or hdf.duration.
+            fallback = lambda x, y: x if x is not None else y
+
+            duration = fallback(duration, 0)
+
+            start = fallback(one_hz.slice.start, 0)
+            stop = fallback(one_hz.slice.stop, duration)
+            start_edge = fallback(one_hz.start_edge, 0)
+            stop_edge = fallback(one_hz.stop_edge, duration)
+
+            slice_ = slice(start, stop)
+            one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
+            aligned_section[index] = one_hz
+
+            if not (0 <= start <= duration and 0 <= stop <= duration + 4):
+                msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
+                raise IndexError(
+                    msg % (one_hz.name, start, stop, duration))
+            if not 0 <= start_edge <= duration:
+                msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, start_edge, duration))
+            if not 0 <= stop_edge <= duration + 4:
+                msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, stop_edge, duration))
+            #section_list.append(one_hz)
+        params[param_name] = aligned_section
+        sections[param_name] = list(aligned_section)
+    elif issubclass(node.node_type, DerivedParameterNode):
+        if duration:
+            # check that the right number of nodes were returned Allow a
+            # small tolerance. For example if duration in seconds is 2822,
+            # then there will be an array length of  1411 at 0.5Hz and 706
+            # at 0.25Hz (rounded upwards). If we combine two 0.25Hz
+            # parameters then we will have an array length of 1412.
+            expected_length = duration * node.frequency
+            if node.array is None or (force and len(node.array) == 0):
+                logger.warning("No array set; creating a fully masked "
+                               "array for %s", param_name)
+                array_length = expected_length
+                # Where a parameter is wholly masked, we fill the HDF
+                # file with masked zeros to maintain structure.
+                node.array = \
+                    np_ma_masked_zeros(expected_length)
+            else:
+                array_length = len(node.array)
+            length_diff = array_length - expected_length
+            if length_diff == 0:
+                pass
+            elif 0 < length_diff < 5:
+                logger.warning("Cutting excess data for parameter '%s'. "
+                               "Expected length was '%s' while resulting "
+                               "array length was '%s'.", param_name,
+                               expected_length, len(node.array))
+                node.array = node.array[:expected_length]
+            else:
+                raise ValueError("Array length mismatch for parameter "
+                                 "'%s'. Expected '%s', resulting array "
+                                 "length '%s'." % (param_name,
+                                                   expected_length,
+                                                   array_length))
+
+        hdf.set_param(node)
+        # Keep hdf_keys up to date.
+        node_mgr.hdf_keys.append(param_name)
+    elif issubclass(node.node_type, ApproachNode):
+        aligned_approach = node.get_aligned(P(frequency=1, offset=0))
+        for approach in aligned_approach:
+            # Does not allow slice start or stops to be None.
+            valid_turnoff = (not approach.turnoff or
+                             (0 <= approach.turnoff <= duration))
+            valid_slice = ((0 <= approach.slice.start <= duration) and
+                           (0 <= approach.slice.stop <= duration))
+            valid_gs_est = (not approach.gs_est or
+                            ((0 <= approach.gs_est.start <= duration) and
+                             (0 <= approach.gs_est.stop <= duration)))
+            valid_loc_est = (not approach.loc_est or
+                             ((0 <= approach.loc_est.start <= duration) and
+                              (0 <= approach.loc_est.stop <= duration)))
+            if not all([valid_turnoff, valid_slice, valid_gs_est,
+                        valid_loc_est]):
+                raise ValueError('ApproachItem contains index outside of '
+                                 'flight data: %s' % approach)
+        params[param_name] = aligned_approach
+        approaches[param_name] = list(aligned_approach)
+    else:
+        raise NotImplementedError("Unknown Type %s" % node.__class__)
+
+
+def _store_node(node, param_name, hdf, node_mgr, params, results, force,
+                node_profile, profile):
+    '''
+    Stores a derived node (see store_node) adding the time taken to the
+    node's profile.
+    '''
+    if node_profile is None:
+        store_node(node, param_name, hdf, node_mgr, params, results,
+                   force=force)
+        return
+    start, start_cpu = time.time(), time.clock()
+    store_node(node, param_name, hdf, node_mgr, params, results, force=force)
+    node_profile['store_time'] = time.time() - start
+    node_profile['wall_time'] += node_profile['store_time']
+    node_profile['cpu_time'] += time.clock() - start_cpu
+    profile[param_name] = node_profile
+
+
+def _release_dependencies(param_name, node_class, consumers, params, cache,
+                          lazy_params=None):
+    '''
+    Decrements the number of remaining consumers of a derived node's
+    dependencies. Nodes without remaining consumers are released from params
+    and lazy_params and their aligned copies are evicted from the cache.
+    '''
+    released = [] if consumers.get(param_name) else [param_name]
+    for dep_name in node_class.get_dependency_names():
+        consumers[dep_name] -= 1
+        if not consumers[dep_name]:
+            released.append(dep_name)
+    for name in released:
+        params.pop(name, None)
+        if cache is not None:
+            cache.evict(name)
+        if lazy_params is not None:
+            lazy_params.release(name)
+
+
+def _release_prefetched(node_class, lazy_params):
+    '''
+    Releases the arrays of a derived node's dependencies which were
+    prefetched into lazy_params and not accessed by the node, when arrays
+    are not retained until eviction.
+    '''
+    for dep_name in node_class.get_dependency_names():
+        lazy_params.release(dep_name, attributes=False)
+
+
+def class_fingerprint(node_class):
+    '''
+    Fingerprint of a Node class' source code including the source of its base
+    classes, e.g. KeyPointValueNode. Changes to functions called by the class,
+    e.g. within the library, are not detected.
+
+    :param node_class: Node class.
+    :type node_class: class
+    :returns: Hex digest of the class' source.
+    :rtype: str
+    '''
+    try:
+        return _class_fingerprints[node_class]
+    except KeyError:
+        pass
+    sha = hashlib.sha256()
+    for cls in inspect.getmro(node_class):
+        if cls.__module__ == '__builtin__':
+            continue
+        try:
+            sha.update(inspect.getsource(cls))
+        except (IOError, TypeError):
+            # Source is not available, e.g. dynamically created classes.
+            sha.update('%s.%s' % (cls.__module__, cls.__name__))
+    fingerprint = _class_fingerprints[node_class] = sha.hexdigest()
+    return fingerprint
+
+
+_class_fingerprints = {}
+
+
+def get_fingerprints(process_order, gr_st, node_mgr):
+    '''
+    Fingerprints each node within the process_order. A derived node's
+    fingerprint combines the fingerprint of its class' source with the
+    fingerprints of the dependencies which are available to it, therefore
+    changes to a node's code or to any of its upstream nodes or attributes
+    will change the node's fingerprint.
+
+    Parameters within the hdf file (node_mgr.hdf_keys) are fingerprinted by
+    name and attributes by value.
+
+    :param process_order: Node names in the order they will be processed.
+    :type process_order: [str]
+    :param gr_st: Spanning tree graph as returned by dependency_order.
+    :type gr_st: nx.DiGraph
+    :param node_mgr: Node manager used to determine the type of each node.
+    :type node_mgr: NodeManager
+    :returns: Fingerprints keyed by node name.
+    :rtype: {str: str}
+    '''
+    fingerprints = {}
+    for name in process_order:
+        sha = hashlib.sha256()
+        if name in node_mgr.hdf_keys:
+            sha.update('hdf:%s' % name)
+        elif node_mgr.get_attribute(name) is not None:
+            value = node_mgr.get_attribute(name).value
+            sha.update('attribute:%s:%s' % (
+                name, json.dumps(value, sort_keys=True, default=repr)))
+        elif name in node_mgr.derived_nodes:
+            node_class = node_mgr.derived_nodes[name]
+            sha.update('node:%s:%s' % (name, class_fingerprint(node_class)))
+            available = set(gr_st.successors(name))
+            for dep_name in node_class.get_dependency_names():
+                if dep_name in available and dep_name in fingerprints:
+                    sha.update(':%s:%s' % (dep_name, fingerprints[dep_name]))
+        else:
+            continue
+        fingerprints[name] = sha.hexdigest()
+    return fingerprints
+
+
+def derive_parameters(hdf, node_mgr, process_order, params=None, force=False,
+                      gr_st=None, workers=None, executor=None, profile=None,
+                      write_behind=None, evict=None, lazy=None,
+                      prefetch=None):
     '''
     Derives parameters in process_order. Dependencies are sourced via the
     node_mgr.
 
+    When more than one worker is requested and the spanning tree graph
+    (gr_st) is provided, independent nodes are grouped into levels (see
+    level_schedule) and each level is derived concurrently on a pool of
+    workers. Dependencies are loaded and results are stored by the calling
+    thread in process_order, therefore the results are identical to
+    deriving the nodes serially.
+
     :param hdf: Data file accessor used to get and save parameter data and
         attributes
     :type hdf: hdf_file
@@ -104,12 +867,60 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
     :param process_order: Parameter / Node class names in the required order to
         be processed
     :type process_order: list of strings
+    :param gr_st: Spanning tree graph as returned by dependency_order.
+        Required to derive nodes concurrently.
+    :type gr_st: nx.DiGraph or None
+    :param workers: Number of workers to derive nodes concurrently. Defaults
+        to settings.DERIVE_WORKERS.
+    :type workers: int or None
+    :param executor: Either 'thread' or 'process'. Defaults to
+        settings.DERIVE_EXECUTOR.
+    :type executor: str or None
+    :param profile: Optional dictionary to record a profile of each derived
+        node, keyed by node name (see derive_node and Node.get_derived). The
+        time spent storing the node is recorded as 'store_time' and included
+        within 'wall_time' and 'cpu_time'. CPU time is process-wide and
+        therefore approximate when deriving nodes within a thread pool.
+    :type profile: dict or None
+    :param write_behind: Either 'thread' to write derived parameters to the
+        hdf file within a background thread, 'batch' to write them after all
+        nodes have been derived or False to write each parameter once it has
+        been derived. Defaults to settings.HDF_WRITE_BEHIND. See BufferedHDF.
+    :type write_behind: str or bool or None
+    :param evict: Release nodes from the cache once every node depending
+        upon them has been derived. Nodes are derived into a copy of params,
+        which is not modified. Defaults to settings.NODE_EVICTION.
+    :type evict: bool or None
+    :param lazy: Provide parameters from the hdf file whose arrays are read
+        when first accessed by a node (see LazyParameters). Arrays are only
+        retained for further nodes when evicting. Defaults to
+        settings.LAZY_PARAMETERS.
+    :type lazy: bool or None
+    :param prefetch: Number of nodes to read the parameters within the hdf
+        file ahead of within a background thread while nodes are derived (see
+        ParameterPrefetcher). Requires lazy parameters. A value of 0 does not
+        prefetch parameters. Defaults to settings.PREFETCH_NODES.
+    :type prefetch: int or None
     '''
     if not params:
         params = {}
-    # OPT: local lookup is faster than module-level (small).
-    node_subclasses = NODE_SUBCLASSES
-    
+    if workers is None:
+        workers = settings.DERIVE_WORKERS
+    if executor is None:
+        executor = settings.DERIVE_EXECUTOR
+    if write_behind is None:
+        write_behind = settings.HDF_WRITE_BEHIND
+    if evict is None:
+        evict = settings.NODE_EVICTION
+    if lazy is None:
+        lazy = settings.LAZY_PARAMETERS
+    if prefetch is None:
+        prefetch = settings.PREFETCH_NODES
+    if evict:
+        # Released nodes are removed from a copy rather than the caller's
+        # params.
+        params = dict(params)
+
     # store all derived params that aren't masked arrays
     approaches = {}
     # duplicate storage, but maintaining types
@@ -118,14 +929,16 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
     # 'Node Name' : node()  pass in node.get_accessor()
     sections = {}
     flight_attrs = {}
+    results = (ktis, kpvs, sections, approaches, flight_attrs)
     # cache of nodes to avoid repeated array alignment
-    cache = {} if NODE_CACHE else None
-    duration = hdf.duration
+    cache = NodeCache(max_bytes=settings.NODE_CACHE_MAX_BYTES) \
+        if NODE_CACHE else None
 
+    derive_order = []
     for param_name in process_order:
         if param_name in node_mgr.hdf_keys:
             continue
-        
+
         elif param_name in params:
             node = params[param_name]
             # populate output already at 1Hz
@@ -135,8 +948,10 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
                 ktis[param_name] = list(node)
             elif node.node_type is FlightAttributeNode:
                 flight_attrs[param_name] = [Attribute(node.name, node.value)]
-            elif node.node_type is SectionNode:
+            elif issubclass(node.node_type, SectionNode):
                 sections[param_name] = list(node)
+            elif issubclass(node.node_type, ApproachNode):
+                approaches[param_name] = list(node)
             # DerivedParameterNodes are not supported in initial data.
             continue
 
@@ -146,180 +961,120 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
             #TODO: optimise with only one call to get_attribute
             continue
 
-        #NB raises KeyError if Node is "unknown"
-        node_class = node_mgr.derived_nodes[param_name]
-
-        # build ordered dependencies
-        deps = []
-        node_deps = node_class.get_dependency_names()
-        for dep_name in node_deps:
-            if dep_name in params:  # already calculated KPV/KTI/Phase
-                deps.append(params[dep_name])
-            elif node_mgr.get_attribute(dep_name) is not None:
-                deps.append(node_mgr.get_attribute(dep_name))
-            elif dep_name in node_mgr.hdf_keys:
-                # LFL/Derived parameter
-                # all parameters (LFL or other) need get_aligned which is
-                # available on DerivedParameterNode
-                try:
-                    dp = derived_param_from_hdf(hdf.get_param(
-                        dep_name, valid_only=True), cache=cache)
-                except KeyError:
-                    # Parameter is invalid.
-                    dp = None
-                deps.append(dp)
-            else:  # dependency not available
-                deps.append(None)
-        if all([d is None for d in deps]):
-            raise RuntimeError(
-                "No dependencies available - Nodes cannot "
-                "operate without ANY dependencies available! "
-                "Node: %s" % node_class.__name__)
-
-        # initialise node
-        node = node_class(cache=cache)
-        # shhh, secret accessors for developing nodes in debug mode
-        node._p = params
-        node._h = hdf
-        node._n = node_mgr
-        logger.debug("Processing %s `%s`", get_node_type(node, node_subclasses), param_name)
-        # Derive the resulting value
-        
-        try:
-            node = node.get_derived(deps)
-        except:
-            if not force:
-                raise
-        
-        del node._p
-        del node._h
-        del node._n
+        derive_order.append(param_name)
 
-        if node.node_type is KeyPointValueNode:
-            params[param_name] = node
-            
-            aligned_kpvs = []
-            for one_hz in node.get_aligned(P(frequency=1, offset=0)):
-                if not (0 <= one_hz.index <= duration+4):
-                    raise IndexError(
-                        "KPV '%s' index %.2f is not between 0 and %d" %
-                        (one_hz.name, one_hz.index, duration))
-                aligned_kpvs.append(one_hz)
-            kpvs[param_name] = aligned_kpvs
-        elif node.node_type is KeyTimeInstanceNode:
-            params[param_name] = node
-            
-            aligned_ktis = []
-            for one_hz in node.get_aligned(P(frequency=1, offset=0)):
-                if not (0 <= one_hz.index <= duration+4):
-                    raise IndexError(
-                        "KTI '%s' index %.2f is not between 0 and %d" %
-                        (one_hz.name, one_hz.index, duration))
-                aligned_ktis.append(one_hz)
-            ktis[param_name] = aligned_ktis
-        elif node.node_type is FlightAttributeNode:
-            params[param_name] = node
-            try:
-                # only has one Attribute node, store as a list for consistency
-                flight_attrs[param_name] = [Attribute(node.name, node.value)]
-            except:
-                logger.warning("Flight Attribute Node '%s' returned empty "
-                               "handed.", param_name)
-        elif issubclass(node.node_type, SectionNode):
-            aligned_section = node.get_aligned(P(frequency=1, offset=0))
-            for index, one_hz in enumerate(aligned_section):
-                # SectionNodes allow slice starts and stops being None which
-                # signifies the beginning and end of the data. To avoid
-                # TypeErrors in subsequent derive methods which perform
-                # arithmetic on section slice start and stops, replace with 0
-                # or hdf.duration.
-                fallback = lambda x, y: x if x is not None else y
-
-                duration = fallback(duration, 0)
-
-                start = fallback(one_hz.slice.start, 0)
-                stop = fallback(one_hz.slice.stop, duration)
-                start_edge = fallback(one_hz.start_edge, 0)
-                stop_edge = fallback(one_hz.stop_edge, duration)
-
-                slice_ = slice(start, stop)
-                one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
-                aligned_section[index] = one_hz
-
-                if not (0 <= start <= duration and 0 <= stop <= duration + 4):
-                    msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
-                    raise IndexError(
-                        msg % (one_hz.name, start, stop, duration))
-                if not 0 <= start_edge <= duration:
-                    msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, start_edge, duration))
-                if not 0 <= stop_edge <= duration + 4:
-                    msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, stop_edge, duration))
-                #section_list.append(one_hz)
-            params[param_name] = aligned_section
-            sections[param_name] = list(aligned_section)
-        elif issubclass(node.node_type, DerivedParameterNode):
-            if duration:
-                # check that the right number of nodes were returned Allow a
-                # small tolerance. For example if duration in seconds is 2822,
-                # then there will be an array length of  1411 at 0.5Hz and 706
-                # at 0.25Hz (rounded upwards). If we combine two 0.25Hz
-                # parameters then we will have an array length of 1412.
-                expected_length = duration * node.frequency
-                if node.array is None or (force and len(node.array) == 0):
-                    logger.warning("No array set; creating a fully masked "
-                                   "array for %s", param_name)
-                    array_length = expected_length
-                    # Where a parameter is wholly masked, we fill the HDF
-                    # file with masked zeros to maintain structure.
-                    node.array = \
-                        np_ma_masked_zeros(expected_length)
-                else:
-                    array_length = len(node.array)
-                length_diff = array_length - expected_length
-                if length_diff == 0:
-                    pass
-                elif 0 < length_diff < 5:
-                    logger.warning("Cutting excess data for parameter '%s'. "
-                                   "Expected length was '%s' while resulting "
-                                   "array length was '%s'.", param_name,
-                                   expected_length, len(node.array))
-                    node.array = node.array[:expected_length]
+    if workers > 1 and gr_st is not None:
+        available = set(process_order) - set(derive_order)
+        schedule = level_schedule(derive_order, gr_st, available=available)
+    else:
+        schedule = [[param_name] for param_name in derive_order]
+        workers = 0
+
+    if evict:
+        # Count the nodes depending upon each node which are yet to be derived.
+        consumers = {}
+        for param_name in derive_order:
+            node_class = node_mgr.derived_nodes[param_name]
+            for dep_name in node_class.get_dependency_names():
+                consumers[dep_name] = consumers.get(dep_name, 0) + 1
+
+    if write_behind:
+        hdf = BufferedHDF(hdf, background=write_behind == 'thread')
+    # Arrays are only retained for further nodes when they are released
+    # once no further nodes depend upon them.
+    lazy_params = LazyParameters(hdf, retain=evict) if lazy else None
+
+    if lazy_params is not None and prefetch:
+        # Parameters within the hdf file which each node depends upon in the
+        # order the nodes are derived.
+        hdf_names = set(node_mgr.hdf_keys) - set(params)
+        plan = [[name for name in
+                 node_mgr.derived_nodes[param_name].get_dependency_names()
+                 if name in hdf_names]
+                for level in schedule for param_name in level]
+        prefetcher = ParameterPrefetcher(
+            lazy_params, plan, prefetch,
+            max_bytes=settings.PREFETCH_MAX_BYTES)
+    else:
+        prefetcher = None
+
+    if workers and executor == 'process':
+        # Nodes are pickled to and from the worker processes, therefore the
+        # cache and the secret accessors cannot be shared.
+        pool = multiprocessing.Pool(workers)
+    elif workers:
+        pool = ThreadPool(workers)
+    else:
+        pool = None
+
+    position = 0
+    try:
+        for level in schedule:
+            jobs = []
+            for param_name in level:
+                if prefetcher is not None:
+                    prefetcher.advance(position)
+                position += 1
+                #NB raises KeyError if Node is "unknown"
+                node_class = node_mgr.derived_nodes[param_name]
+                # build ordered dependencies
+                deps = get_dependencies(node_class, hdf, node_mgr, params,
+                                        cache=cache, lazy_params=lazy_params)
+                node_profile = {} if profile is not None else None
+                if pool is None:
+                    node = derive_node(node_class, deps, cache=cache,
+                                       force=force,
+                                       accessors=(params, hdf, node_mgr),
+                                       profile=node_profile)
+                    _store_node(node, param_name, hdf, node_mgr, params,
+                                results, force, node_profile, profile)
+                    if evict:
+                        _release_dependencies(param_name, node_class,
+                                              consumers, params, cache,
+                                              lazy_params=lazy_params)
+                    elif prefetcher is not None:
+                        _release_prefetched(node_class, lazy_params)
+                elif executor == 'process':
+                    jobs.append((param_name, pool.apply_async(
+                        _derive_node_star,
+                        ((node_class, deps, None, force, None,
+                          node_profile),))))
                 else:
-                    raise ValueError("Array length mismatch for parameter "
-                                     "'%s'. Expected '%s', resulting array "
-                                     "length '%s'." % (param_name,
-                                                       expected_length,
-                                                       array_length))
-
-            hdf.set_param(node)
-            # Keep hdf_keys up to date.
-            node_mgr.hdf_keys.append(param_name)
-        elif issubclass(node.node_type, ApproachNode):
-            aligned_approach = node.get_aligned(P(frequency=1, offset=0))
-            for approach in aligned_approach:
-                # Does not allow slice start or stops to be None.
-                valid_turnoff = (not approach.turnoff or
-                                 (0 <= approach.turnoff <= duration))
-                valid_slice = ((0 <= approach.slice.start <= duration) and
-                               (0 <= approach.slice.stop <= duration))
-                valid_gs_est = (not approach.gs_est or
-                                ((0 <= approach.gs_est.start <= duration) and
-                                 (0 <= approach.gs_est.stop <= duration)))
-                valid_loc_est = (not approach.loc_est or
-                                 ((0 <= approach.loc_est.start <= duration) and
-                                  (0 <= approach.loc_est.stop <= duration)))
-                if not all([valid_turnoff, valid_slice, valid_gs_est,
-                            valid_loc_est]):
-                    raise ValueError('ApproachItem contains index outside of '
-                                     'flight data: %s' % approach)
-            params[param_name] = aligned_approach
-            approaches[param_name] = list(aligned_approach)
-        else:
-            raise NotImplementedError("Unknown Type %s" % node.__class__)
-        continue
-    return ktis, kpvs, sections, approaches, flight_attrs
+                    jobs.append((param_name, pool.apply_async(
+                        _derive_node_star,
+                        ((node_class, deps, cache, force,
+                          (params, hdf, node_mgr), node_profile),))))
+            # Store the results in process_order raising the first exception.
+            for param_name, job in jobs:
+                node, node_profile = job.get()
+                _store_node(node, param_name, hdf, node_mgr, params,
+                            results, force, node_profile, profile)
+                if evict:
+                    _release_dependencies(
+                        param_name, node_mgr.derived_nodes[param_name],
+                        consumers, params, cache, lazy_params=lazy_params)
+                elif prefetcher is not None:
+                    _release_prefetched(node_mgr.derived_nodes[param_name],
+                                        lazy_params)
+    except:
+        if write_behind:
+            # Write the parameters derived before the exception.
+            exc_info = sys.exc_info()
+            try:
+                hdf.close()
+            except Exception:
+                logger.exception("Unable to write derived parameters.")
+            raise exc_info[0], exc_info[1], exc_info[2]
+        raise
+    finally:
+        if prefetcher is not None:
+            prefetcher.stop()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    if write_behind:
+        hdf.close()
+    return results
 
 
 def parse_analyser_profiles(analyser_profiles, filter_modules=None):
@@ -355,7 +1110,8 @@ def parse_analyser_profiles(analyser_profiles, filter_modules=None):
 def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_record={},
                    requested=[], required=[], include_flight_attributes=True,
                    additional_modules=[], pre_flight_kwargs={}, force=False,
-                   initial={}, reprocess=False):
+                   initial={}, reprocess=False, workers=None, executor=None,
+                   profile=False, incremental=False, evict=None):
     '''
     Processes the HDF file (segment_info['File']) to derive the required_params (Nodes)
     within python modules (settings.NODE_MODULES).
@@ -386,6 +1142,16 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
     :param initial: Initial content for nodes to avoid reprocessing (excluding parameter nodes which are saved to the hdf).
     :type initial: dict
     :param reprocess: Force reprocessing of all Nodes (including derived Nodes already saved to the HDF file).
+    :param workers: Number of workers to derive independent nodes concurrently (defaults to settings.DERIVE_WORKERS).
+    :type workers: int or None
+    :param executor: Derive nodes within a 'thread' or 'process' pool (defaults to settings.DERIVE_EXECUTOR).
+    :type executor: str or None
+    :param profile: Record a profile of each derived node (see derive_parameters), returned within the 'profile' key and stored within the HDF file's profile attribute.
+    :type profile: bool
+    :param incremental: Only derive nodes whose fingerprint (see get_fingerprints) differs from the fingerprints stored within the HDF file by the previous analysis. Derived parameters with matching fingerprints are reused from the HDF file while other nodes with matching fingerprints are reused from initial. Ignored when reprocess is True.
+    :type incremental: bool
+    :param evict: Release derived nodes and their aligned copies once every node depending upon them has been derived (defaults to settings.NODE_EVICTION). Recommended for batches and long flights.
+    :type evict: bool or None
 
     :returns: See below:
     :rtype: Dict
@@ -559,6 +1325,17 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
 
     # go through modules to get derived nodes
     node_modules = settings.NODE_MODULES + additional_modules
+    registry = get_node_registry(node_modules)
+    flight_attribute_names = []
+    if include_flight_attributes:
+        for module in registry['modules']:
+            if module['name'] == 'analysis_engine.flight_attribute':
+                flight_attribute_names = module['nodes']
+    if requested:
+        # only import modules providing requested nodes and dependencies
+        node_modules = get_node_modules(
+            set(requested).union(required or [], flight_attribute_names),
+            node_modules, registry=registry)
     derived_nodes = get_derived_nodes(node_modules)
 
     if requested:
@@ -571,13 +1348,13 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
 
     # include all flight attributes as requested
     if include_flight_attributes:
-        requested = list(set(
-            requested + get_derived_nodes(
-                ['analysis_engine.flight_attribute']).keys()))
+        requested = list(set(requested + flight_attribute_names))
     
+    incremental = incremental and not reprocess
     initial = process_flight_to_nodes(initial)
-    for node_name in requested:
-        initial.pop(node_name, None)
+    if not incremental:
+        for node_name in requested:
+            initial.pop(node_name, None)
 
     # open HDF for reading
     with hdf_file(hdf_path) as hdf:
@@ -589,13 +1366,33 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
         else:
             logger.info("No PRE_FLIGHT_ANALYSIS actions to perform")
         # Track nodes.
-        param_names = hdf.valid_lfl_param_names() if reprocess else hdf.valid_param_names()
+        param_names = hdf.valid_lfl_param_names() if reprocess or incremental else hdf.valid_param_names()
         node_mgr = NodeManager(
             segment_info, hdf.duration, param_names,
             requested, required, derived_nodes, aircraft_info,
             achieved_flight_record)
         # calculate dependency tree
         process_order, gr_st = dependency_order(node_mgr, draw=False)
+        fingerprints = get_fingerprints(process_order, gr_st, node_mgr)
+        if incremental:
+            previous_fingerprints = json.loads(
+                hdf.get_attr('node_fingerprints') or '{}')
+            derived_keys = set(hdf.valid_param_names()) - set(param_names)
+            reused = []
+            for node_name in process_order:
+                if node_name not in node_mgr.derived_nodes or \
+                   node_name in node_mgr.hdf_keys:
+                    continue
+                if fingerprints[node_name] != \
+                   previous_fingerprints.get(node_name):
+                    initial.pop(node_name, None)
+                elif node_name in derived_keys:
+                    node_mgr.hdf_keys.append(node_name)
+                    reused.append(node_name)
+                elif node_name in initial:
+                    reused.append(node_name)
+            logger.info("Reusing %d of %d derived nodes with unchanged "
+                        "fingerprints.", len(reused), len(process_order))
         if settings.CACHE_PARAMETER_MIN_USAGE:
             # find params used more than
             for node in gr_st.nodes():
@@ -608,8 +1405,12 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
                          hdf.cache_param_list)
 
         # derive parameters
+        node_profile = {} if profile else None
         ktis, kpvs, sections, approaches, flight_attrs = \
-            derive_parameters(hdf, node_mgr, process_order, params=initial, force=force)
+            derive_parameters(hdf, node_mgr, process_order, params=initial,
+                              force=force, gr_st=gr_st, workers=workers,
+                              executor=executor, profile=node_profile,
+                              evict=evict)
 
         # geo locate KTIs
         ktis = geo_locate(hdf, ktis)
@@ -622,18 +1423,272 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
         # Store version of FlightDataAnalyser
         hdf.analysis_version = __version__
         # Store dependency tree
+        from networkx.readwrite import json_graph
         hdf.dependency_tree = json.dumps(json_graph.node_link_data(gr_st))
+        # Store fingerprints for incremental reprocessing
+        hdf.set_attr('node_fingerprints', json.dumps(fingerprints))
+        if profile:
+            # Store profile of derived nodes
+            hdf.set_attr('profile', json.dumps(node_profile))
         # Store aircraft info
         hdf.set_attr('aircraft_info', aircraft_info)
         hdf.set_attr('achieved_flight_record', achieved_flight_record)
 
-    return {
+    res = {
         'flight': flight_attrs,
         'kti': ktis,
         'kpv': kpvs,
         'approach': approaches,
         'phases': sections,
     }
+    if profile:
+        res['profile'] = node_profile
+    return res
+
+
+def profile_table(profile, sort_by='wall_time', limit=None):
+    '''
+    Formats a profile of derived nodes as a table sorted in descending order.
+
+    :param profile: Profile as returned by process_flight.
+    :type profile: dict
+    :param sort_by: Profile key to sort by.
+    :type sort_by: str
+    :param limit: Maximum number of nodes to include.
+    :type limit: int or None
+    :returns: Table of nodes.
+    :rtype: str
+    '''
+    from flightdatautilities.print_table import indent
+    columns = ('wall_time', 'cpu_time', 'align_time', 'derive_time',
+               'store_time', 'bytes', 'cache_hits', 'cache_misses')
+    rows = [('Node', 'Type') + columns]
+    names = sorted(profile, key=lambda n: profile[n].get(sort_by, 0),
+                   reverse=True)
+    for name in names[:limit]:
+        values = [profile[name].get(column, 0) for column in columns]
+        rows.append([name, profile[name].get('type', '')] +
+                    ['%.4f' % v if isinstance(v, float) else str(v)
+                     for v in values])
+    return indent(rows, hasHeader=True)
+
+
+def write_outputs(hdf_path, res, csv=True, kml=True, json_=False):
+    '''
+    Writes the results of process_flight alongside the processed hdf file.
+
+    :param hdf_path: Path of the processed hdf file.
+    :type hdf_path: str
+    :param res: Results as returned by process_flight.
+    :type res: dict
+    :param csv: Write KPV, KTI and Phases to a CSV file.
+    :type csv: bool
+    :param kml: Write the flight track to a KML file.
+    :type kml: bool
+    :param json_: Write the results to a JSON file.
+    :type json_: bool
+    :returns: Paths of the files written.
+    :rtype: [str]
+    '''
+    from analysis_engine.plot_flight import csv_flight_details, track_to_kml
+    dest_paths = []
+    base_path = os.path.splitext(hdf_path)[0]
+    if json_:
+        json_dest = base_path + '.json'
+        with open(json_dest, 'wb') as json_file:
+            json_file.write(process_flight_to_json(res))
+        logger.info("Process flight results writen to json: %s", json_dest)
+        dest_paths.append(json_dest)
+    # Flatten results.
+    res = {k: list(itertools.chain.from_iterable(v.itervalues()))
+           for k, v in res.iteritems() if k != 'profile'}
+    # Write CSV file
+    if csv:
+        csv_dest = base_path + '.csv'
+        csv_flight_details(hdf_path, res['kti'], res['kpv'], res['phases'],
+                           dest_path=csv_dest)
+        logger.info("KPV, KTI and Phases writen to csv: %s", csv_dest)
+        dest_paths.append(csv_dest)
+    # Write KML file
+    if kml:
+        kml_dest = base_path + '.kml'
+        dest = track_to_kml(
+            hdf_path, res['kti'], res['kpv'], res['approach'],
+            dest_path=kml_dest)
+        if dest:
+            logger.info("Flight Track with attributes writen to kml: %s", dest)
+            dest_paths.append(dest)
+    return dest_paths
+
+
+def load_batch(path, tail_number=None, aircraft_info={},
+               segment_type='START_AND_STOP'):
+    '''
+    Loads a batch of hdf files to process from either a directory or a JSON
+    manifest.
+
+    Within a directory, every file with an .hdf5 extension is processed.
+    Aircraft info for a file is loaded from a JSON file with the same name,
+    e.g. 'flight.json' for 'flight.hdf5', if it exists.
+
+    A manifest is a JSON list of objects with a 'File' key (relative to the
+    manifest's directory) and optional 'Tail Number', 'Aircraft Info',
+    'Achieved Flight Record' and 'Segment Type' keys.
+
+    :param path: Path of directory or manifest.
+    :type path: str
+    :param tail_number: Default tail number.
+    :type tail_number: str
+    :param aircraft_info: Default aircraft info updated by each file's.
+    :type aircraft_info: dict
+    :param segment_type: Default segment type.
+    :type segment_type: str
+    :returns: Batch entries with 'File', 'Tail Number', 'Aircraft Info',
+        'Achieved Flight Record' and 'Segment Type' keys.
+    :rtype: [dict]
+    '''
+    if os.path.isdir(path):
+        entries = []
+        for filename in sorted(os.listdir(path)):
+            name, ext = os.path.splitext(filename)
+            if ext != '.hdf5' or name.endswith('_process'):
+                continue
+            entry = {'File': filename}
+            info_path = os.path.join(path, name + '.json')
+            if os.path.isfile(info_path):
+                with open(info_path, 'rb') as info_file:
+                    entry['Aircraft Info'] = json.load(info_file)
+            entries.append(entry)
+        base_dir = path
+    else:
+        with open(path, 'rb') as manifest:
+            entries = json.load(manifest)
+        base_dir = os.path.dirname(os.path.abspath(path))
+
+    batch = []
+    for entry in entries:
+        info = dict(aircraft_info)
+        info.update(entry.get('Aircraft Info', {}))
+        batch.append({
+            'File': os.path.join(base_dir, entry['File']),
+            'Tail Number': entry.get('Tail Number',
+                                     info.get('Tail Number', tail_number)),
+            'Aircraft Info': info,
+            'Achieved Flight Record': entry.get('Achieved Flight Record', {}),
+            'Segment Type': entry.get('Segment Type', segment_type),
+        })
+    return batch
+
+
+def _init_batch_worker(additional_modules):
+    '''
+    Imports node modules and output dependencies once per batch worker
+    process so that they are not imported for each file.
+    '''
+    import analysis_engine.plot_flight
+    get_derived_nodes(settings.NODE_MODULES + additional_modules)
+
+
+def process_batch_entry(entry, strip=False, csv=True, kml=True, json_=True,
+                        **kwargs):
+    '''
+    Processes a copy of a single batch entry's hdf file and writes its
+    outputs. Exceptions are logged and recorded within the summary rather
+    than raised so that the remainder of the batch is processed.
+
+    :param entry: Batch entry as returned by load_batch.
+    :type entry: dict
+    :param strip: Delete derived parameters from the hdf file copy.
+    :type strip: bool
+    :param kwargs: Keyword arguments passed into process_flight.
+    :returns: Summary of the processed file.
+    :rtype: dict
+    '''
+    summary = {'File': entry['File'], 'Status': 'Failed'}
+    start = time.time()
+    try:
+        hdf_copy = copy_file(entry['File'], postfix='_process')
+        summary['Output'] = hdf_copy
+        if strip:
+            with hdf_file(hdf_copy) as hdf:
+                hdf.delete_params(hdf.derived_keys())
+        segment_info = {
+            'File': hdf_copy,
+            'Segment Type': entry['Segment Type'],
+        }
+        res = process_flight(
+            segment_info, entry['Tail Number'],
+            aircraft_info=entry['Aircraft Info'],
+            achieved_flight_record=entry['Achieved Flight Record'],
+            **kwargs)
+        summary['Processing Duration'] = time.time() - start
+        summary['Outputs'] = write_outputs(hdf_copy, res, csv=csv, kml=kml,
+                                           json_=json_)
+        summary['Status'] = 'OK'
+    except Exception as err:
+        logger.exception("Failed to process '%s'.", entry['File'])
+        summary['Error'] = '%s: %s' % (err.__class__.__name__, err)
+        summary['Traceback'] = traceback.format_exc()
+    summary['Duration'] = time.time() - start
+    return summary
+
+
+def _process_batch_entry_star(args):
+    '''
+    Unpacks arguments for process_batch_entry when mapped over a pool.
+    '''
+    entry, kwargs = args
+    return process_batch_entry(entry, **kwargs)
+
+
+def process_batch(batch, processes=None, summary_path=None,
+                  additional_modules=[], **kwargs):
+    '''
+    Processes a batch of hdf files within a pool of long-lived worker
+    processes. Each worker imports the node modules once on start up and
+    reuses them for every file it processes.
+
+    :param batch: Batch entries as returned by load_batch.
+    :type batch: [dict]
+    :param processes: Number of worker processes. Defaults to the number of
+        CPUs.
+    :type processes: int or None
+    :param summary_path: Optional path to write the summary as JSON.
+    :type summary_path: str or None
+    :param additional_modules: List of module paths to import.
+    :type additional_modules: List of Strings
+    :param kwargs: Keyword arguments passed into process_batch_entry. Nodes
+        are evicted (see process_flight) unless evict is False.
+    :returns: Summary of the batch with 'Flights', 'Processed', 'Failed' and
+        'Duration' keys.
+    :rtype: dict
+    '''
+    start = time.time()
+    kwargs['additional_modules'] = additional_modules
+    kwargs.setdefault('evict', True)
+    pool = multiprocessing.Pool(processes, initializer=_init_batch_worker,
+                                initargs=(additional_modules,))
+    try:
+        flights = pool.map(_process_batch_entry_star,
+                           [(entry, kwargs) for entry in batch], chunksize=1)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    failed = len([f for f in flights if f['Status'] != 'OK'])
+    summary = {
+        'Flights': flights,
+        'Processed': len(flights) - failed,
+        'Failed': failed,
+        'Duration': time.time() - start,
+    }
+    logger.info("Processed %d of %d files in %.2f seconds.",
+                summary['Processed'], len(flights), summary['Duration'])
+    if summary_path:
+        with open(summary_path, 'wb') as summary_file:
+            json.dump(summary, summary_file, indent=2, sort_keys=True)
+        logger.info("Batch summary writen to json: %s", summary_path)
+    return summary
 
 
 def main():
@@ -641,13 +1696,13 @@ def main():
     print '  - Powered by POLARIS'
     print '  - http://www.flightdatacommunity.com'
     print ''
-    from analysis_engine.plot_flight import csv_flight_details, track_to_kml
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
     logger.addHandler(logging.StreamHandler(stream=sys.stdout))
     parser = argparse.ArgumentParser(description="Process a flight.")
     parser.add_argument('file', type=str,
-                        help='Path of file to process.')
+                        help='Path of file to process or, with -batch, a '
+                        'directory of files or JSON manifest.')
     help = 'Disable writing a CSV of the processing results.'
     parser.add_argument('-disable-csv', dest='disable_csv',
                         action='store_true', help=help)
@@ -716,6 +1771,35 @@ def main():
     
     parser.add_argument('-initial', dest='initial', type=str,
                         help='Path to initial nodes in json format.')
+    parser.add_argument('-workers', dest='workers', type=int,
+                        help='Number of workers to derive independent nodes '
+                        'concurrently.')
+    parser.add_argument('-executor', dest='executor', type=str,
+                        choices=('thread', 'process'),
+                        help='Derive nodes within a thread or process pool.')
+    parser.add_argument('-incremental', dest='incremental',
+                        action='store_true',
+                        help='Only derive nodes whose code or dependencies '
+                        'have changed since the file was last processed.')
+    parser.add_argument('-profile', dest='profile', action='store_true',
+                        help='Print a table of the time and memory used by '
+                        'each derived node.')
+    parser.add_argument('-evict', dest='evict', action='store_true',
+                        help='Release derived nodes once no further nodes '
+                        'depend upon them to reduce memory usage. Always '
+                        'enabled with -batch.')
+    parser.add_argument('-batch', dest='batch', action='store_true',
+                        help='Process a directory of hdf files or JSON '
+                        'manifest within a pool of worker processes.')
+    parser.add_argument('-processes', dest='processes', type=int,
+                        help='Number of batch worker processes (defaults to '
+                        'the number of CPUs).')
+    parser.add_argument('-summary', dest='summary', type=str,
+                        help='Path of batch summary JSON (defaults to '
+                        'batch_summary.json alongside the batch).')
+    help = 'Disable writing a JSON of the processing results in batch mode.'
+    parser.add_argument('-disable-json', dest='disable_json',
+                        action='store_true', help=help)
     
 
     args = parser.parse_args()
@@ -764,6 +1848,27 @@ def main():
     if args.engine_type:
         aircraft_info['Engine Type'] = args.engine_type
 
+    if args.batch:
+        if not os.path.exists(args.file):
+            parser.error('Path for batch not found: %s' % args.file)
+        if args.initial:
+            parser.error('Initial json data is not supported in batch mode.')
+        batch = load_batch(args.file, tail_number=args.tail_number,
+                           aircraft_info=aircraft_info,
+                           segment_type=args.segment_type)
+        summary_path = args.summary or os.path.join(
+            args.file if os.path.isdir(args.file)
+            else os.path.dirname(os.path.abspath(args.file)),
+            'batch_summary.json')
+        process_batch(
+            batch, processes=args.processes, summary_path=summary_path,
+            strip=args.strip, csv=not args.disable_csv,
+            kml=not args.disable_kml, json_=not args.disable_json,
+            requested=args.requested, required=args.required,
+            workers=args.workers, executor=args.executor,
+            profile=args.profile, incremental=args.incremental)
+        return
+
     # Derive parameters to new HDF
     hdf_copy = copy_file(args.file, postfix='_process')
     if args.strip:
@@ -784,26 +1889,16 @@ def main():
     res = process_flight(
         segment_info, args.tail_number, aircraft_info=aircraft_info,
         requested=args.requested, required=args.required, initial=initial,
+        workers=args.workers, executor=args.executor, profile=args.profile,
+        incremental=args.incremental, evict=args.evict or None,
     )
-    # Flatten results.
-    res = {k: list(itertools.chain.from_iterable(v.itervalues()))
-           for k, v in res.iteritems()}
+    if args.profile:
+        logger.info("Derived node profile:\n%s",
+                    profile_table(res.pop('profile')))
     
     logger.info("Derived parameters stored in hdf: %s", hdf_copy)
-    # Write CSV file
-    if not args.disable_csv:
-        csv_dest = os.path.splitext(hdf_copy)[0] + '.csv'
-        csv_flight_details(hdf_copy, res['kti'], res['kpv'], res['phases'],
-                           dest_path=csv_dest)
-        logger.info("KPV, KTI and Phases writen to csv: %s", csv_dest)
-    # Write KML file
-    if not args.disable_kml:
-        kml_dest = os.path.splitext(hdf_copy)[0] + '.kml'
-        dest = track_to_kml(
-            hdf_copy, res['kti'], res['kpv'], res['approach'],
-            dest_path=kml_dest)
-        if dest:
-            logger.info("Flight Track with attributes writen to kml: %s", dest)
+    write_outputs(hdf_copy, res, csv=not args.disable_csv,
+                  kml=not args.disable_kml)
 
     # - END -
 
@@ -2,10 +2,46 @@
 __all__ = ['recordtype']
 
 import sys
+from itertools import izip, repeat
 from textwrap import dedent
 from keyword import iskeyword
 
 
+def _from_columns(cls, **columns):
+    '''
+    Bulk constructor creating a record for each row of columns. Fields which
+    are not provided are given their default value.
+
+    >>> Point = recordtype('Point', 'x y', default=0)
+    >>> Point.from_columns(x=[1, 2])
+    [Point(x=1, y=0), Point(x=2, y=0)]
+
+    :param columns: Sequences of values keyed by field name.
+    :returns: A list of records.
+    :raises TypeError: If a field without a default value is not provided.
+    :raises ValueError: If columns are of different lengths.
+    '''
+    fields = cls._fields
+    unknown = set(columns) - set(fields)
+    if unknown:
+        raise TypeError('Invalid field names: %s' % ', '.join(sorted(unknown)))
+    defaults = cls.__init__.im_func.func_defaults or ()
+    first_default = len(fields) - len(defaults)
+    lengths = set(len(c) for c in columns.itervalues())
+    if len(lengths) > 1:
+        raise ValueError('Columns must be of equal length')
+    length = lengths.pop() if lengths else 0
+    args = []
+    for position, field in enumerate(fields):
+        if field in columns:
+            args.append(columns[field])
+        elif position >= first_default:
+            args.append(repeat(defaults[position - first_default], length))
+        else:
+            raise TypeError('Missing column for field: %s' % field)
+    return [cls(*row) for row in izip(*args)]
+
+
 def recordtype(typename, field_names, verbose=False, **default_kwds):
     '''Returns a new class with named fields.
 
@@ -33,6 +69,8 @@ def recordtype(typename, field_names, verbose=False, **default_kwds):
     100
     >>> Point(**d) == p        # convert from a dictionary
     True
+    >>> Point._make([1, 2])    # convert from a sequence
+    Point(x=1, y=2)
     '''
     # Parse and validate the field names.  Validation serves two purposes,
     # generating informative error messages and preventing template injection attacks.
@@ -86,6 +124,7 @@ def recordtype(typename, field_names, verbose=False, **default_kwds):
 
             __hash__ = None
             __slots__ = %(field_names)r
+            _fields = %(field_names)r
 
             def __init__(self, %(argtxt)s):
                 %(inittxt)s
@@ -102,6 +141,11 @@ def recordtype(typename, field_names, verbose=False, **default_kwds):
             def __setitem__(self, index, value):
                 return setattr(self, self.__slots__[index], value)
 
+            @classmethod
+            def _make(cls, iterable):
+                'Make a new %(typename)s object from a sequence or iterable'
+                return cls(*iterable)
+
             def todict(self):
                 'Return a new dict which maps field names to their values'
                 return {%(dicttxt)s}
@@ -128,11 +172,18 @@ def recordtype(typename, field_names, verbose=False, **default_kwds):
 
             def __setstate__(self, state):
                 %(tupletxt)s = state
+
+            def __reduce__(self):
+                return (self.__class__, %(tupletxt)s)
+
+            def __copy__(self):
+                return self.__class__(%(argvaltxt)s)
     ''') % {
         'typename': typename,
         'field_names': field_names,
         'numfields': len(field_names),
         'argtxt': ', '.join(field_names),
+        'argvaltxt': ', '.join('self.%s' % f for f in field_names),
         'reprtxt': ', '.join('%s=%%r' % f for f in field_names),
         'dicttxt': ', '.join('%r: self.%s' % (f,f) for f in field_names),
         'tupletxt': repr(tuple('self.%s' % f for f in field_names)).replace("'",''),
@@ -149,6 +200,7 @@ def recordtype(typename, field_names, verbose=False, **default_kwds):
         raise SyntaxError(e.message + ':\n' + template)
     cls = namespace[typename]
     cls.__init__.im_func.func_defaults = init_defaults
+    cls.from_columns = classmethod(_from_columns)
     # For pickling to work, the __module__ variable needs to be set to the frame
     # where the named tuple is created.  Bypass this step in enviroments where
     # sys._getframe is not defined (Jython for example).
@@ -91,6 +91,80 @@ NODE_CACHE = True
 # accurate to. A value of None will retain full accuracy.
 NODE_CACHE_OFFSET_DP = None
 
+# Maximum number of bytes of aligned arrays stored within the node cache. The
+# least recently used nodes are evicted once the budget is exceeded. A value of
+# None does not limit the size of the cache.
+NODE_CACHE_MAX_BYTES = None
+
+# Release aligned copies within the node cache and derived nodes once every
+# node depending upon them has been derived to reduce memory usage. Batch
+# processing always enables eviction (see process_batch).
+NODE_EVICTION = False
+
+
+##############################################################################
+# Node Derivation
+
+
+# Number of workers used to derive independent nodes concurrently. Nodes are
+# grouped into levels of the dependency tree and each level is derived by the
+# workers. A value of 0 or 1 derives nodes serially.
+DERIVE_WORKERS = 0
+
+# Pool used to derive nodes concurrently, either 'thread' or 'process'. Nodes
+# mostly release the GIL within numpy, while a process pool pickles
+# dependencies and results between processes.
+DERIVE_EXECUTOR = 'thread'
+
+# Write derived parameters to the HDF file behind processing, either 'thread'
+# to write them within a background thread or 'batch' to write them after all
+# nodes have been derived. Parameters which have not yet been written are read
+# from memory. A value of False writes each parameter once it is derived.
+HDF_WRITE_BEHIND = False
+
+# Provide parameters from the HDF file as dependencies whose arrays are read
+# and decompressed when a node first accesses them, so that nodes which do
+# not access a parameter's array do not read it. With NODE_EVICTION, each
+# array is read once and held until no further nodes depend upon the
+# parameter rather than reading the array for every node depending upon it.
+LAZY_PARAMETERS = False
+
+# Number of nodes ahead of the node being derived to read and decompress the
+# parameters from the HDF file they depend upon within a background thread.
+# Requires LAZY_PARAMETERS. A value of 0 does not prefetch parameters.
+PREFETCH_NODES = 0
+
+# Maximum number of bytes of parameter arrays read from the HDF file held in
+# memory before prefetching waits for them to be released. A value of None
+# does not limit prefetching.
+PREFETCH_MAX_BYTES = 256 * 1024 ** 2
+
+
+##############################################################################
+# Dependency Plan Cache
+
+
+# Cache the processing order and spanning tree of the dependency graph for
+# each combination of parameters, requested nodes, node classes and the
+# aircraft attributes used by can_operate methods.
+DEPENDENCY_PLAN_CACHE = True
+
+# Directory to additionally store cached plans on disk for reuse between
+# processes. A value of None will only cache plans in memory.
+DEPENDENCY_PLAN_CACHE_DIR = None
+
+
+##############################################################################
+# Node Registry
+
+
+# Path of a JSON file storing the node registry, a mapping of each node name
+# to the module providing it, its dependencies and can_operate attributes. The
+# registry is rebuilt when a node module changes and allows process_flight to
+# only import the modules providing requested nodes and their dependencies. A
+# value of None will only store the registry in memory.
+NODE_REGISTRY_PATH = None
+
 
 ##############################################################################
 # Parameter Analysis
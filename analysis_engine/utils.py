@@ -1,6 +1,7 @@
 import argparse
 import logging
 import os
+import pkgutil
 import re
 import simplejson
 import zipfile
@@ -16,7 +17,7 @@ from flightdatautilities import api
 from analysis_engine.dependency_graph import dependencies3, graph_nodes
 # node classes required for unpickling
 from analysis_engine.node import (
-    loads, save, Node, NodeManager,
+    can_operate_attributes, loads, save, Node, NodeManager,
     NODE_SUBCLASSES,
 )
 from analysis_engine import settings
@@ -165,6 +166,12 @@ def get_derived_nodes(modules):
     if isinstance(modules, basestring) or ismodule(modules):
         # This has been done too often!
         modules = [modules]
+    # OPT: Scan each combination of modules once per process.
+    key = tuple(modules)
+    try:
+        return dict(_derived_nodes[key])
+    except (KeyError, TypeError):
+        pass
     nodes = {}
     for module in modules:
         #Ref:
@@ -194,7 +201,177 @@ def get_derived_nodes(modules):
                     # Can't instantiate abstract class DerivedParameterNode
                     # - but don't know how to detect if we're at that level without resorting to 'if c.get_name() in 'derived parameter node',..
                     logger.exception('Failed to import class: %s' % c.get_name())
-    return nodes
+    try:
+        _derived_nodes[key] = nodes
+    except TypeError:
+        pass
+    return dict(nodes)
+
+
+_derived_nodes = {}
+
+
+def _module_name(module):
+    return module.__name__ if ismodule(module) else module
+
+
+def _module_mtime(module_name):
+    '''
+    Modification time of a module's source without importing the module.
+
+    :param module_name: Module name, e.g. 'analysis_engine.flight_phase'.
+    :type module_name: str
+    :returns: Modification time or None if the module's file cannot be found.
+    :rtype: float or None
+    '''
+    try:
+        loader = pkgutil.get_loader(module_name)
+        return os.path.getmtime(loader.get_filename(module_name))
+    except (AttributeError, ImportError, OSError, TypeError):
+        return None
+
+
+def build_node_registry(modules):
+    '''
+    Build a registry of the Nodes within modules by importing each module.
+
+    Each node name is mapped to the module providing it (later modules
+    override earlier ones as within get_derived_nodes), the Node class name,
+    the node type, dependency names and the names of the Attributes used by
+    can_operate.
+
+    :param modules: Module names to import.
+    :type modules: [str]
+    :returns: Node registry.
+    :rtype: dict
+    '''
+    registry = {'modules': [], 'nodes': {}}
+    for module in modules:
+        module_name = _module_name(module)
+        node_names = []
+        for name, node_class in get_derived_nodes([module]).iteritems():
+            try:
+                attributes = [a.name for a in can_operate_attributes(node_class)]
+            except TypeError:
+                attributes = None
+            registry['nodes'][name] = {
+                'module': module_name,
+                'class': node_class.__name__,
+                'node_type': node_class.__base__.__name__,
+                'dependencies': node_class.get_dependency_names(),
+                'can_operate_attributes': attributes,
+            }
+            node_names.append(name)
+        registry['modules'].append({
+            'name': module_name,
+            'mtime': _module_mtime(module_name),
+            'nodes': sorted(node_names),
+        })
+    return registry
+
+
+def _registry_valid(registry, module_names):
+    '''
+    Whether a registry was built from module_names which have not changed.
+    '''
+    try:
+        registry_modules = registry['modules']
+    except (KeyError, TypeError):
+        return False
+    if [m['name'] for m in registry_modules] != module_names:
+        return False
+    for module in registry_modules:
+        if module['mtime'] is None or \
+           module['mtime'] != _module_mtime(module['name']):
+            return False
+    return True
+
+
+def get_node_registry(modules, path=None):
+    '''
+    Get the registry of the Nodes within modules, see build_node_registry.
+
+    The registry is cached in memory and, if path or
+    settings.NODE_REGISTRY_PATH is set, within a JSON file so that node
+    modules do not need to be imported to resolve which module provides a
+    node. The registry is rebuilt if a module has been modified.
+
+    :param modules: Module names.
+    :type modules: [str]
+    :param path: Path of the registry file.
+    :type path: str or None
+    :returns: Node registry.
+    :rtype: dict
+    '''
+    module_names = [_module_name(m) for m in modules]
+    key = tuple(module_names)
+    registry = _node_registries.get(key)
+    if registry is not None:
+        return registry
+
+    path = path or settings.NODE_REGISTRY_PATH
+    if path and os.path.isfile(path):
+        try:
+            with open(path) as registry_file:
+                registry = simplejson.load(registry_file)
+        except (IOError, ValueError):
+            logger.warning("Unable to read node registry '%s'.", path)
+            registry = None
+        if not _registry_valid(registry, module_names):
+            registry = None
+
+    if registry is None:
+        registry = build_node_registry(modules)
+        if path:
+            try:
+                with open(path, 'w') as registry_file:
+                    simplejson.dump(registry, registry_file)
+            except IOError:
+                logger.warning("Unable to write node registry '%s'.", path)
+
+    _node_registries[key] = registry
+    return registry
+
+
+_node_registries = {}
+
+
+def get_node_modules(node_names, modules, dependencies=True, registry=None):
+    '''
+    Select the modules which need to be imported to provide Nodes.
+
+    :param node_names: Names of the Nodes required.
+    :type node_names: [str]
+    :param modules: Module names to select from.
+    :type modules: [str]
+    :param dependencies: Include modules providing the dependencies of the
+        Nodes recursively.
+    :type dependencies: bool
+    :param registry: Node registry, by default from get_node_registry.
+    :type registry: dict or None
+    :returns: Modules in the order provided.
+    :rtype: [str]
+    '''
+    if registry is None:
+        registry = get_node_registry(modules)
+    registry_nodes = registry['nodes']
+    required_modules = set()
+    seen = set()
+    stack = list(node_names)
+    while stack:
+        name = stack.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        try:
+            entry = registry_nodes[name]
+        except KeyError:
+            # LFL parameter or Attribute not provided by a module.
+            continue
+        required_modules.add(entry['module'])
+        if dependencies:
+            stack.extend(entry['dependencies'])
+    return [m for m in modules if _module_name(m) in required_modules]
 
 
 def derived_trimmer(hdf_path, node_names, dest):
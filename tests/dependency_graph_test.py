@@ -1,18 +1,27 @@
 import collections
 import imp
+import mock
 import os
+import random
+import shutil
+import tempfile
 import unittest
 import networkx as nx
 
 from datetime import datetime
 
 from analysis_engine.node import (DerivedParameterNode, Node, NodeManager, P)
+from analysis_engine import dependency_graph
 from analysis_engine.dependency_graph import (
+    RequiredNodesMissing,
     any_predecessors_in_requested,
+    dependencies3,
     dependency_order, 
     graph_nodes, 
     graph_adjacencies,
     indent_tree,
+    level_schedule,
+    plan_cache_key,
     process_order,
 )
 from analysis_engine.utils import get_derived_nodes
@@ -356,7 +365,181 @@ Node: Start Datetime 	Pre: [] 	Succ: [] 	Neighbors: [] 	Edges: []
              'Gear Down Selected', 'Airspeed', 'Airspeed At Gear Down Selected'])
 
         # try a bigger cyclic dependency on top of the above one
-        
+
+    def test_level_schedule(self):
+        requested = ['P7', 'P8']
+        mgr = NodeManager({'Start Datetime': datetime.now()}, 10, self.lfl_params, requested, [],
+                          self.derived_nodes, {}, {})
+        order, gr_st = dependency_order(mgr, draw=False)
+        schedule = level_schedule(order, gr_st, available=self.lfl_params)
+        self.assertEqual(len(schedule), 2)
+        self.assertEqual(sorted(schedule[0]), ['P4', 'P5', 'P6', 'P8'])
+        self.assertEqual(schedule[1], ['P7'])
+        # levels are ordered as the process order
+        self.assertEqual(schedule[0], [n for n in order if n in schedule[0]])
+        # available nodes are scheduled when not excluded
+        schedule = level_schedule(order, gr_st)
+        self.assertEqual(len(schedule), 3)
+        self.assertEqual(sorted(schedule[0]), self.lfl_params)
+
+    def test_level_schedule_circular_dependency(self):
+        lfl_params = ['Airspeed', 'Gear (L) Down', 'Gear (L) Red Warning']
+        requested = ['Airspeed At Gear Down Selected']
+        derived = get_derived_nodes([import_module('sample_circular_dependency_nodes')])
+        mgr = NodeManager({'Start Datetime': datetime.now()}, 10, lfl_params, requested, [],
+                          derived, {}, {})
+        order, gr_st = dependency_order(mgr, draw=False)
+        schedule = level_schedule(order, gr_st, available=lfl_params)
+        # Gear Down Selected must be derived after Gear Down which does not
+        # depend upon it.
+        self.assertEqual(schedule, [['Gear Down'], ['Gear Down Selected'],
+                                    ['Airspeed At Gear Down Selected']])
+
+
+def recursive_dependencies3(di_graph, root, node_mgr):
+    "Recursive implementation of dependencies3 to compare the ordering with."
+    def traverse_tree(node):
+        if node in path:
+            path.append(node)
+            return False
+        path.append(node)
+        if node in active_nodes:
+            return True
+        layer = set()
+        for dependency in di_graph.successors(node):
+            if traverse_tree(dependency):
+                layer.add(dependency)
+            path.pop()
+        if node_mgr.operational(node, layer):
+            active_nodes.add(node)
+            ordering.append(node)
+            return True
+        return False
+
+    ordering = []
+    path = collections.deque()
+    active_nodes = set()
+    traverse_tree(root)
+    return ordering
+
+
+class TestDependencies3(unittest.TestCase):
+    def _node_mgr(self, count=5000, seed=0):
+        # Synthetic graph where each node depends upon a few LFL parameters
+        # or previous nodes and some nodes are inoperable.
+        rng = random.Random(seed)
+        lfl_params = ['Raw%d' % n for n in range(count // 10)]
+        names = []
+        derived_nodes = {}
+        for n in range(count):
+            available = lfl_params + names
+            dependencies = rng.sample(available, min(len(available), 3))
+            if n > 10 and rng.random() < 0.01:
+                # circular dependency
+                dependencies.append('Node%d' % (n + 1))
+            derived_nodes['Node%d' % n] = MockParam(
+                dependencies=dependencies, operational=rng.random() > 0.05)
+            names.append('Node%d' % n)
+        requested = rng.sample(names, count // 10)
+        return NodeManager({'Start Datetime': datetime.now()}, 10, lfl_params,
+                           requested, [], derived_nodes, {}, {})
+
+    def test_dependencies3_deep_tree(self):
+        # Deeper than the recursion limit.
+        derived_nodes = {'Node0': MockParam(dependencies=['Raw'])}
+        for n in range(1, 5000):
+            derived_nodes['Node%d' % n] = \
+                MockParam(dependencies=['Node%d' % (n - 1)])
+        mgr = NodeManager({'Start Datetime': datetime.now()}, 10, ['Raw'],
+                          ['Node4999'], [], derived_nodes, {}, {})
+        order = dependencies3(graph_nodes(mgr), 'root', mgr)
+        self.assertEqual(order, ['Raw'] + ['Node%d' % n for n in range(5000)]
+                         + ['root'])
+
+    def test_dependencies3_matches_recursive(self):
+        for seed in range(5):
+            mgr = self._node_mgr(count=300, seed=seed)
+            _, _, order = process_order(graph_nodes(mgr), mgr)
+            with mock.patch('analysis_engine.dependency_graph.dependencies3',
+                            recursive_dependencies3):
+                _, _, expected = process_order(graph_nodes(mgr), mgr)
+            self.assertTrue(len(expected) > len(mgr.requested))
+            self.assertEqual(order, expected)
+
+    def test_time_taken(self):
+        from timeit import Timer
+        mgr = self._node_mgr()
+        graph = graph_nodes(mgr)
+        order = dependencies3(graph, 'root', mgr)
+        self.assertTrue(len(order) > len(mgr.requested))
+        timer = Timer(lambda: dependencies3(graph, 'root', mgr))
+        time_taken = min(timer.repeat(2, 1))
+        print "Time taken %s secs" % time_taken
+        self.assertLess(time_taken, 2.0, msg="Took too long")
+
+
+class TestDependencyPlanCache(unittest.TestCase):
+    def setUp(self):
+        self.derived = get_derived_nodes(
+            [import_module('sample_derived_parameters')])
+        self.lfl_params = ['Indicated Airspeed', 'Groundspeed',
+                           'Pressure Altitude', 'Heading', 'TAT', 'Latitude',
+                           'Longitude', 'Longitudinal g', 'Lateral g',
+                           'Normal g', 'Pitch', 'Roll']
+        self.requested = ['Smoothed Track', 'Vertical Speed',
+                          'Slip On Runway']
+        self.cache_dir = tempfile.mkdtemp()
+        dependency_graph._plan_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        dependency_graph._plan_cache.clear()
+
+    def _node_mgr(self, lfl_params=None, required=[], aircraft_info={}):
+        return NodeManager({'Start Datetime': datetime.now()}, 10,
+                           lfl_params or self.lfl_params, self.requested,
+                           required, self.derived, aircraft_info, {})
+
+    def test_plan_cache_key(self):
+        key, values = plan_cache_key(self._node_mgr())
+        self.assertEqual(plan_cache_key(self._node_mgr())[0], key)
+        self.assertNotEqual(
+            plan_cache_key(self._node_mgr(self.lfl_params[1:]))[0], key)
+        # Attribute presence changes the key.
+        self.assertNotEqual(plan_cache_key(
+            self._node_mgr(aircraft_info={'Family': 'B737'}))[0], key)
+        # Non-class nodes cannot be cached.
+        node_mgr = self._node_mgr()
+        node_mgr.derived_nodes = dict(node_mgr.derived_nodes,
+                                      Mock=MockParam())
+        self.assertEqual(plan_cache_key(node_mgr), (None, {}))
+
+    def test_dependency_order_cache(self):
+        expected = dependency_order(self._node_mgr(), draw=False, cache=False)
+        with mock.patch('analysis_engine.dependency_graph.settings') as s:
+            s.DEPENDENCY_PLAN_CACHE = True
+            s.DEPENDENCY_PLAN_CACHE_DIR = self.cache_dir
+            order, gr_st = dependency_order(self._node_mgr(), draw=False)
+            self.assertEqual(order, expected[0])
+            self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+            with mock.patch('analysis_engine.dependency_graph.graph_nodes') \
+                    as graph_nodes:
+                order, gr_st = dependency_order(self._node_mgr(), draw=False)
+                # Load from disk.
+                dependency_graph._plan_cache.clear()
+                disk_order, disk_gr_st = dependency_order(self._node_mgr(),
+                                                          draw=False)
+                self.assertFalse(graph_nodes.called)
+            self.assertEqual(order, expected[0])
+            self.assertEqual(sorted(gr_st.edges()),
+                             sorted(expected[1].edges()))
+            self.assertEqual(disk_order, expected[0])
+            self.assertEqual(sorted(disk_gr_st.edges()),
+                             sorted(expected[1].edges()))
+            # Required nodes are checked for cached plans.
+            self.assertRaises(RequiredNodesMissing, dependency_order,
+                              self._node_mgr(required=['Moment Of Takeoff']),
+                              draw=False)
 
 
 class TestGraphAdjacencies(unittest.TestCase):
@@ -29,6 +29,7 @@ from flightdatautilities.array_operations import load_compressed
 import flightdatautilities.masked_array_testutils as ma_test
 
 from analysis_engine.library import *
+from analysis_engine.library import _align_plan, _align_plans
 from analysis_engine.node import (A, P, S, load, M, KTI, KeyTimeInstance, Section)
 from analysis_engine.settings import METRES_TO_FEET
 
@@ -1029,6 +1030,44 @@ class TestAlign(unittest.TestCase):
         np.testing.assert_array_equal(result.data, [0,2,3,5,7,8,10,12,13,15,17,18,20,22,23])
         np.testing.assert_array_equal(result.mask, [0] * 15)
 
+    def test_align_plan(self):
+        _align_plans.clear()
+        hs, a, b = _align_plan(2, 4, -0.1, True)
+        self.assertEqual(hs.tolist(), [-1, 0, 0, 1])
+        np.testing.assert_array_almost_equal(a, [0.1, 0.6, 0.1, 0.6])
+        np.testing.assert_array_almost_equal(b, [0.9, 0.4, 0.9, 0.4])
+        # Plans are reused for the same rates and timing disparity.
+        self.assertIs(_align_plan(2, 4, -0.1, True)[0], hs)
+        self.assertIsNot(_align_plan(2, 4, -0.1, False)[0], hs)
+        self.assertEqual(len(_align_plans), 2)
+        self.assertRaises(ValueError, _align_plan, 2, 4, -2.5, True)
+        self.assertRaises(ValueError, _align_plan, 2, 4, 2.5, True)
+
+    def test_time_taken(self):
+        from timeit import Timer
+        frequencies = (0.25, 0.5, 1, 2, 4, 8, 16)
+        arrays = {}
+        for frequency in frequencies:
+            # An hour of data with a masked section.
+            array = np.ma.arange(3600 * frequency, dtype=float)
+            array[100:200] = np.ma.masked
+            arrays[frequency] = array
+
+        def align_all():
+            for slave_frequency in frequencies:
+                for master_frequency in frequencies:
+                    array = arrays[slave_frequency]
+                    align_args(array, slave_frequency, 0.0,
+                               master_frequency, 0.0)
+                    align_args(array, slave_frequency,
+                               0.1 / slave_frequency, master_frequency,
+                               0.3 / master_frequency)
+
+        timer = Timer(align_all)
+        time_taken = min(timer.repeat(2, 1))
+        print "Time taken %s secs" % time_taken
+        self.assertLess(time_taken, 1.0, msg="Took too long")
+
 
 class TestAmbiguousRunway(unittest.TestCase):
     def test_valid(self):
@@ -3023,9 +3062,54 @@ class TestHysteresis(unittest.TestCase):
         np.testing.assert_array_equal(data.data, hysteresis(data,0).data)
         self.assertRaises(ValueError, hysteresis, data, -3)
 
-    """
-    Hysteresis may need to be speeded up, in which case this test can be
-    reinstated.
+    def test_hysteresis_matches_recurrence(self):
+        def reference(array, hysteresis):
+            # The original sample by sample implementation.
+            quarter_range = hysteresis / 4.0
+            half_done = np.zeros(len(array))
+            result = np.zeros(len(array))
+            notmasked = np.ma.where(np.ma.getmaskarray(array) == False)[0]
+            old = array[notmasked[0]]
+            for index in notmasked:
+                new = array[index]
+                if new - old > quarter_range:
+                    old = new - quarter_range
+                elif new - old < -quarter_range:
+                    old = new + quarter_range
+                half_done[index] = old
+            for index in notmasked[::-1]:
+                new = half_done[index]
+                if new - old > quarter_range:
+                    old = new - quarter_range
+                elif new - old < -quarter_range:
+                    old = new + quarter_range
+                result[index] = old
+            return result
+
+        random = np.random.RandomState(0)
+        for case in range(200):
+            length = random.randint(1, 500)
+            if case % 3 == 0:
+                data = np.cumsum(random.randn(length))
+            elif case % 3 == 1:
+                data = random.randn(length) * 10
+            else:
+                # Quantised data exercises exact ties with the threshold.
+                data = random.choice([-0.0, 0.0, 0.1, 0.2, 0.3, 1.5], length)
+            array = np.ma.array(data, mask=random.rand(length) < 0.1)
+            if not np.ma.count(array):
+                continue
+            threshold = random.choice([0.1, 0.4, 1.2, 5.0])
+            result = hysteresis(array, threshold)
+            expected = reference(array, threshold)
+            self.assertEqual(result.data.tostring(), expected.tostring())
+            np.testing.assert_array_equal(result.mask, array.mask)
+
+    def test_hysteresis_with_integer_data(self):
+        data = np.ma.array([0,1,2,1,0,-1,5,6,7,0])
+        result = hysteresis(data,2)
+        np.testing.assert_array_equal(result.data,
+                                      [0.5,1,1,1,0,0,5,6,6,0.5])
 
     def test_time_taken(self):
         from timeit import Timer
@@ -3035,12 +3119,11 @@ class TestHysteresis(unittest.TestCase):
         self.assertLess(time, 0.1, msg="Took too long")
 
     def using_large_data(self):
-        data = np.ma.arange(100000)
+        random = np.random.RandomState(0)
+        data = np.ma.array(np.cumsum(random.randn(100000)))
         data[0] = np.ma.masked
         data[-1000:] = np.ma.masked
         res = hysteresis(data, 10)
-        pass
-    """
 
 
 class TestIndexAtValue(unittest.TestCase):
@@ -3484,6 +3567,21 @@ class TestIsIndexWithinSlices(unittest.TestCase):
         self.assertTrue(is_index_within_slices(10, [slice(None, 12)]))
 
 
+class TestIndicesWithinSlices(unittest.TestCase):
+    def test_indices_within_slices(self):
+        indices = np.arange(-2, 14, 0.5)
+        for slices in ([slice(0, 2), slice(5, 10)],
+                       [slice(8, None)],
+                       [slice(None, 12)],
+                       [slice(None)],
+                       [slice(10, 3, -1), slice(1.5, 2.5)],
+                       [slice(None, 3, -1)],
+                       []):
+            self.assertEqual(
+                indices_within_slices(indices, slices).tolist(),
+                [is_index_within_slices(i, slices) for i in indices])
+
+
 class TestILSGlideslopeAlign(unittest.TestCase):
     def test_ils_glideslope_align(self):
         runway =  {'end': {'latitude': 60.280151,
@@ -4140,6 +4238,40 @@ class TestBlendParametersWeighting(unittest.TestCase):
         # When first run, the length of this array was 4, not 3 (!)
         ma_test.assert_masked_array_almost_equal(result, expected)
 
+    def test_weighting_matches_loop(self):
+        def reference(array, wt):
+            # The original sample by sample weighting.
+            param_weight = (1.0 - np.ma.getmaskarray(array))
+            length = int(floor(len(param_weight) * wt))
+            result_weight = np_ma_masked_zeros_like(np.ma.arange(length))
+            final_weight = np_ma_masked_zeros_like(np.ma.arange(length))
+            result_weight[0] = param_weight[0] / wt
+            result_weight[-1] = param_weight[-1] / wt
+            for i in range(1, len(param_weight) - 1):
+                if param_weight[i] == 0.0:
+                    result_weight[int(i * wt)] = 0.0
+                elif param_weight[i - 1] == 0.0 or param_weight[i + 1] == 0.0:
+                    result_weight[int(i * wt)] = 0.1
+                else:
+                    result_weight[int(i * wt)] = 1.0 / wt
+            for i in range(1, len(result_weight) - 1):
+                if result_weight[i-1]==0.0 or result_weight[i + 1] == 0.0:
+                    final_weight[i]=result_weight[i]/2.0
+                else:
+                    final_weight[i]=result_weight[i]
+            final_weight[0]=result_weight[0]
+            final_weight[-1]=result_weight[-1]
+            return repair_mask(final_weight, repair_duration=None)
+
+        random = np.random.RandomState(0)
+        for case in range(50):
+            length = random.randint(4, 60)
+            array = np.ma.array(random.randn(length),
+                                mask=random.rand(length) < 0.3)
+            wt = [0.5, 1.0, 2.0, 4.0][case % 4]
+            ma_test.assert_masked_array_equal(
+                blend_parameters_weighting(array, wt), reference(array, wt))
+
 
 class TestBlendTwoParameters(unittest.TestCase):
     def test_blend_two_parameters_p2_before_p1_equal_spacing(self):
@@ -4719,6 +4851,17 @@ class TestPeakCurvature(unittest.TestCase):
         res = peak_curvature(array, curve_sense='Convex')
         self.assertEqual(res, 13)
 
+    def test_peak_curvature_random_data(self):
+        # Results of the original truck and trailer implementation, which
+        # summed each truck sample by sample.
+        random = np.random.RandomState(0)
+        for curve_sense, expected in (('Concave', 8.0),
+                                      ('Convex', 26.264217892705616),
+                                      ('Bipolar', 15.710827226582545)):
+            array = np.ma.array(np.cumsum(np.cumsum(random.randn(200))))
+            self.assertAlmostEqual(
+                peak_curvature(array, curve_sense=curve_sense), expected)
+
 
 class TestPeakIndex(unittest.TestCase):
     def test_peak_index_no_data(self):
@@ -4934,6 +5077,44 @@ class TestRepairMask(unittest.TestCase):
         self.assertFalse(np.ma.is_masked(res[8]))
         self.assertFalse(np.ma.is_masked(res[9]))
 
+    def test_repair_mask_many_gaps(self):
+        expected = np.ma.arange(0, 3000, 1.5)
+        array = expected.copy()
+        array[np.random.RandomState(0).rand(len(array)) < 0.2] = np.ma.masked
+        array[500:520] = np.ma.masked
+        res = repair_mask(array, repair_duration=5, copy=True)
+        self.assertTrue(res.mask[500:520].all())
+        res[500:520] = expected[500:520]
+        self.assertEqual(np.ma.count_masked(res[1:-1]), 0)
+        np.testing.assert_array_almost_equal(res.data[1:-1],
+                                             expected.data[1:-1])
+        for method in ('fill_start', 'fill_stop'):
+            res = repair_mask(array, repair_duration=5, copy=True,
+                              method=method, extrapolate=True)
+            self.assertTrue(res.mask[500:520].all())
+            for section in np.ma.clump_masked(array):
+                if section.start == 500:
+                    continue
+                if section.start == 0:
+                    value = array[section.stop]
+                elif section.stop == len(array):
+                    value = array[section.start - 1]
+                elif method == 'fill_start':
+                    value = array[section.start - 1]
+                else:
+                    value = array[section.stop]
+                self.assertEqual(res[section].tolist(),
+                                 [value] * (section.stop - section.start))
+
+    def test_repair_mask_duration_exceedance(self):
+        array = np.ma.arange(10)
+        array[[1, 4, 5, 6, 8]] = np.ma.masked
+        self.assertRaises(ValueError, repair_mask, array, repair_duration=2,
+                          raise_duration_exceedance=True)
+        # Sections before the first which is too long are repaired.
+        self.assertEqual(array.tolist(), [0, 1, 2, 3, None, None, None, 7,
+                                          None, 9])
+
 
 class TestResample(unittest.TestCase):
     def test_resample_upsample(self):
@@ -6770,9 +6951,49 @@ class TestSubslice(unittest.TestCase):
 
 
 class TestTouchdownInertial(unittest.TestCase):
-    @unittest.skip("Not Implemented")
     def test_touchdown_inertial(self):
-        self.assertTrue(False)
+        # Descending at 10 fpm to touch down at the 20th sample.
+        alt = P('Altitude AAL', np.ma.arange(20.0, -10.0, -1.0) / 6.0)
+        roc = P('Vertical Speed Inertial', np.ma.ones(30) * -10.0)
+        land = Section('Landing', slice(5, 30), 5, 30)
+        index, rod = touchdown_inertial(land, roc, alt)
+        self.assertAlmostEqual(index, 20.0)
+        self.assertEqual(rod, -10.0)
+
+    def test_touchdown_inertial_matches_recurrence(self):
+        def reference(land, roc, alt):
+            # The original sample by sample smoothed height.
+            tau = 1/6.0
+            sm_ht = np_ma_zeros_like(roc.array[land.slice])
+            my_roc = repair_mask(roc.array[land.slice])
+            my_alt = repair_mask(alt.array[land.slice])
+            sm_ht[0] = alt.array[land.slice.start]
+            for i in range(1, len(sm_ht)):
+                sm_ht[i] = (1.0-tau)*sm_ht[i-1] + tau*my_alt[i-1] + \
+                    my_roc[i]/60.0/roc.hz
+            return index_at_value(sm_ht, 0.0)
+
+        random = np.random.RandomState(0)
+        for case in range(20):
+            length = random.randint(20, 200)
+            hz = random.choice([1.0, 2.0, 4.0])
+            height = np.linspace(random.uniform(20, 200), -50, length)
+            alt = P('Altitude AAL', np.ma.array(height + random.randn(length)),
+                    frequency=hz)
+            roc = P('Vertical Speed Inertial',
+                    np.ma.array(np.gradient(height) * 60 * hz +
+                                random.randn(length) * 50), frequency=hz)
+            if case % 2:
+                start = random.randint(length)
+                roc.array[start:start + 5] = np.ma.masked
+            begin = random.randint(length // 3)
+            land = Section('Landing', slice(begin, length), begin, length)
+            expected = reference(land, roc, alt)
+            index, rod = touchdown_inertial(land, roc, alt)
+            if expected is None:
+                self.assertEqual(index, None)
+            else:
+                self.assertAlmostEqual(index, expected + begin)
 
 
 class TestTrackLinking(unittest.TestCase):
@@ -6960,6 +7181,54 @@ class TestValueAtIndex(unittest.TestCase):
             expected = None if x == 3.00 else 2
             self.assertEquals(value_at_index(array, x, interpolate=False), expected)
 
+    def test_value_at_index_masked_elsewhere(self):
+        array = np.ma.arange(10.0)
+        array[[0, 4, 9]] = np.ma.masked
+        self.assertEquals(value_at_index(array, 1.5), 1.5)
+        self.assertEquals(value_at_index(array, 3.5), 3.0)
+        self.assertEquals(value_at_index(array, 4.5), 5.0)
+
+    def test_time_taken(self):
+        from timeit import Timer
+        # Ten hours of 8Hz data with a masked sample.
+        array = np.ma.arange(288000.0)
+        array[0] = np.ma.masked
+        indices = np.arange(10000) * 28.75 + 0.5
+        timer = Timer(lambda: [value_at_index(array, i) for i in indices])
+        time_taken = min(timer.repeat(1, 1))
+        print "Time taken %s secs" % time_taken
+        self.assertLess(time_taken, 0.1, msg="Took too long")
+
+
+class TestValuesAtIndices(unittest.TestCase):
+    def test_values_at_indices(self):
+        array = np.ma.arange(20.0) * 3 + 50
+        array[[0, 5, 6, 10, 19]] = np.ma.masked
+        indices = np.linspace(-2, 22, 481).tolist() + [4.75, 11.5, 0.5]
+        values = values_at_indices(array, indices)
+        expected = [value_at_index(array, i) for i in indices]
+        self.assertEqual(
+            [None if v is np.ma.masked else v for v in values],
+            [None if v is np.ma.masked else v for v in expected])
+
+    def test_values_at_indices_unmasked(self):
+        array = np.ma.arange(4)
+        values = values_at_indices(array, [-0.5, 1.5, 3, 3.7, None])
+        self.assertEqual(values.tolist(), [0, 1.5, 3, 3, 0])
+        array[0] = np.ma.masked
+        values = values_at_indices(array, [None, 0.5])
+        self.assertEqual(values.tolist(), [None, 1])
+
+    def test_values_at_indices_non_interpolated(self):
+        array = np.ma.arange(4)
+        array[2] = np.ma.masked
+        values = values_at_indices(array, [0.25, 0.5, 2.0, 2.25, 2.5, 2.75],
+                                   interpolate=False)
+        self.assertEqual(values.tolist(), [0, 1, None, 3, 3, 3])
+
+    def test_values_at_indices_empty(self):
+        self.assertEqual(values_at_indices(np.ma.arange(4), []).tolist(), [])
+
 
 class TestVstackParams(unittest.TestCase):
     def test_vstack_params(self):
@@ -7422,6 +7691,44 @@ class TestSecondWindow(unittest.TestCase):
         res = second_window(sw.array, sw.frequency, 3)
         self.assertEqual(np.ma.count(res), 40972)
 
+    def test_second_window_matches_sliding_window_loop(self):
+        def reference(array, samples):
+            # The original sliding window clip of each unmasked slice.
+            result = np_ma_masked_zeros_like(array)
+            for unmasked_slice in np.ma.clump_unmasked(array):
+                last_value = array[unmasked_slice.start]
+                for idx in range(unmasked_slice.start,
+                                 unmasked_slice.stop - samples):
+                    window = array.data[idx:idx + samples + 1]
+                    last_value = min(max(last_value, window.min()),
+                                     window.max())
+                    result[idx] = last_value
+            return result
+
+        random = np.random.RandomState(0)
+        for case in range(100):
+            length = random.randint(1, 200)
+            array = np.ma.array(np.cumsum(random.randn(length)))
+            for start in random.randint(length, size=random.randint(4)):
+                array[start:start + random.randint(1, 10)] = np.ma.masked
+            frequency, seconds = [(1, 2), (2, 3), (2, 5), (4, 10)][case % 4]
+            result = second_window(array, frequency, seconds)
+            expected = reference(array, frequency * seconds)
+            np.testing.assert_array_equal(result.data, expected.data)
+            np.testing.assert_array_equal(np.ma.getmaskarray(result),
+                                          np.ma.getmaskarray(expected))
+
+    def test_time_taken(self):
+        from timeit import Timer
+        random = np.random.RandomState(0)
+        # Ten hours of 8Hz data with occasional masked samples.
+        array = np.ma.array(np.cumsum(random.randn(288000)))
+        array[random.rand(len(array)) < 0.001] = np.ma.masked
+        timer = Timer(lambda: second_window(array, 8, 10))
+        time_taken = min(timer.repeat(1, 1))
+        print "Time taken %s secs" % time_taken
+        self.assertLess(time_taken, 0.2, msg="Took too long")
+
 
 class TestLookupTable(unittest.TestCase):
 
@@ -1,3 +1,4 @@
+import cPickle
 import mock
 import numpy as np
 import os
@@ -17,7 +18,9 @@ from analysis_engine.node import (
     KeyTimeInstanceNode, KeyTimeInstance, KTI,
     FlightAttributeNode,
     FormattedNameNode,
-    Node, NodeManager,
+    LazyDerivedParameterNode,
+    lazy_param_from_hdf,
+    Node, NodeCache, NodeManager,
     Parameter, P,
     MultistateDerivedParameterNode, M,
     load,
@@ -25,6 +28,7 @@ from analysis_engine.node import (
     SectionNode,
     Section,
     _calculate_offset,
+    _can_operate_attributes,
 )
 
 from hdfaccess.file import hdf_file
@@ -422,6 +426,46 @@ class TestFlightAttributeNode(unittest.TestCase):
         attr.value = False
         self.assertFalse(bool(attr))
 
+class TestNodeCache(unittest.TestCase):
+    def _param(self, name, size=10):
+        return Parameter(name, np.ma.arange(float(size)))
+
+    def test_nbytes(self):
+        cache = NodeCache()
+        cache[('Pitch', 1, 0)] = self._param('Pitch')
+        cache[('Pitch', 2, 0)] = self._param('Pitch', 20)
+        self.assertEqual(cache.nbytes, 30 * 8)
+        del cache[('Pitch', 2, 0)]
+        self.assertEqual(cache.nbytes, 10 * 8)
+        cache.pop(('Pitch', 1, 0))
+        self.assertEqual(cache.nbytes, 0)
+        self.assertEqual(cache.pop(('Pitch', 1, 0), None), None)
+
+    def test_max_bytes(self):
+        cache = NodeCache(max_bytes=20 * 8)
+        cache[('Pitch', 1, 0)] = self._param('Pitch')
+        cache[('Roll', 1, 0)] = self._param('Roll')
+        # Pitch is used more recently than Roll.
+        self.assertTrue(cache.get(('Pitch', 1, 0)))
+        cache[('Heading', 1, 0)] = self._param('Heading')
+        self.assertEqual(sorted(cache),
+                         [('Heading', 1, 0), ('Pitch', 1, 0)])
+        self.assertEqual(cache.nbytes, 20 * 8)
+        # A node larger than the budget is retained until the next is added.
+        cache[('Airspeed', 1, 0)] = self._param('Airspeed', 30)
+        self.assertEqual(list(cache), [('Airspeed', 1, 0)])
+
+    def test_evict(self):
+        cache = NodeCache()
+        cache[('Pitch', 1, 0)] = self._param('Pitch')
+        cache[('Pitch', 2, 0)] = self._param('Pitch', 20)
+        cache[('Roll', 1, 0)] = self._param('Roll')
+        self.assertEqual(cache.evict('Pitch'), 2)
+        self.assertEqual(list(cache), [('Roll', 1, 0)])
+        self.assertEqual(cache.nbytes, 10 * 8)
+        self.assertEqual(cache.evict('Pitch'), 0)
+
+
 class TestNodeManager(unittest.TestCase):
     @mock.patch('analysis_engine.node.inspect.getargspec')
     def test_operational(self, getargspec):
@@ -458,11 +502,19 @@ class TestNodeManager(unittest.TestCase):
         getargspec.return_value = ArgSpec(
             args=['cls', 'available', 'x'], varargs=None, keywords=None,
             defaults=(Attribute('o', None),))
+        # can_operate signatures are inspected once per class.
+        self.assertEqual(getargspec.call_count, 2)
+        _can_operate_attributes.clear()
         self.assertTrue(mgr.operational('y', ['o']))
         mock_node.can_operate.assert_called_with(['o'], Attribute('o', 2))
+        # can_operate results are memoised.
+        mock_node.can_operate.reset_mock()
+        self.assertTrue(mgr.operational('y', ['o']))
+        self.assertFalse(mock_node.can_operate.called)
         getargspec.return_value = ArgSpec(
             args=['cls', 'available', 'x'], varargs=None, keywords=None,
             defaults=(DerivedParameterNode('o'),))
+        _can_operate_attributes.clear()
         self.assertRaises(TypeError, mgr.operational, 'y', Attribute('o', 2))
 
     def test_get_attribute(self):
@@ -655,6 +707,27 @@ class TestSectionNode(unittest.TestCase):
                          [Section(name='Example Section Node',
                                   slice=slice(0, 54, None),start_edge=0,stop_edge=53.5673828125)])
 
+    def test_get_aligned_same_frequency_and_offset(self):
+        section_node = self.section_node_class(frequency=2, offset=0.25)
+        section_node.create_section(slice(2, 4))
+        param = Parameter('p', frequency=2, offset=0.25)
+        self.assertIs(section_node.get_aligned(param), section_node)
+
+    def test_get_aligned_many(self):
+        section_node = self.section_node_class(frequency=4, offset=0.1)
+        for start in range(0, 4000, 8):
+            section_node.create_section(slice(start, start + 5),
+                                        begin=start - 0.3, end=start + 4.6)
+        param = Parameter('p', frequency=1, offset=0.6)
+        aligned_node = section_node.get_aligned(param)
+        self.assertEqual(len(aligned_node), 500)
+        self.assertEqual(aligned_node[0],
+                         Section('Example Section Node', slice(0, 1), 0.0,
+                                 0.6499999999999999))
+        self.assertEqual(aligned_node[-1].slice, slice(998, 999))
+        self.assertAlmostEqual(aligned_node[-1].start_edge, 997.425)
+        self.assertAlmostEqual(aligned_node[-1].stop_edge, 998.65)
+
     def test_items(self):
         items = [Section('a', slice(0,10), start_edge=0, stop_edge=10)]
         section_node = self.section_node_class(frequency=1, offset=0.5,
@@ -848,6 +921,72 @@ class TestSectionNode(unittest.TestCase):
         self.assertEqual(node.get_longest(), node[1])
         self.assertEqual(node.get_longest(within_slice=slice(0, 8)), node[0])
 
+    def test_section_index_invalidated(self):
+        node = SectionNode(items=[Section('a', slice(2, 15), 2, 15)])
+        self.assertEqual(node.get_next(1), node[0])
+        self.assertEqual(node.get_next(5), None)
+        node.append(Section('b', slice(20, 25), 20, 25))
+        self.assertEqual(node.get_next(5), node[1])
+        node[0] = Section('a', slice(8, 15), 8, 15)
+        self.assertEqual(node.get_surrounding(6), [])
+        node.insert(0, Section('c', slice(5, 7), 5, 7))
+        self.assertEqual(node.get_first(), node[0])
+        del node[0]
+        self.assertEqual(node.get_first(), Section('a', slice(8, 15), 8, 15))
+        node.extend([Section('d', slice(0, 3), 0, 3)])
+        node.sort(key=lambda s: s.slice.start)
+        self.assertEqual(node.get_previous(5), node[0])
+        node.pop(0)
+        self.assertEqual(node.get_previous(5), None)
+        node.remove(node[0])
+        self.assertEqual(node.get(name='a'), [])
+        node += [Section('a', slice(1, 2), 1, 2)]
+        self.assertEqual(node.get(name='a'), [node[-1]])
+
+    def test_section_index_nested(self):
+        items = [Section('a', slice(0, 100), 0, 100),
+                 Section('b', slice(10, 20), 10, 20),
+                 Section('b', slice(30, 40), 30, 40),
+                 Section('c', slice(35, None), 35, None),
+                 Section('d', slice(None, 5), None, 5)]
+        node = SectionNode(items=items)
+        self.assertEqual(node.get_surrounding(38),
+                         [items[0], items[2], items[3]])
+        self.assertEqual(node.get_surrounding(200), [items[3]])
+        self.assertEqual(node.get(containing_index=40), [items[0], items[3]])
+        self.assertEqual(node.get(containing_index=-10), [items[4]])
+        self.assertEqual(node.get_first(), items[4])
+        self.assertEqual(node.get_first(first_by='stop'), items[3])
+        self.assertEqual(node.get_last(last_by='stop'), items[0])
+        self.assertEqual(node.get_next(20), items[2])
+        self.assertEqual(node.get_next(20, use='stop'), items[0])
+        self.assertEqual(node.get_previous(35, name='b'), items[1])
+        self.assertEqual(node.get_previous(35, use='start'), items[2])
+        self.assertEqual(node.get(within_slice=slice(5, 50), within_use='any'),
+                         items[:4])
+        self.assertEqual(node.get_ordered_by_index(),
+                         [items[4], items[0], items[1], items[2], items[3]])
+
+    def test_section_index_aligned(self):
+        node = self.section_node_class(frequency=1, offset=0)
+        for start in range(0, 1000, 10):
+            node.create_section(slice(start, start + 5))
+        node.get_next(0)
+        param = Parameter('p', frequency=4, offset=0)
+        aligned_node = node.get_aligned(param)
+        self.assertEqual(aligned_node.get_next(398), aligned_node[10])
+        self.assertEqual(aligned_node.get(containing_index=1602),
+                         [aligned_node[40]])
+        # Sorted orders are not carried when rounding ties sections.
+        node = self.section_node_class(frequency=1, offset=0,
+                                       items=[Section('a', slice(3, 5), 2.6, 5),
+                                              Section('a', slice(2, 5), 2.2, 5)])
+        self.assertEqual(node.get_ordered_by_index(), [node[1], node[0]])
+        param = Parameter('p', frequency=0.25, offset=0)
+        aligned_node = node.get_aligned(param)
+        self.assertEqual(aligned_node.get_ordered_by_index(),
+                         [aligned_node[0], aligned_node[1]])
+
 
 class TestFormattedNameNode(unittest.TestCase):
     def setUp(self):
@@ -914,6 +1053,53 @@ class TestFormattedNameNode(unittest.TestCase):
             formatted_name_node._validate_name('Speed in descent at 100 ft'))
         self.assertFalse(
             formatted_name_node._validate_name('Speed in ascent at -10 ft'))
+        # Validated from replace values without formatting all names.
+        self.assertTrue(formatted_name_node._validate_name(
+            'Speed in ascent at 500 ft', {'phase': 'ascent', 'altitude': 500}))
+        # Values of another type fall back to comparing names.
+        self.assertTrue(formatted_name_node._validate_name(
+            'Speed in ascent at 500 ft',
+            {'phase': 'ascent', 'altitude': np.int64(500)}))
+        self.assertTrue(formatted_name_node._validate_name(
+            'Speed in ascent at 500 ft',
+            {'phase': 'ascent', 'altitude': 500.2}))
+        self.assertFalse(formatted_name_node._validate_name(
+            'Speed in ascent at -10 ft', {'phase': 'ascent', 'altitude': -10}))
+
+    def test_names_cached(self):
+        class Speed(FormattedNameNode):
+            NAME_FORMAT = '%(speed)s'
+            NAME_VALUES = {'speed': ['Slow', 'Fast']}
+            def derive(self, *args, **kwargs):
+                pass
+        names = Speed.names()
+        self.assertEqual(names, ['Slow', 'Fast'])
+        # Modifying the returned list does not alter the cache.
+        names.append('Warp 10')
+        self.assertEqual(Speed.names(), ['Slow', 'Fast'])
+        self.assertEqual(Speed.name_indices(), {'Slow': 0, 'Fast': 1})
+        # Names are recomputed when NAME_VALUES is reassigned.
+        Speed.NAME_VALUES = {'speed': ['Warp 10']}
+        self.assertEqual(Speed.names(), ['Warp 10'])
+        self.assertEqual(Speed.name_indices(), {'Warp 10': 0})
+        node = Speed()
+        self.assertEqual(node.format_name(speed='Warp 10'), 'Warp 10')
+        self.assertRaises(ValueError, node.format_name, speed='Slow')
+        # Names are recomputed when NAME_VALUES is modified in-place.
+        Speed.NAME_VALUES['speed'].append('Warp 11')
+        self.assertEqual(Speed.names(), ['Warp 10', 'Warp 11'])
+        self.assertEqual(Speed.name_indices(), {'Warp 10': 0, 'Warp 11': 1})
+        self.assertEqual(node.format_name(speed='Warp 11'), 'Warp 11')
+
+    def test_format_name_missing_value(self):
+        class Speed(FormattedNameNode):
+            NAME_FORMAT = '%(speed)s at %(altitude)d ft'
+            NAME_VALUES = {'speed': ['Slow', 'Fast']}
+            def derive(self, *args, **kwargs):
+                pass
+        # NAME_FORMAT key missing from NAME_VALUES is not validated.
+        self.assertRaises(KeyError, Speed().format_name, speed='Slow',
+                          altitude=100)
 
     def test_get(self):
         class AltitudeWhenDescending(FormattedNameNode):
@@ -1088,6 +1274,70 @@ class TestFormattedNameNode(unittest.TestCase):
         previous_kti = kti_node.get_previous(40, frequency=4)
         self.assertEqual(previous_kti, KeyTimeInstance(2, 'Slowest'))
 
+    def test_columns(self):
+        kti_node = self.speed_class(items=[KeyTimeInstance(12, 'Fast'),
+                                           KeyTimeInstance(2.5, 'Slowest'),
+                                           KeyTimeInstance(50, 'Fast')],
+                                    restrict_names=False)
+        columns = kti_node.columns()
+        self.assertEqual(columns.index.tolist(), [12, 2.5, 50])
+        self.assertEqual(columns.value, None)
+        self.assertEqual(columns.name.tolist(), [1, 0, 1])
+        self.assertEqual(columns.names, ['Slowest', 'Fast', 'Warp 10'])
+        kti_node.append(KeyTimeInstance(7, 'Warp 11'))
+        columns = kti_node.columns()
+        self.assertEqual(columns.name.tolist(), [1, 0, 1, 3])
+        self.assertEqual(columns.names[3], 'Warp 11')
+        self.assertEqual(kti_node.get(name='Warp 11'),
+                         [KeyTimeInstance(7, 'Warp 11')])
+        # Columns are cached until the list is modified.
+        self.assertIs(kti_node.columns(), kti_node.columns())
+        kti_node.pop()
+        self.assertEqual(kti_node.columns().names,
+                         ['Slowest', 'Fast', 'Warp 10'])
+        # Items modified in place are reflected once columns are invalidated.
+        kti_node[1].index = 60
+        kti_node.invalidate_columns()
+        self.assertEqual(kti_node.get_last(), KeyTimeInstance(60, 'Slowest'))
+
+    def test_columns_across_derive(self):
+        class First(KeyTimeInstanceNode):
+            def derive(self, speeds=KTI('Speeds')):
+                self.append(speeds.get_first())
+
+        class Shifted(KeyTimeInstanceNode):
+            def derive(self, speeds=KTI('Speeds')):
+                speeds.get_first()
+                for speed in speeds:
+                    speed.index += 100
+                speeds.invalidate_columns()
+                self.extend(speeds)
+
+        speeds = self.speed_class(items=[KeyTimeInstance(12, 'Fast'),
+                                         KeyTimeInstance(2, 'Slowest')])
+        columns = speeds.columns()
+        # Columns are reused by each node depending upon the node.
+        First(frequency=1, offset=0).get_derived([speeds])
+        self.assertIs(speeds.columns(), columns)
+        node = Shifted(frequency=1, offset=0)
+        node.get_derived([speeds])
+        self.assertEqual(speeds.get_first(), KeyTimeInstance(102, 'Slowest'))
+        self.assertEqual(node.get_last(), KeyTimeInstance(112, 'Fast'))
+
+    def test_get_equal_indices(self):
+        kti_node = self.speed_class(items=[KeyTimeInstance(5, 'Slowest'),
+                                           KeyTimeInstance(5, 'Fast'),
+                                           KeyTimeInstance(1, 'Fast'),
+                                           KeyTimeInstance(1, 'Slowest')])
+        # The first of equal indices is returned, except by get_previous
+        # which returns the last.
+        self.assertIs(kti_node.get_first(), kti_node[2])
+        self.assertIs(kti_node.get_last(), kti_node[0])
+        self.assertIs(kti_node.get_next(3), kti_node[0])
+        self.assertIs(kti_node.get_previous(3), kti_node[3])
+        self.assertEqual(kti_node.get_ordered_by_index(),
+                         [kti_node[2], kti_node[3], kti_node[0], kti_node[1]])
+
     def test_initial_items_storage(self):
         node = FormattedNameNode(['a', 'b', 'c'])
         self.assertEqual(list(node), ['a', 'b', 'c'])
@@ -1164,6 +1414,22 @@ class TestKeyPointValueNode(unittest.TestCase):
                           KeyPointValue(index=2, value=2, name='Kpv'),
                           KeyPointValue(index=8, value=8, name='Kpv')])
 
+    @mock.patch('analysis_engine.node.logger')
+    def test_create_kpvs_at_ktis_masked_logging(self, logger):
+        knode = self.knode
+        array = np.ma.arange(10)
+        array[4] = np.ma.masked
+        array[9] = np.ma.masked
+        ktis = KTI('KTI', items=[KeyTimeInstance(4, 'a'),
+                                 KeyTimeInstance(12, 'b')])
+        knode.create_kpvs_at_ktis(array, ktis)
+        self.assertEqual(list(knode), [])
+        # Masked samples within the array are passed as None, as
+        # value_at_index returns, while a masked sample sourced from beyond
+        # the end of the array is passed as masked.
+        self.assertEqual(logger.info.call_count, 1)
+        self.assertEqual(logger.warn.call_count, 1)
+
 
     def test_create_kpvs_at_ktis_multistate(self):
         '''
@@ -1461,6 +1727,14 @@ class TestKeyPointValueNode(unittest.TestCase):
         self.assertEqual(aligned_node,
                          [KeyPointValue(index=1.95, value=12.5, name='Speed at 1000ft'),
                           KeyPointValue(index=5.45, value=12.5, name='Speed at 1000ft')])
+        # Items are copied.
+        self.assertIsNot(aligned_node[0], knode[0])
+        self.assertEqual(knode[0].index, 10)
+
+    def test_get_aligned_same_frequency_and_offset(self):
+        self.knode.create_kpv(10, 12.5)
+        param = Parameter('p', frequency=2, offset=0.4)
+        self.assertIs(self.knode.get_aligned(param), self.knode)
 
     def test_get_min(self):
         # Test empty Node first.
@@ -1519,6 +1793,18 @@ class TestKeyPointValueNode(unittest.TestCase):
         kpv7 = kpv_node.get_max(within_slice=slice(500,600))
         self.assertEqual(kpv7, None)
 
+    def test_get_equal_values(self):
+        kpv_node = self.speed_class(items=[KeyPointValue(12, 30, 'Slowest'),
+                                           KeyPointValue(342, 60, 'Fast'),
+                                           KeyPointValue(2, 30, 'Fast'),
+                                           KeyPointValue(50, 60, 'Slowest')])
+        # The first of equal values is returned as with max() and min().
+        self.assertIs(kpv_node.get_max(), kpv_node[1])
+        self.assertIs(kpv_node.get_min(), kpv_node[0])
+        self.assertIs(kpv_node.get_max(name='Slowest'), kpv_node[3])
+        self.assertEqual(kpv_node.get_ordered_by_value(),
+                         [kpv_node[0], kpv_node[2], kpv_node[1], kpv_node[3]])
+
     def test_get_ordered_by_value(self):
         kpv_node = self.speed_class(items=[KeyPointValue(12, 30, 'Slowest'),
                                            KeyPointValue(342, 60, 'Slowest'),
@@ -1755,6 +2041,15 @@ class TestKeyTimeInstanceNode(unittest.TestCase):
         self.assertEqual(aligned_kti,
                          [KeyTimeInstance(index=1.6, name='Kti'),
                           KeyTimeInstance(index=1.85, name='Kti')])
+        self.assertEqual(kti[0].index, 16)
+
+    def test_get_aligned_same_frequency_and_offset(self):
+        self.kti.create_kti(16)
+        param = Parameter('p', frequency=2, offset=0.4)
+        self.assertIs(self.kti.get_aligned(param), self.kti)
+        param = Parameter('p', frequency=2, offset=0)
+        self.assertEqual(self.kti.get_aligned(param),
+                         [KeyTimeInstance(index=16.8, name='Kti')])
 
 
 class TestDerivedParameterNode(unittest.TestCase):
@@ -1815,6 +2110,29 @@ class TestDerivedParameterNode(unittest.TestCase):
         self.assertEqual(result.frequency, param1.frequency)
         self.assertEqual(result.offset, param1.offset)
 
+    def test_get_derived_profile(self):
+        cache = NodeCache()
+        param1 = Parameter('Altitude STD', np.ma.arange(10.0), frequency=1,
+                           offset=0)
+        param2 = Parameter('Pitch', np.ma.arange(10.0), frequency=1,
+                           offset=0, cache=cache)
+        profile = {}
+        self.derived_class(cache=cache).get_derived([param1, param2],
+                                                    profile=profile)
+        self.assertEqual(profile['cache_hits'], 0)
+        self.assertEqual(profile['cache_misses'], 1)
+        # aligned Pitch array
+        self.assertTrue(profile['bytes'] >= 10 * 8)
+        self.assertTrue(profile['align_time'] >= 0)
+        self.assertTrue(profile['derive_time'] >= 0)
+        profile = {}
+        self.derived_class(cache=cache).get_derived([param1, param2],
+                                                    profile=profile)
+        self.assertEqual(profile['cache_hits'], 1)
+        self.assertEqual(profile['cache_misses'], 0)
+        self.assertEqual(profile['bytes'], 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
     def test_get_derived_unaligned(self):
         """
         Set the class attribute align_to_first_dependency = False
@@ -1855,6 +2173,17 @@ class TestDerivedParameterNode(unittest.TestCase):
         self.assertEqual(spd.at(0), 0) # Extrapolation at bottom end
         self.assertEqual(spd.at(11), 19) # Extrapolation at top end
 
+    def test_parameter_at_many(self):
+        array = np.ma.arange(20.0) + 10
+        array[[3, 4, 19]] = np.ma.masked
+        secs = [0.75, 1.75, 2.5, 2.6, 3.1, 9.75, 0, 11, None]
+        for frequency, offset in ((2, 0.75), (1, 0), (0.5, 0.3)):
+            spd = Parameter('Airspeed', array, frequency, offset)
+            values = spd.at_many(secs)
+            # at returns either None or np.ma.masked for masked values.
+            self.assertEqual(values.tolist(),
+                             [spd.at(s) or None for s in secs])
+
     @mock.patch('analysis_engine.node.slices_above')
     def test_slices_above(self, slices_above):
         '''
@@ -1972,6 +2301,36 @@ class TestDerivedParameterNode(unittest.TestCase):
         self.assertGreater(os.path.getsize(dest), 20000)
         os.remove(dest)
 
+    def test_lazy(self):
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return np.ma.arange(4.0)
+
+        hdf_param = P('Altitude', np.ma.arange(1.0), frequency=2, offset=0.1)
+        node = lazy_param_from_hdf(hdf_param, loader)
+        self.assertIsInstance(node, LazyDerivedParameterNode)
+        self.assertEqual((node.name, node.frequency, node.offset),
+                         ('Altitude', 2, 0.1))
+        self.assertFalse(node.loaded)
+        self.assertEqual(loads, [])
+        self.assertEqual(node.array.tolist(), [0, 1, 2, 3])
+        self.assertEqual(node.array.tolist(), [0, 1, 2, 3])
+        self.assertTrue(node.loaded)
+        self.assertEqual(loads, [1])
+        self.assertRaises(AttributeError, getattr, node, 'other')
+        # Pickling loads the array.
+        node = lazy_param_from_hdf(hdf_param, loader)
+        res = cPickle.loads(cPickle.dumps(node, -1))
+        self.assertEqual(res.array.tolist(), [0, 1, 2, 3])
+        self.assertEqual(res.frequency, 2)
+        # Aligned copies are created with their array.
+        node = lazy_param_from_hdf(hdf_param, loader)
+        aligned = node.get_aligned(P('Other', frequency=1, offset=0.1))
+        self.assertTrue(aligned.loaded)
+        self.assertEqual(aligned.array.tolist(), [0, 2])
+
 
 
 class TestMultistateDerivedParameterNode(unittest.TestCase):
@@ -2104,6 +2463,20 @@ class TestMultistateDerivedParameterNode(unittest.TestCase):
         self.assertEqual(list(res.array), expected)
         os.remove(dest)
 
+    def test_lazy(self):
+        mapping = {0: 'zero', 1: 'one'}
+        hdf_param = M('Multi', MappedArray([0], values_mapping=mapping))
+        node = lazy_param_from_hdf(
+            hdf_param, lambda: MappedArray([1, 0, 1], values_mapping=mapping))
+        self.assertIsInstance(node, MultistateDerivedParameterNode)
+        self.assertEqual(node.values_mapping, mapping)
+        self.assertFalse(node.loaded)
+        self.assertEqual(list(node.array), ['one', 'zero', 'one'])
+        self.assertEqual(node.array.values_mapping, mapping)
+        aligned = node.get_aligned(P('Other'))
+        self.assertEqual(aligned.values_mapping, mapping)
+        self.assertEqual(list(aligned.array), ['one', 'zero', 'one'])
+
 class TestNodeTypeAbbreviation(unittest.TestCase):
     def test_node_type_abbr_attribute(self):
         class NAME(DerivedParameterNode):
@@ -1,5 +1,111 @@
+import json
+import mock
+import numpy as np
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
 
+from datetime import datetime, timedelta
+
+from analysis_engine.dependency_graph import dependency_order, level_schedule
+from analysis_engine.node import (DerivedParameterNode, KeyPointValue,
+                                  KeyPointValueNode, KeyTimeInstance,
+                                  KPV, NodeManager, P)
+from analysis_engine.process_flight import (_release_dependencies,
+                                            _timestamp, BufferedHDF,
+                                            derive_node, derive_parameters,
+                                            geo_locate, get_fingerprints,
+                                            LazyParameters,
+                                            load_batch, ParameterPrefetcher, process_batch_entry,
+                                            profile_table)
+
+
+class MockHDF(object):
+    duration = 10
+
+    def __init__(self, params):
+        self.params = params
+        # Names of parameters whose entire array has been read.
+        self.reads = []
+
+    def __getitem__(self, name):
+        return self.params[name]
+
+    def get_param(self, name, valid_only=False, _slice=None):
+        param = self.params[name]
+        if _slice is None:
+            self.reads.append(name)
+            return param
+        return P(name, param.array[_slice], frequency=param.frequency,
+                 offset=param.offset)
+
+    def valid_param_names(self):
+        return self.params.keys()
+
+    def set_param(self, param):
+        self.params[param.name] = param
+
+
+class Sum(DerivedParameterNode):
+    @classmethod
+    def can_operate(cls, available):
+        return 'Raw1' in available
+
+    def derive(self, raw1=P('Raw1'), raw2=P('Raw2')):
+        self.array = raw1.array + raw2.array
+
+
+class Double(DerivedParameterNode):
+    def derive(self, raw1=P('Raw1')):
+        self.array = raw1.array * 2
+
+
+class Scaled(DerivedParameterNode):
+    @classmethod
+    def can_operate(cls, available):
+        return 'Sum' in available
+
+    def derive(self, sum_=P('Sum'), scale=P('Scale')):
+        # Scale is not recorded.
+        self.array = sum_.array * (scale.array if scale else 10)
+
+
+class Combined(DerivedParameterNode):
+    def derive(self, scaled=P('Scaled'), double=P('Double'), raw2=P('Raw2')):
+        self.array = scaled.array + double.array - raw2.array
+
+
+class SumMax(KeyPointValueNode):
+    def derive(self, sum_=P('Sum'), double=P('Double')):
+        array = sum_.array + double.array
+        self.create_kpv(np.ma.argmax(array), array.max())
+
+
+class CombinedMax(KeyPointValueNode):
+    def derive(self, combined=P('Combined'), sum_max=KPV('Sum Max')):
+        self.create_kpv(np.ma.argmax(combined.array),
+                        combined.array.max() - sum_max[0].value)
+
+
+class Failing(KeyPointValueNode):
+    def derive(self, double=P('Double')):
+        raise ValueError('Unable to derive.')
+
+
+DERIVED_NODES = {
+    'Sum': Sum, 'Double': Double, 'Scaled': Scaled, 'Combined': Combined,
+    'Sum Max': SumMax, 'Combined Max': CombinedMax, 'Failing': Failing,
+}
+
+# Derived nodes of each level when 'Combined Max' is requested. Combined
+# depends upon nodes of levels 0 and 1 and Combined Max upon levels 1 and 2.
+LEVELS = [['Double', 'Sum'], ['Scaled', 'Sum Max'], ['Combined'],
+          ['Combined Max']]
+
 
 class TestProcessFlight(unittest.TestCase):
 
@@ -15,3 +121,486 @@ class TestProcessFlight(unittest.TestCase):
         '''
         self.assertTrue(False, msg='Test not implemented.')
 
+
+class TestDeriveParameters(unittest.TestCase):
+    def _setup(self, requested=('Combined Max',)):
+        hdf = MockHDF({
+            'Raw1': P('Raw1', np.ma.arange(10.0)),
+            'Raw2': P('Raw2', np.ma.arange(10.0) * 3),
+        })
+        node_mgr = NodeManager(
+            {'Start Datetime': datetime.now()}, hdf.duration,
+            ['Raw1', 'Raw2'], list(requested), [], DERIVED_NODES, {}, {})
+        process_order, gr_st = dependency_order(node_mgr, draw=False)
+        return hdf, node_mgr, process_order, gr_st
+
+    def _derive(self, requested=('Combined Max',), **kwargs):
+        hdf, node_mgr, process_order, gr_st = self._setup(requested)
+        res = derive_parameters(hdf, node_mgr, process_order, gr_st=gr_st,
+                                **kwargs)
+        return hdf, node_mgr, res
+
+    def test_derive_parameters(self):
+        hdf, node_mgr, res = self._derive()
+        arange = np.arange(10.0)
+        self.assertEqual(hdf.params['Sum'].array.tolist(),
+                         (arange * 4).tolist())
+        # The optional Scale parameter is not available.
+        self.assertEqual(hdf.params['Scaled'].array.tolist(),
+                         (arange * 40).tolist())
+        self.assertEqual(hdf.params['Combined'].array.tolist(),
+                         (arange * 39).tolist())
+        self.assertEqual(res[1]['Sum Max'][0].value, 54)
+        self.assertEqual(res[1]['Combined Max'][0].value, 297)
+
+    def test_derive_parameters_levels(self):
+        hdf, node_mgr, process_order, gr_st = self._setup()
+        schedule = level_schedule(process_order, gr_st,
+                                  available=set(node_mgr.hdf_keys))
+        self.assertEqual([sorted(level) for level in schedule], LEVELS)
+
+    def test_derive_parameters_workers(self):
+        hdf, node_mgr, res = self._derive(workers=0)
+        for executor in ('thread', 'process'):
+            hdf_, node_mgr_, res_ = self._derive(workers=2, executor=executor)
+            self.assertEqual(res_, res)
+            # Parameters are stored by level rather than in process order.
+            self.assertEqual(sorted(node_mgr_.hdf_keys),
+                             sorted(node_mgr.hdf_keys))
+            self.assertEqual(hdf_.params['Combined'].array.tolist(),
+                             hdf.params['Combined'].array.tolist())
+
+    def test_derive_parameters_workers_order(self):
+        derived = []
+
+        def derive_node_(node_class, *args, **kwargs):
+            derived.append(node_class.get_name())
+            return derive_node(node_class, *args, **kwargs)
+
+        with mock.patch('analysis_engine.process_flight.derive_node',
+                        derive_node_):
+            self._derive(workers=3, executor='thread')
+        # Each level is derived once every earlier level is complete.
+        position = 0
+        for level in LEVELS:
+            self.assertEqual(sorted(derived[position:position + len(level)]),
+                             level)
+            position += len(level)
+        self.assertEqual(position, len(derived))
+
+    def test_derive_parameters_exception(self):
+        requested = ('Combined Max', 'Failing')
+        for workers, executor in ((0, None), (2, 'thread'), (2, 'process')):
+            self.assertRaises(ValueError, self._derive, requested=requested,
+                              workers=workers, executor=executor)
+            hdf_, node_mgr_, res_ = self._derive(
+                requested=requested, workers=workers, executor=executor,
+                force=True)
+            self.assertEqual(res_[1]['Failing'], [])
+            self.assertEqual(res_[1]['Combined Max'][0].value, 297)
+
+    def test_derive_parameters_profile(self):
+        for workers, executor in ((0, None), (2, 'thread'), (2, 'process')):
+            profile = {}
+            self._derive(workers=workers, executor=executor, profile=profile)
+            self.assertEqual(sorted(profile), sorted(sum(LEVELS, [])))
+            self.assertEqual(profile['Sum']['type'], 'DerivedParameterNode')
+            self.assertEqual(profile['Sum Max']['type'], 'KeyPointValueNode')
+            for node_profile in profile.values():
+                self.assertTrue(node_profile['wall_time'] >=
+                                node_profile['store_time'])
+            # Sum array and aligned Raw2 array
+            self.assertTrue(profile['Sum']['bytes'] >= 160)
+            self.assertTrue(profile['Double']['bytes'] >= 80)
+            self.assertIn('Combined Max', profile_table(profile))
+
+    def test_derive_parameters_write_behind(self):
+        hdf, node_mgr, res = self._derive()
+        for write_behind, workers in (('thread', 0), ('batch', 0),
+                                      ('thread', 2)):
+            hdf_, node_mgr_, res_ = self._derive(
+                workers=workers, executor='thread', write_behind=write_behind)
+            # Every derived parameter is written once processing completes.
+            self.assertEqual(sorted(hdf_.params), sorted(hdf.params))
+            self.assertEqual(hdf_.params['Combined'].array.tolist(),
+                             hdf.params['Combined'].array.tolist())
+
+    def test_derive_parameters_write_behind_exception(self):
+        for write_behind, workers in (('thread', 0), ('batch', 0),
+                                      ('batch', 2)):
+            hdf, node_mgr, process_order, gr_st = self._setup(
+                ('Combined Max', 'Failing'))
+            self.assertRaises(
+                ValueError, derive_parameters, hdf, node_mgr, process_order,
+                gr_st=gr_st, workers=workers, executor='thread',
+                write_behind=write_behind)
+            # Parameters derived before the exception are written.
+            for name in node_mgr.hdf_keys:
+                self.assertIn(name, hdf.params)
+
+    def test_derive_parameters_evict(self):
+        # Nodes outside of the process order are retained.
+        params = {'Other': None}
+        hdf, node_mgr, res = self._derive(params=params, evict=False)
+        self.assertEqual(sorted(params),
+                         ['Combined Max', 'Other', 'Sum Max'])
+        for workers in (0, 2):
+            params = {'Other': None}
+            with mock.patch(
+                    'analysis_engine.process_flight._release_dependencies',
+                    wraps=_release_dependencies) as release:
+                hdf_, node_mgr_, res_ = self._derive(
+                    params=params, evict=True, workers=workers,
+                    executor='thread')
+            self.assertEqual(res_, res)
+            # Nodes are released from a copy of the caller's params.
+            self.assertEqual(release.call_count, 6)
+            released_from = release.call_args[0][3]
+            self.assertIsNot(released_from, params)
+            self.assertEqual(released_from, {'Other': None})
+            self.assertEqual(params, {'Other': None})
+
+    def test_derive_parameters_lazy(self):
+        hdf, node_mgr, res = self._derive(lazy=False)
+        # Raw1 is read for both Sum and Double.
+        self.assertEqual(hdf.reads.count('Raw1'), 2)
+        for workers, executor in ((0, None), (2, 'thread'), (2, 'process')):
+            hdf_, node_mgr_, res_ = self._derive(
+                lazy=True, evict=True, workers=workers, executor=executor)
+            self.assertEqual(res_, res)
+            # Each parameter is read once.
+            self.assertEqual(sorted(hdf_.reads), sorted(set(hdf.reads)))
+
+    def test_derive_parameters_lazy_without_eviction(self):
+        lazy_params = []
+
+        class RecordingLazyParameters(LazyParameters):
+            def __init__(self, *args, **kwargs):
+                super(RecordingLazyParameters, self).__init__(*args, **kwargs)
+                self.sizes = []
+                lazy_params.append(self)
+
+            def _load(self, *args, **kwargs):
+                array = super(RecordingLazyParameters, self)._load(
+                    *args, **kwargs)
+                self.sizes.append(self.nbytes)
+                return array
+
+        hdf, node_mgr, res = self._derive(lazy=False)
+        for prefetch in (0, 3):
+            with mock.patch('analysis_engine.process_flight.LazyParameters',
+                            RecordingLazyParameters):
+                hdf_, node_mgr_, res_ = self._derive(
+                    lazy=True, evict=False, prefetch=prefetch)
+            self.assertEqual(res_, res)
+            # Arrays are not retained once they have been accessed.
+            lazy_params_ = lazy_params.pop()
+            if not prefetch:
+                # Parameters are read for each node accessing their arrays,
+                # except when the node cache provides their aligned copy.
+                for name in set(hdf.reads):
+                    self.assertTrue(
+                        0 < hdf_.reads.count(name) <= hdf.reads.count(name))
+                self.assertEqual(set(lazy_params_.sizes), set([0]))
+            self.assertEqual(lazy_params_.nbytes, 0)
+
+    def test_derive_parameters_prefetch(self):
+        hdf, node_mgr, res = self._derive(prefetch=0)
+        for workers, executor in ((0, None), (2, 'thread'), (2, 'process')):
+            for prefetch in (1, 3):
+                prefetchers = []
+
+                def prefetcher(*args, **kwargs):
+                    prefetchers.append(ParameterPrefetcher(*args, **kwargs))
+                    return prefetchers[-1]
+
+                with mock.patch(
+                        'analysis_engine.process_flight.ParameterPrefetcher',
+                        prefetcher):
+                    hdf_, node_mgr_, res_ = self._derive(
+                        prefetch=prefetch, lazy=True, evict=True,
+                        workers=workers, executor=executor)
+                self.assertEqual(res_, res)
+                # Prefetched parameters are not read again.
+                self.assertEqual(sorted(hdf_.reads), sorted(set(hdf.reads)))
+                self.assertEqual(len(prefetchers), 1)
+                self.assertTrue(set(prefetchers[0].prefetched) <=
+                                set(hdf_.reads))
+
+
+class TestBufferedHDF(unittest.TestCase):
+    def test_get_param(self):
+        for background in (True, False):
+            hdf = MockHDF({'Raw1': P('Raw1', np.ma.arange(10.0))})
+            buffered = BufferedHDF(hdf, background=background)
+            self.assertIs(buffered.get_param('Raw1'), hdf.params['Raw1'])
+            self.assertEqual(buffered.duration, 10)
+            param = P('Sum', np.ma.arange(10.0))
+            buffered.set_param(param)
+            if not background:
+                self.assertNotIn('Sum', hdf.params)
+            # Modifying the array read from memory does not change the
+            # array written.
+            buffered.get_param('Sum').array[0] = 5
+            buffered.close()
+            self.assertIs(hdf.params['Sum'], param)
+            self.assertEqual(param.array[0], 0)
+
+    def test_write_error(self):
+        class ReadOnlyHDF(MockHDF):
+            def set_param(self, param):
+                raise IOError('Read only.')
+
+        for background in (True, False):
+            buffered = BufferedHDF(ReadOnlyHDF({}), background=background)
+            buffered.set_param(P('Sum', np.ma.arange(10.0)))
+            self.assertRaises(IOError, buffered.close)
+
+
+class TestLazyParameters(unittest.TestCase):
+    def test_get_param(self):
+        hdf = MockHDF({'Raw1': P('Raw1', np.ma.arange(10.0), frequency=2,
+                                 offset=0.25)})
+        lazy_params = LazyParameters(hdf)
+        raw1 = lazy_params.get_param('Raw1')
+        self.assertEqual((raw1.name, raw1.frequency, raw1.offset),
+                         ('Raw1', 2, 0.25))
+        self.assertFalse(raw1.loaded)
+        self.assertEqual(hdf.reads, [])
+        other = lazy_params.get_param('Raw1')
+        self.assertEqual(raw1.array.tolist(), range(10))
+        self.assertTrue(raw1.loaded)
+        # The array is read once and each parameter has a copy.
+        other.array[0] = 5
+        self.assertEqual(raw1.array[0], 0)
+        self.assertEqual(lazy_params.get_param('Raw1').array[0], 0)
+        self.assertEqual(hdf.reads, ['Raw1'])
+        self.assertEqual(hdf.params['Raw1'].array[0], 0)
+        lazy_params.release('Raw1')
+        lazy_params.get_param('Raw1').array
+        self.assertEqual(hdf.reads, ['Raw1', 'Raw1'])
+        self.assertRaises(KeyError, lazy_params.get_param, 'Raw2')
+
+    def test_get_param_without_retaining(self):
+        hdf = MockHDF({'Raw1': P('Raw1', np.ma.arange(10.0))})
+        lazy_params = LazyParameters(hdf, retain=False)
+        self.assertEqual(lazy_params.get_param('Raw1').array.tolist(),
+                         range(10))
+        self.assertEqual(lazy_params.nbytes, 0)
+        lazy_params.get_param('Raw1').array
+        self.assertEqual(hdf.reads, ['Raw1', 'Raw1'])
+        # Prefetched arrays are held until first accessed.
+        lazy_params.prefetch('Raw1')
+        self.assertEqual(lazy_params.nbytes, 80)
+        self.assertEqual(lazy_params.get_param('Raw1').array.tolist(),
+                         range(10))
+        self.assertEqual(lazy_params.nbytes, 0)
+        self.assertEqual(hdf.reads, ['Raw1', 'Raw1', 'Raw1'])
+        lazy_params.prefetch('Raw1')
+        lazy_params.release('Raw1', attributes=False)
+        self.assertEqual(lazy_params.nbytes, 0)
+
+
+class TestParameterPrefetcher(unittest.TestCase):
+    def _wait_for(self, prefetcher, expected):
+        for _ in xrange(200):
+            if prefetcher.prefetched == expected:
+                break
+            time.sleep(0.01)
+        self.assertEqual(prefetcher.prefetched, expected)
+
+    def test_prefetch(self):
+        hdf = MockHDF({'Raw1': P('Raw1', np.ma.arange(10.0)),
+                       'Raw2': P('Raw2', np.ma.arange(10.0))})
+        lazy_params = LazyParameters(hdf)
+        plan = [['Raw1'], ['Raw2', 'Invalid'], [], ['Raw1']]
+        prefetcher = ParameterPrefetcher(lazy_params, plan, 2)
+        try:
+            # The node being derived loads its own parameters.
+            prefetcher.advance(0)
+            self._wait_for(prefetcher, ['Raw2'])
+            self.assertEqual(hdf.reads, ['Raw2'])
+            raw2 = lazy_params.get_param('Raw2')
+            self.assertEqual(raw2.array.tolist(), range(10))
+            self.assertEqual(hdf.reads, ['Raw2'])
+            prefetcher.advance(2)
+            self._wait_for(prefetcher, ['Raw2', 'Raw1'])
+            self.assertEqual(lazy_params.get_param('Raw1').array.tolist(),
+                             range(10))
+            self.assertEqual(hdf.reads, ['Raw2', 'Raw1'])
+        finally:
+            prefetcher.stop()
+
+    def test_max_bytes(self):
+        hdf = MockHDF({'Raw1': P('Raw1', np.ma.arange(10.0)),
+                       'Raw2': P('Raw2', np.ma.arange(10.0))})
+        lazy_params = LazyParameters(hdf)
+        prefetcher = ParameterPrefetcher(
+            lazy_params, [[], ['Raw1'], ['Raw2']], 3, max_bytes=1)
+        try:
+            self._wait_for(prefetcher, ['Raw1'])
+            time.sleep(0.05)
+            self.assertEqual(prefetcher.prefetched, ['Raw1'])
+            # Releasing parameters allows prefetching to continue.
+            lazy_params.release('Raw1')
+            self.assertEqual(lazy_params.nbytes, 0)
+            prefetcher.advance(1)
+            self._wait_for(prefetcher, ['Raw1', 'Raw2'])
+        finally:
+            prefetcher.stop()
+
+
+class TestGeoLocate(unittest.TestCase):
+    def _items(self, indices):
+        return {
+            'KTI': [KeyTimeInstance(i, 'KTI') for i in indices],
+            'KPV': [KeyPointValue(i, 1, 'KPV') for i in indices],
+        }
+
+    def test_geo_locate(self):
+        lat = P('Latitude Smoothed', np.ma.arange(10.0) + 50)
+        lon = P('Longitude Smoothed', np.ma.arange(10.0) - 5)
+        lat.array[3] = np.ma.masked
+        hdf = MockHDF({'Latitude Smoothed': lat, 'Longitude Smoothed': lon})
+        items = geo_locate(hdf, self._items([0, 2.5, 3, 5, 12, None]))
+        # Masked latitude is repaired and zero longitude is treated as None.
+        self.assertEqual([(i.latitude, i.longitude) for i in items['KTI']],
+                         [(50, -5), (52.5, -2.5), (53, -2), (55, None),
+                          (59, 4), (None, None)])
+        self.assertEqual([(i.latitude, i.longitude) for i in items['KPV']],
+                         [(i.latitude, i.longitude) for i in items['KTI']])
+
+    def test_timestamp(self):
+        start = datetime(2000, 1, 1)
+        items = _timestamp(start, self._items([0, 2.5, 2.5, 3600]))
+        self.assertEqual([i.datetime for i in items['KPV']],
+                         [start, start + timedelta(seconds=2.5),
+                          start + timedelta(seconds=2.5),
+                          start + timedelta(hours=1)])
+
+    def test_timestamp_unique_indices(self):
+        start = datetime(2000, 1, 1)
+        indices = np.repeat(np.random.uniform(0, 20000, 500), 3)
+        items = _timestamp(start, self._items(indices))
+        self.assertEqual(
+            [i.datetime for i in items['KTI']],
+            [start + timedelta(seconds=float(i)) for i in indices])
+        self.assertEqual(_timestamp(start, {}), {})
+
+
+class TestGetFingerprints(unittest.TestCase):
+    def _fingerprints(self, derived_nodes, lfl_params=['Raw1', 'Raw2']):
+        node_mgr = NodeManager(
+            {'Start Datetime': datetime.now()}, 10, lfl_params, ['Sum Max'],
+            [], derived_nodes, {}, {})
+        process_order, gr_st = dependency_order(node_mgr, draw=False)
+        return get_fingerprints(process_order, gr_st, node_mgr)
+
+    def test_get_fingerprints(self):
+        derived_nodes = {'Sum': Sum, 'Double': Double, 'Sum Max': SumMax}
+        fingerprints = self._fingerprints(derived_nodes)
+        self.assertEqual(sorted(fingerprints),
+                         ['Double', 'Raw1', 'Raw2', 'Sum', 'Sum Max'])
+        self.assertEqual(self._fingerprints(derived_nodes), fingerprints)
+
+        # Changing the code of Double changes its downstream fingerprints.
+        class ChangedDouble(DerivedParameterNode):
+            name = 'Double'
+
+            def derive(self, raw1=P('Raw1')):
+                self.array = raw1.array + raw1.array
+
+        changed = self._fingerprints(dict(derived_nodes, Double=ChangedDouble))
+        self.assertEqual(changed['Sum'], fingerprints['Sum'])
+        self.assertNotEqual(changed['Double'], fingerprints['Double'])
+        self.assertNotEqual(changed['Sum Max'], fingerprints['Sum Max'])
+
+        # Dependency availability changes the fingerprint.
+        changed = self._fingerprints(derived_nodes, lfl_params=['Raw1'])
+        self.assertNotIn('Raw2', changed)
+        self.assertEqual(changed['Double'], fingerprints['Double'])
+        self.assertNotEqual(changed['Sum'], fingerprints['Sum'])
+        self.assertNotEqual(changed['Sum Max'], fingerprints['Sum Max'])
+
+
+class TestLoadBatch(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        for filename in ('a.hdf5', 'b.hdf5', 'b_process.hdf5', 'c.txt'):
+            open(os.path.join(self.tempdir, filename), 'wb').close()
+        with open(os.path.join(self.tempdir, 'b.json'), 'wb') as f:
+            json.dump({'Tail Number': 'G-ABCD', 'Model': 'B737-333'}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_load_batch_directory(self):
+        batch = load_batch(self.tempdir, tail_number='G-FDSL',
+                           aircraft_info={'Family': 'B737'})
+        self.assertEqual([os.path.basename(e['File']) for e in batch],
+                         ['a.hdf5', 'b.hdf5'])
+        self.assertEqual(batch[0]['Tail Number'], 'G-FDSL')
+        self.assertEqual(batch[0]['Aircraft Info'], {'Family': 'B737'})
+        self.assertEqual(batch[0]['Segment Type'], 'START_AND_STOP')
+        self.assertEqual(batch[1]['Tail Number'], 'G-ABCD')
+        self.assertEqual(batch[1]['Aircraft Info'],
+                         {'Family': 'B737', 'Model': 'B737-333',
+                          'Tail Number': 'G-ABCD'})
+
+    def test_load_batch_manifest(self):
+        manifest_path = os.path.join(self.tempdir, 'manifest.json')
+        with open(manifest_path, 'wb') as f:
+            json.dump([
+                {'File': 'a.hdf5', 'Tail Number': 'G-ABCD',
+                 'Segment Type': 'GROUND_ONLY'},
+                {'File': 'b.hdf5', 'Aircraft Info': {'Model': 'B737-333'},
+                 'Achieved Flight Record': {'AFR Flight ID': 1}},
+            ], f)
+        batch = load_batch(manifest_path, tail_number='G-FDSL')
+        self.assertEqual(batch[0]['File'],
+                         os.path.join(self.tempdir, 'a.hdf5'))
+        self.assertEqual(batch[0]['Tail Number'], 'G-ABCD')
+        self.assertEqual(batch[0]['Segment Type'], 'GROUND_ONLY')
+        self.assertEqual(batch[0]['Achieved Flight Record'], {})
+        self.assertEqual(batch[1]['Tail Number'], 'G-FDSL')
+        self.assertEqual(batch[1]['Aircraft Info'], {'Model': 'B737-333'})
+        self.assertEqual(batch[1]['Achieved Flight Record'],
+                         {'AFR Flight ID': 1})
+
+    def test_process_batch_entry_failure(self):
+        entry = load_batch(self.tempdir)[0]
+        entry['File'] = os.path.join(self.tempdir, 'missing.hdf5')
+        summary = process_batch_entry(entry)
+        self.assertEqual(summary['Status'], 'Failed')
+        self.assertEqual(summary['File'], entry['File'])
+        self.assertTrue(summary['Error'])
+        self.assertTrue(summary['Duration'] >= 0)
+
+
+class TestImportTime(unittest.TestCase):
+    # Heavy third-party modules which are imported on first use.
+    DEFERRED_MODULES = ('matplotlib', 'networkx', 'scipy', 'simplekml')
+
+    def _import(self):
+        code = (
+            'import sys, time\n'
+            't = time.time()\n'
+            'import analysis_engine.process_flight\n'
+            'print time.time() - t\n'
+            'print " ".join(sorted(set(m.split(".")[0] for m in sys.modules)))\n'
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=root)
+        time_taken, modules = output.strip().splitlines()[-2:]
+        return float(time_taken), modules.split()
+
+    def test_deferred_imports(self):
+        time_taken, modules = self._import()
+        for module in self.DEFERRED_MODULES:
+            self.assertNotIn(module, modules)
+
+    def test_time_taken(self):
+        time_taken = min(self._import()[0] for _ in range(2))
+        print "Time taken %s secs" % time_taken
+        self.assertLess(time_taken, 1.0, msg="Took too long")
@@ -0,0 +1,121 @@
+import copy
+import cPickle
+import unittest
+
+from datetime import datetime
+from timeit import Timer
+
+from analysis_engine.datastructures import Segment
+from analysis_engine.json_tools import node_to_jsondict
+from analysis_engine.node import KeyPointValue, KeyTimeInstance
+from analysis_engine.recordtype import recordtype
+
+
+Point = recordtype('Point', 'x y', default=0)
+
+
+class LegacyKeyPointValue(KeyPointValue):
+    '''
+    KeyPointValue pickled and copied using __getstate__ and __setstate__.
+    '''
+    __slots__ = ()
+    __reduce__ = object.__reduce__
+
+    def __copy__(self):
+        return copy._reconstruct(self, self.__reduce_ex__(2), 0)
+
+
+class TestRecordtype(unittest.TestCase):
+    def test_fields(self):
+        self.assertEqual(Point._fields, ('x', 'y'))
+        self.assertEqual(KeyTimeInstance._fields,
+                         ('index', 'name', 'datetime', 'latitude', 'longitude'))
+
+    def test_make(self):
+        self.assertEqual(Point._make([1, 2]), Point(1, 2))
+        self.assertEqual(Point._make(iter([3])), Point(3, 0))
+
+    def test_pickle(self):
+        kpv = KeyPointValue(10.5, 20, 'Speed', slice(2, 20),
+                            datetime(2012, 1, 2, 3, 4, 5), 51.5, -0.1)
+        for protocol in (0, 2):
+            data = cPickle.dumps(kpv, protocol)
+            self.assertEqual(cPickle.loads(data), kpv)
+        # Pickles created using __getstate__ can still be loaded.
+        data = cPickle.dumps(LegacyKeyPointValue(*kpv), 2)
+        self.assertEqual(list(cPickle.loads(data)), list(kpv))
+        segment = Segment(slice(0, 10), 'START_AND_STOP', 1, 'a.hdf5')
+        self.assertEqual(cPickle.loads(cPickle.dumps(segment, 2)), segment)
+
+    def test_copy(self):
+        kpv = KeyPointValue(10.5, 20, 'Speed', slice(2, 20))
+        kpv_copy = copy.copy(kpv)
+        self.assertEqual(kpv_copy, kpv)
+        self.assertIsNot(kpv_copy, kpv)
+        self.assertIs(kpv_copy.slice, kpv.slice)
+        kpv_copy.index = 5
+        self.assertEqual(kpv.index, 10.5)
+        self.assertEqual(copy.deepcopy(kpv), kpv)
+
+    def test_from_columns(self):
+        kpvs = KeyPointValue.from_columns(index=[1, 2.5], value=[10, 20],
+                                          name=['A', 'B'])
+        self.assertEqual(kpvs, [KeyPointValue(1, 10, 'A'),
+                                KeyPointValue(2.5, 20, 'B')])
+        self.assertEqual(Point.from_columns(y=(1, 2)),
+                         [Point(0, 1), Point(0, 2)])
+        self.assertEqual(Point.from_columns(), [])
+        Record = recordtype('Record', 'a b', field_defaults={'b': 2})
+        self.assertEqual(Record.from_columns(a=[1]), [Record(1, 2)])
+        self.assertRaises(TypeError, Record.from_columns, b=[1])
+        self.assertRaises(TypeError, Point.from_columns, z=[1])
+        self.assertRaises(ValueError, Point.from_columns, x=[1], y=[1, 2])
+
+    def test_todict(self):
+        kti = KeyTimeInstance(3, 'Touchdown')
+        self.assertEqual(kti.todict(), {'index': 3, 'name': 'Touchdown',
+                                        'datetime': None, 'latitude': None,
+                                        'longitude': None})
+
+
+class TestRecordtypeTimeTaken(unittest.TestCase):
+    '''
+    Compares the cost of allocating, pickling, copying and converting
+    KeyPointValues to JSON dictionaries with the previous implementation.
+    '''
+    RECORDS = 20000
+
+    def setUp(self):
+        self.indices = range(self.RECORDS)
+        self.values = [i * 0.5 for i in self.indices]
+        self.names = ['Airspeed Max'] * self.RECORDS
+        self.kpvs = KeyPointValue.from_columns(
+            index=self.indices, value=self.values, name=self.names)
+        self.legacy_kpvs = LegacyKeyPointValue.from_columns(
+            index=self.indices, value=self.values, name=self.names)
+
+    def _time(self, func):
+        return min(Timer(func).repeat(3, 1))
+
+    def test_time_taken(self):
+        timings = (
+            ('allocation', lambda: [
+                KeyPointValue(i, v, n) for i, v, n in
+                zip(self.indices, self.values, self.names)],
+             lambda: KeyPointValue.from_columns(
+                 index=self.indices, value=self.values, name=self.names)),
+            ('pickling', lambda: cPickle.loads(
+                cPickle.dumps(self.legacy_kpvs, 2)),
+             lambda: cPickle.loads(cPickle.dumps(self.kpvs, 2))),
+            ('copying', lambda: map(copy.copy, self.legacy_kpvs),
+             lambda: map(copy.copy, self.kpvs)),
+            ('json conversion', lambda: map(node_to_jsondict,
+                                            self.legacy_kpvs),
+             lambda: map(node_to_jsondict, self.kpvs)),
+        )
+        for name, before, after in timings:
+            before_time = self._time(before)
+            after_time = self._time(after)
+            print "%s: before %s secs, after %s secs" % (
+                name, before_time, after_time)
+            self.assertLess(after_time, 1.0, msg="Took too long")
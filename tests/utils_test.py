@@ -1,9 +1,16 @@
+import os
+import shutil
+import tempfile
 import unittest
 
 from mock import Mock, patch
 
+from analysis_engine import utils
 from analysis_engine.utils import (
+    build_node_registry,
     derived_trimmer,
+    get_node_modules,
+    get_node_registry,
     list_derived_parameters,
     list_everything,
     list_flight_attributes,
@@ -46,6 +53,68 @@ class TestTrimmer(unittest.TestCase):
 
 
 
+class TestNodeRegistry(unittest.TestCase):
+    def setUp(self):
+        self.modules = ['tests.sample_circular_dependency_nodes',
+                        'tests.sample_derived_parameters']
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'registry.json')
+        utils._node_registries.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+        utils._node_registries.clear()
+
+    def test_build_node_registry(self):
+        registry = build_node_registry(self.modules)
+        self.assertEqual([m['name'] for m in registry['modules']],
+                         self.modules)
+        self.assertIn('Gear Down', registry['modules'][0]['nodes'])
+        self.assertEqual(registry['nodes']['Vertical Speed'], {
+            'module': 'tests.sample_derived_parameters',
+            'class': 'VerticalSpeed',
+            'node_type': 'DerivedParameterNode',
+            'dependencies': ['Pressure Altitude', 'Vertical g'],
+            'can_operate_attributes': [],
+        })
+
+    def test_get_node_registry(self):
+        registry = get_node_registry(self.modules, path=self.path)
+        self.assertTrue(os.path.isfile(self.path))
+        self.assertIs(get_node_registry(self.modules, path=self.path),
+                      registry)
+        # loaded from file without importing the modules
+        utils._node_registries.clear()
+        with patch('analysis_engine.utils.build_node_registry') as build:
+            loaded = get_node_registry(self.modules, path=self.path)
+        self.assertFalse(build.called)
+        self.assertEqual(loaded['nodes'], registry['nodes'])
+        # rebuilt when a module is modified
+        utils._node_registries.clear()
+        with patch('analysis_engine.utils._module_mtime', return_value=1.0):
+            with patch('analysis_engine.utils.build_node_registry',
+                       return_value=registry) as build:
+                get_node_registry(self.modules, path=self.path)
+        build.assert_called_once_with(self.modules)
+
+    def test_get_node_modules(self):
+        registry = get_node_registry(self.modules)
+        self.assertEqual(
+            get_node_modules(['Moment Of Takeoff'], self.modules,
+                             registry=registry),
+            ['tests.sample_derived_parameters'])
+        self.assertEqual(
+            get_node_modules(['Gear Down', 'Airspeed'], self.modules,
+                             registry=registry),
+            ['tests.sample_circular_dependency_nodes'])
+        self.assertEqual(
+            get_node_modules(['Gear Down', 'Vertical g'], self.modules,
+                             registry=registry),
+            self.modules)
+        self.assertEqual(get_node_modules(['Unknown'], self.modules,
+                                          registry=registry), [])
+
+
 class TestGetNames(unittest.TestCase):
     def test_list_parameters(self):
         params = list_parameters()